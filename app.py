@@ -53,8 +53,6 @@ if "stream_expanded" not in st.session_state:
     st.session_state.stream_expanded = True
 if "map_view" not in st.session_state:
     st.session_state.map_view = "Current Monitoring"
-if "previous_critical_count" not in st.session_state:
-    st.session_state.previous_critical_count = 0
 if "previous_high_risk_count" not in st.session_state:
     st.session_state.previous_high_risk_count = 0
 if "show_critical_alert" not in st.session_state:
@@ -67,11 +65,29 @@ if "live_data_df" not in st.session_state:
     st.session_state.live_data_df = None
 
 from utils.enterprise_features import enterprise_dashboard, revenue_calculator
-from data.sample_data import generate_sample_data, get_water_quality_status
-from utils.map_helper import create_ghana_water_map, display_map, create_risk_overlay_map
+from data.sample_data import generate_sample_data, generate_historical_readings
+from utils.rules import classify_water_quality
+from utils.schema import to_canonical, for_display, format_timestamp
+from utils.history_store import readings_history, demo_history
+from utils.retention import readings_retention
+from utils.downsample import chart_downsampler, CHART_WIDTH_PX
+from utils.resample import resample
+from utils.map_helper import (create_ghana_water_map, display_map, create_risk_overlay_map, data_version, map_cache,
+                              render_map)
+from utils.map_metrics import MapMetrics, map_metrics
+from utils.tiles import tile_server
 from utils.alert_system import check_and_alert, TelegramAlertSystem
 from utils.prediction_engine import predictor
+from utils.geofence import protected_zones
+from utils.risk_delta import risk_snapshots
 from utils.cloud_logger import cloud_logger  # NEW: Enhanced logging system
+from utils.ingestion import load_uploaded_readings, missing_columns, ingest_csv_chunked, ingest_files
+from utils.upload_cache import fingerprint
+from utils.validation import describe_errors
+from utils.aggregates import AggregateEngine
+from utils.status_tracker import StatusTracker
+from utils.qc import QCEngine
+from utils.stream_recorder import LiveRecorder, ReplayDriver, list_recordings, profile_pipeline, RECORDINGS_DIR
 
 # === PROFESSIONAL PASSWORD PROTECTION ===
 # Show login if not authenticated
@@ -474,8 +490,10 @@ if 'stream_expanded' not in st.session_state:
     st.session_state.stream_expanded = True
 if 'map_view' not in st.session_state:
     st.session_state.map_view = "Current Monitoring"
-if 'previous_critical_count' not in st.session_state:
-    st.session_state.previous_critical_count = 0
+if 'status_tracker' not in st.session_state:
+    st.session_state.status_tracker = StatusTracker()
+if 'qc_engine' not in st.session_state:
+    st.session_state.qc_engine = QCEngine()
 if 'previous_high_risk_count' not in st.session_state:
     st.session_state.previous_high_risk_count = 0
 if 'show_critical_alert' not in st.session_state:
@@ -488,6 +506,47 @@ if 'live_data_df' not in st.session_state:
     st.session_state.live_data_df = None
 
 
+# Roll up and expire history in the background (one thread per server process)
+readings_retention.start()
+
+
+# ======== LIVE SESSION RECORDING ========
+def record_live_tick(new_df, alerts=None):
+    """Persist a live tick to the historical store and the active recording (if any)"""
+    try:
+        readings_history.append(new_df)
+    except Exception as e:
+        print(f"History store error (non-critical): {e}")
+
+    recorder = st.session_state.get('live_recorder')
+    if recorder is None:
+        return
+    try:
+        recorder.record_tick(
+            new_df,
+            events=st.session_state.get('live_events'),
+            predictions=st.session_state.get('predictions'),
+            alerts=alerts
+        )
+    except Exception as e:
+        print(f"Live recording error (non-critical): {e}")
+
+
+def process_live_tick(new_df, qc_engine, status_tracker, state=None):
+    """QC, classify and track one live tick; returns the frame and the rivers that became critical
+
+    The tick's status transitions are stored in state['status_transitions'] (the session's by default).
+    """
+    new_df = qc_engine.apply(new_df)  # Spikes/flatlines don't drive status
+    if 'status' not in new_df.columns:
+        new_df['status'] = classify_water_quality(new_df)
+
+    # Per-river status transitions since the previous tick
+    transitions = status_tracker.update(new_df)
+    (st.session_state if state is None else state)['status_transitions'] = transitions
+    return new_df, transitions[transitions['status'] == "🔴 Critical"]
+
+
 # ======== AUTO-REFRESH LOGIC ========
 def check_auto_refresh():
     """Check if it's time to auto-refresh and update data"""
@@ -502,31 +561,20 @@ def check_auto_refresh():
             st.session_state.update_count += 1
             st.session_state.refresh_trigger += 1  # Force refresh
 
-            # Store previous state to detect changes
-            previous_critical_count = st.session_state.get('previous_critical_count', 0)
-
             # Generate new data with variations
-            new_df = generate_sample_data(include_live_variation=True)
-            if 'status' not in new_df.columns:
-                new_df['status'] = new_df.apply(
-                    lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-                    axis=1
-                )
-
-            # Check for important changes that need attention
-            current_critical_count = len(new_df[new_df['status'] == "🔴 Critical"])
+            new_df, newly_critical = process_live_tick(generate_sample_data(include_live_variation=True),
+                                                       st.session_state.qc_engine, st.session_state.status_tracker)
 
             # Show notification for new critical events
-            if current_critical_count > previous_critical_count:
-                new_critical_count = current_critical_count - previous_critical_count
+            tick_alerts = newly_critical.to_dict('records')
+            if tick_alerts:
                 st.session_state.show_critical_alert = True
-                st.toast(f"🚨 NEW CRITICAL ALERT: {new_critical_count} new rivers in danger!", icon="🚨")
+                st.toast(f"🚨 NEW CRITICAL ALERT: {', '.join(newly_critical['river_name'])} now in danger!", icon="🚨")
 
                 # PLAY ACTUAL SOUND ALERT - THIS WILL WORK
                 play_critical_alert()
 
-            # Store current state for next comparison
-            st.session_state.previous_critical_count = current_critical_count
+            record_live_tick(new_df, tick_alerts)
 
             # Update the main dataframe
             st.session_state.live_data_df = new_df
@@ -549,10 +597,18 @@ Using AI to detect and predict water pollution events before they cause irrevers
 
 # ======== FIXED CSV/EXCEL UPLOAD ========
 st.sidebar.header("📤 Upload Your Water Data")
-uploaded_file = st.sidebar.file_uploader(
-    "Upload CSV or Excel file with water quality data",
-    type=['csv', 'xlsx', 'xls'],
-    key="file_uploader"
+uploaded_files = st.sidebar.file_uploader(
+    "Upload CSV, Excel or gateway (.bin) files with water quality data",
+    type=['csv', 'xlsx', 'xls', 'bin'],
+    accept_multiple_files=True,
+    key="file_uploader",
+    help="Select several station files at once to ingest a regional batch"
+)
+uploaded_file = uploaded_files[0] if uploaded_files else None
+stream_upload = st.sidebar.checkbox(
+    "Streaming mode for large CSV exports",
+    key="stream_upload",
+    help="Reads the file in chunks into the on-disk store instead of loading it all into memory"
 )
 
 # ======== SMART DATA DISPLAY ========
@@ -567,6 +623,45 @@ display_mode = st.sidebar.radio(
 )
 
 
+def get_streamed_upload(uploaded_file):
+    """Stream a large CSV into the historical store once; reruns reuse the ingestion summary"""
+    streamed = st.session_state.setdefault('streamed_uploads', {})
+    key = getattr(uploaded_file, 'file_id', None) or fingerprint(uploaded_file.getvalue(), uploaded_file.name)
+
+    if key not in streamed:
+        progress_bar = st.sidebar.progress(0.0, text="📥 Streaming upload...")
+        streamed[key] = ingest_csv_chunked(
+            uploaded_file,
+            progress=lambda fraction, rows: progress_bar.progress(
+                fraction, text=f"📥 Streaming upload... {rows:,} rows")
+        )
+        progress_bar.empty()
+
+    summary = streamed[key]
+    st.sidebar.caption(f"📦 {summary['rows']:,} rows added to history in {summary['chunks']} chunks "
+                       f"({summary['rejected']:,} rows rejected: {describe_errors(summary['validation'])})")
+
+    # Only the latest reading per station is kept in memory for the dashboard
+    return summary['latest']
+
+
+def get_batch_upload(uploaded_files):
+    """Ingest several station files in parallel once; reruns reuse the merged frame and report"""
+    batches = st.session_state.setdefault('batch_uploads', {})
+    key = tuple(getattr(f, 'file_id', None) or fingerprint(f.getvalue(), f.name) for f in uploaded_files)
+
+    if key not in batches:
+        with st.spinner(f"📥 Ingesting {len(uploaded_files)} files..."):
+            batches[key] = ingest_files([(f.name, f.getvalue()) for f in uploaded_files])
+
+    merged, report = batches[key]
+    st.sidebar.caption(f"📦 {report['accepted'].sum():,} rows accepted, {report['rejected'].sum():,} rejected, "
+                       f"{report['duplicates'].sum():,} duplicates dropped")
+    with st.sidebar.expander("📋 Batch ingestion report"):
+        st.dataframe(report, hide_index=True)
+    return merged
+
+
 def get_combined_data():
     # Use live data if available and in live mode
     if st.session_state.get('live_mode', False) and st.session_state.live_data_df is not None:
@@ -578,36 +673,29 @@ def get_combined_data():
 
     # Ensure base_df has status column
     if 'status' not in base_df.columns:
-        base_df['status'] = base_df.apply(
-            lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-            axis=1
-        )
+        base_df['status'] = classify_water_quality(base_df)
 
     # Process uploaded file ONLY if it exists
     if uploaded_file is not None:
         try:
-            # Read file based on type
-            if uploaded_file.name.endswith('.csv'):
-                user_df = pd.read_csv(uploaded_file)
-            else:  # Excel file
-                user_df = pd.read_excel(uploaded_file)
-
-            required_columns = ['latitude', 'longitude', 'turbidity_ntu', 'ph', 'river_name']
-
-            if all(col in user_df.columns for col in required_columns):
-                st.sidebar.success("✅ File successfully loaded!")
-
-                # Add missing columns with defaults
-                if 'timestamp' not in user_df.columns:
-                    user_df['timestamp'] = dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                if 'dissolved_oxygen' not in user_df.columns:
-                    user_df['dissolved_oxygen'] = 5.0
-
-                # Add status column
-                user_df['status'] = user_df.apply(
-                    lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-                    axis=1
-                )
+            # Parse (CSV, Excel or gateway binary), validate and classify -
+            # reruns with the same file reuse the cached frame
+            if len(uploaded_files) > 1:
+                user_df = get_batch_upload(uploaded_files)
+            elif stream_upload and uploaded_file.name.endswith('.csv'):
+                user_df = get_streamed_upload(uploaded_file)
+            else:
+                user_df = load_uploaded_readings(uploaded_file)
+                validation = user_df.attrs.get('validation')
+                if validation and validation['rejected']:
+                    st.sidebar.warning(f"⚠️ {validation['rejected']:,} of {validation['rows']:,} rows rejected "
+                                       f"({describe_errors(validation)})")
+
+            missing_cols = missing_columns(user_df)
+
+            if not missing_cols:
+                st.sidebar.success("✅ File successfully loaded!" if len(uploaded_files) == 1
+                                   else f"✅ {len(uploaded_files)} files successfully loaded!")
 
                 # APPLY DISPLAY MODE PREFERENCE
                 if display_mode == "Only My Uploaded Data":
@@ -625,7 +713,6 @@ def get_combined_data():
                     return base_df
 
             else:
-                missing_cols = [col for col in required_columns if col not in user_df.columns]
                 st.sidebar.error(f"❌ Missing columns: {missing_cols}")
                 return base_df
 
@@ -638,15 +725,20 @@ def get_combined_data():
 
 # ======== SAFE DATA LOADING ========
 try:
-    df = get_combined_data()
+    # Canonical dtypes (categorical labels, float32, epoch timestamps) for the whole session
+    df = to_canonical(get_combined_data())
 
     # DOUBLE CHECK: Ensure status column exists
     if 'status' not in df.columns:
         st.error("❌ Status column missing - creating it now...")
-        df['status'] = df.apply(
-            lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-            axis=1
-        )
+        df['status'] = classify_water_quality(df)
+
+    # Current status counts behind the metric cards. The readings are regenerated on every rerun,
+    # so they are not folded into the engine's rolling windows (that would count them again each time)
+    if 'aggregates' not in st.session_state:
+        st.session_state.aggregates = AggregateEngine()
+    aggregates = st.session_state.aggregates
+    aggregates.update_snapshot(df)
 
 except Exception as e:
     st.error(f"❌ Critical error loading data: {str(e)}")
@@ -702,11 +794,11 @@ col_left, col_right = st.columns([2, 1])
 col1, col2, col3, col4, col5 = st.columns(5)
 
 with col1:
-    critical_count = len(df[df['status'] == "🔴 Critical"])
+    critical_count = aggregates.status_count("🔴 Critical")
     st.metric("🚨 Critical Rivers", critical_count, delta=None)
 
 with col2:
-    warning_count = len(df[df['status'] == "🟡 Warning"])
+    warning_count = aggregates.status_count("🟡 Warning")
     st.metric("⚠️ Warning Rivers", warning_count, delta=None)
 
 with col3:
@@ -715,7 +807,7 @@ with col3:
             [p for p in st.session_state.predictions if "HIGH" in p['risk_level'] or "CRITICAL" in p['risk_level']])
         st.metric("🔴 Predicted High Risk", high_risk_count)
     else:
-        total_rivers = len(df)
+        total_rivers = aggregates.monitored_count()
         st.metric("📊 Total Monitored", total_rivers)
 
 with col4:
@@ -769,11 +861,11 @@ if st.session_state.get('live_mode', False):
             with st.expander(f"**{river['river_name']}** - Critical Conditions", expanded=False):
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.write(f"**Turbidity:** {river['turbidity_ntu']} NTU")
+                    st.write(f"**Turbidity:** {river['turbidity_ntu']:.1f} NTU")
                     st.write(f"**pH Level:** {river['ph']:.1f}")
                 with col2:
                     st.write(f"**Dissolved Oxygen:** {river['dissolved_oxygen']:.1f} mg/L")
-                    st.write(f"**Last Reading:** {river['timestamp']}")
+                    st.write(f"**Last Reading:** {format_timestamp(river['timestamp'])}")
 
     # HIGH-RISK PREDICTIONS PANEL
     if 'predictions' in st.session_state:
@@ -809,23 +901,16 @@ if st.session_state.get('live_mode', False):
         st.session_state.update_count += 1
 
         # Generate new data
-        new_df = generate_sample_data(include_live_variation=True)
-        if 'status' not in new_df.columns:
-            new_df['status'] = new_df.apply(
-                lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-                axis=1
-            )
-
-        # Check for critical changes
-        previous_critical = st.session_state.get('previous_critical_count', 0)
-        current_critical = len(new_df[new_df['status'] == "🔴 Critical"])
+        new_df, newly_critical = process_live_tick(generate_sample_data(include_live_variation=True),
+                                                   st.session_state.qc_engine, st.session_state.status_tracker)
 
-        if current_critical > previous_critical:
-            new_critical = current_critical - previous_critical
-            st.toast(f"🚨 New Critical Alert: {new_critical} additional rivers in danger", icon="🚨")
+        tick_alerts = newly_critical.to_dict('records')
+        if tick_alerts:
+            st.toast(f"🚨 New Critical Alert: {', '.join(newly_critical['river_name'])} now in danger", icon="🚨")
             play_critical_alert()  # Play sound for critical alerts
 
-        st.session_state.previous_critical_count = current_critical
+        record_live_tick(new_df, tick_alerts)
+
         st.session_state.live_data_df = new_df
 
         # Force refresh
@@ -845,6 +930,15 @@ with col_pred1:
         with st.spinner("📍 Assessing mining hotspots..."):
             time.sleep(1)
         with st.spinner("🤖 Calculating pollution risks..."):
+            # Observed turbidity trends on a regular hourly grid (short gaps interpolated)
+            recent_start = dt.datetime.now() - dt.timedelta(days=2)
+            recent = readings_history.query(start=recent_start, parameters=['river_name', 'turbidity_ntu'])
+            if recent.empty:  # Nothing recorded lately: the synthetic demo backfill stands in
+                demo_history.seed(generate_historical_readings)
+                recent = demo_history.query(start=recent_start, parameters=['river_name', 'turbidity_ntu'])
+            predictor.update_observations(resample(recent, 'hourly', columns=['turbidity_ntu'], fill='linear',
+                                                   max_gap=3, station_column='river_name'))
+
             # Generate predictions for current rivers
             predictions = []
             for _, river in df.iterrows():
@@ -860,6 +954,10 @@ with col_pred1:
 
             st.session_state.predictions = predictions
             st.session_state.risk_map_data = risk_map_data
+            # Cells that changed since this session's previous Risk Check (map layer and zone alerts)
+            risk_changes = risk_snapshots.record(risk_map_data, previous=st.session_state.get('risk_snapshot'))
+            st.session_state.risk_changes = risk_changes
+            st.session_state.risk_snapshot = risk_changes.attrs['snapshot']
 
         st.sidebar.success("✅ AI risk assessment complete!")
 
@@ -947,12 +1045,31 @@ with col_left:
 
 
     # SINGLE MAP DISPLAY - NO DUPLICATES
+    # Rendered HTML is cached per (data version, view, layer mode): unchanged maps aren't rebuilt
+    map_layer_mode = 'auto'
     try:
         if st.session_state.map_view == "AI Risk Prediction":
             if 'risk_map_data' in st.session_state and not st.session_state.risk_map_data.empty:
-                risk_map = create_risk_overlay_map(df, st.session_state.risk_map_data)
-                display_map(risk_map)
+                # Heatmap: the risk grid as one smoothed image at 0.05° instead of a symbol per cell
+                # Tiles: risk and satellite turbidity pyramids from the tile server (zoomable), offered
+                # only when GUARDIAN_TILE_URL gives the browser an address for it
+                risk_layers = ["Points", "Heatmap"] + (["Tiles"] if tile_server.public else [])
+                risk_layer = st.radio("Risk Layer:", risk_layers, horizontal=True, key="risk_layer")
+                map_layer_mode = {"Points": 'auto', "Heatmap": 'raster', "Tiles": 'tiles'}[risk_layer]
+                risk_changes = st.session_state.get('risk_changes')
+                if risk_changes is not None and risk_changes.attrs.get('previous') is None:
+                    risk_changes = None  # First snapshot: no baseline, every cell would show as new
+                display_map(
+                    key=(data_version(df, st.session_state.risk_map_data, risk_changes), "AI Risk Prediction",
+                         map_layer_mode),
+                    build=lambda: create_risk_overlay_map(df, st.session_state.risk_map_data, mode=map_layer_mode,
+                                                          resolution=0.05, smoothing=2, changes=risk_changes)
+                )
                 st.success("🎯 **AI Risk Map Active**: Showing predicted pollution risk areas")
+                if risk_changes is not None:
+                    st.info(f"🔄 **Since last check**: {len(risk_changes)} cells changed "
+                            f"({(risk_changes['change'] > 0).sum()} up, {(risk_changes['change'] < 0).sum()} down) • "
+                            f"{risk_changes.attrs['tiles_unchanged']} of {risk_changes.attrs['tiles']} grid tiles unchanged")
 
                 # Risk distribution analysis
                 risk_data = st.session_state.risk_map_data
@@ -973,13 +1090,21 @@ with col_left:
                 if critical_risks > 0:
                     hotspots = risk_data[risk_data['risk_score'] >= 80]['river_name'].value_counts()
                     st.warning(f"🚨 **Critical Risk Hotspots**: {', '.join(hotspots.index[:3])}")
+
+                # Critical stations, critical cells and mining sites inside protected zones
+                breaches = protected_zones.breaches(stations=df, risk_cells=risk_data,
+                                                    detections=predictor.mining_hotspots)
+                if not breaches.empty:
+                    counts = breaches['zone'].value_counts()
+                    st.error("🛡️ **Protected Zone Breaches**: " +
+                             ", ".join(f"{zone} ({n})" for zone, n in counts.items()))
             else:
                 st.warning("⚠️ No AI risk data available. Please run 'Risk Check' first.")
-                water_map = create_ghana_water_map(df)
-                display_map(water_map)
+                display_map(key=(data_version(df), "Current Monitoring", map_layer_mode),
+                            build=lambda: create_ghana_water_map(df, mode=map_layer_mode))
         else:
-            water_map = create_ghana_water_map(df)
-            display_map(water_map)
+            display_map(key=(data_version(df), "Current Monitoring", map_layer_mode),
+                        build=lambda: create_ghana_water_map(df, mode=map_layer_mode))
             st.info("📊 **Current Monitoring**: Real-time water quality status")
 
     except Exception as e:
@@ -1054,12 +1179,23 @@ with col_right:
             st.success(f"🟢 **Live Monitoring** - {st.session_state.update_count} updates received")
 
         # Alert status
-        critical_count = len(df[df['status'] == "🔴 Critical"])
+        critical_count = aggregates.status_count("🔴 Critical")
         if critical_count > 0:
             st.error(f"🚨 **{critical_count} CRITICAL** rivers need attention!")
         else:
             st.success("✅ No critical alerts")
 
+        # Rivers that changed status on the last tick
+        transitions = st.session_state.get('status_transitions')
+        if transitions is not None and not transitions.empty:
+            st.write("**Status changes:**")
+            for _, change in transitions.iterrows():
+                message = f"{change['river_name']}: {change['previous_status']} → {change['status']}"
+                if change['escalated']:
+                    st.warning(message)
+                else:
+                    st.info(message)
+
         # Prediction status
         if 'predictions' in st.session_state:
             high_risk_count = len([p for p in st.session_state.predictions
@@ -1120,7 +1256,8 @@ st.markdown("---")
 st.subheader("📋 Detailed Water Quality Data")
 
 try:
-    st.dataframe(df[['river_name', 'turbidity_ntu', 'ph', 'dissolved_oxygen', 'status', 'timestamp']], height=300)
+    st.dataframe(for_display(df[['river_name', 'turbidity_ntu', 'ph', 'dissolved_oxygen', 'status', 'timestamp']]),
+                 height=300)
 except Exception as e:
     st.error(f"Error displaying data: {str(e)}")
 
@@ -1356,6 +1493,91 @@ else:
         if st.button("💾 Save Configuration"):
             st.success("Configuration saved!")
 
+        # Live session recording and replay (load testing / profiling)
+        st.write("**🎬 Live Session Recorder**")
+        if st.session_state.get('live_recorder') is None:
+            if st.button("⏺️ Start Recording", key="start_recording"):
+                st.session_state.live_recorder = LiveRecorder()
+                st.rerun()
+        else:
+            recorder = st.session_state.live_recorder
+            st.caption(f"Recording to {recorder.log_dir} • {recorder.tick} ticks")
+            if st.button("⏹️ Stop Recording", key="stop_recording"):
+                st.session_state.live_recorder = None
+                st.rerun()
+
+        # Tiered retention: raw readings expire, hourly/daily rollups follow the client tiers
+        st.write("**🗄️ Data Retention**")
+        retention_stats = readings_retention.stats()
+        st.dataframe(pd.DataFrame([
+            {'Table': name.title(), 'Months': table['months'], 'Size (MB)': round(table['bytes'] / 1e6, 2),
+             'Kept (days)': table['retention_days']}
+            for name, table in retention_stats.items()
+        ]), hide_index=True, use_container_width=True)
+        if readings_retention.last_run:
+            last_run = readings_retention.last_run
+            st.caption(f"Last compaction: {last_run['months_rolled_up']} months rolled up, "
+                       f"{last_run['months_merged']} merged, {last_run['partitions_expired']} partitions expired "
+                       f"in {last_run['elapsed_s']:.1f}s")
+        if st.button("🗜️ Compact Now", key="compact_history"):
+            with st.spinner("Rolling up and expiring history..."):
+                readings_retention.compact()
+            st.rerun()
+
+        # Map payload per render; 'auto' layers over budget switch to aggregates / raster
+        st.write("**🗺️ Map Rendering**")
+        # The budgets are shared by every session: only an edit writes them, not every rerun
+        def set_map_budget(budget, key, scale=1):
+            map_metrics.budgets[budget] = type(map_metrics.budgets[budget])(st.session_state[key] * scale)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.number_input("Marker Budget", 100, 100000, map_metrics.budgets['markers'], step=100,
+                            key="budget_markers", on_change=set_map_budget, args=('markers', "budget_markers"))
+        with col2:
+            st.number_input("HTML Budget (MB)", 0.5, 50.0, map_metrics.budgets['html_bytes'] / 1e6, step=0.5,
+                            key="budget_html", on_change=set_map_budget, args=('html_bytes', "budget_html", 1e6))
+        with col3:
+            st.number_input("Render Budget (s)", 0.1, 30.0, float(map_metrics.budgets['render_s']), step=0.1,
+                            key="budget_render", on_change=set_map_budget, args=('render_s', "budget_render"))
+
+        map_summary = map_metrics.summary()
+        if map_summary:
+            st.dataframe(pd.DataFrame([
+                {'Map': name, 'Renders': entry['renders'], 'Cache Hits': entry['cache_hits'],
+                 'Markers': entry['last']['markers'], 'HTML (KB)': round(entry['last']['html_bytes'] / 1e3, 1),
+                 'Build (s)': round(entry['last']['build_s'] or 0, 3),
+                 'Serialize (s)': round(entry['last']['serialize_s'] or 0, 3),
+                 'Max HTML (KB)': round(entry['max_html_bytes'] / 1e3, 1),
+                 'Switched': ', '.join(f"{layer} → {mode}" for layer, mode in entry['last']['switched'].items())}
+                for name, entry in map_summary.items()
+            ]), hide_index=True, use_container_width=True)
+        else:
+            st.caption("No maps rendered yet")
+        cache_stats = map_cache.stats()
+        st.caption(f"Map cache: {cache_stats['entries']} pages, {cache_stats['hits']} hits / "
+                   f"{cache_stats['misses']} misses, {cache_stats['bytes'] / 1e6:.1f} MB")
+        if tile_server.start():
+            st.caption(f"Metrics API: {tile_server.url}/metrics/maps.json")
+
+        recordings = list_recordings()
+        if recordings:
+            replay_session = st.selectbox("Recorded Session", recordings, key="replay_session")
+            replay_speed = st.select_slider("Replay Speed", [1, 10, 100, 1000], value=100, key="replay_speed")
+            if st.button("▶️ Replay Through Pipeline", key="replay_recording"):
+                with st.spinner("Replaying recorded ticks..."):
+                    driver = ReplayDriver(os.path.join(RECORDINGS_DIR, replay_session), speed=replay_speed)
+                    # The live tick path itself, with its own QC / status state and map metrics so the
+                    # session's are untouched
+                    replay_qc, replay_tracker, replay_state = QCEngine(), StatusTracker(), {}
+                    with map_metrics.diverted(MapMetrics(map_metrics.budgets)):
+                        replay = driver.run(profile_pipeline(
+                            lambda readings: process_live_tick(readings, replay_qc, replay_tracker, replay_state),
+                            lambda readings: render_map(create_ghana_water_map(readings))))
+                st.success(f"✅ Replayed {replay['ticks']} ticks at {replay['speed']}× in {replay['elapsed_s']:.1f}s")
+                if replay['results']:
+                    st.dataframe(pd.DataFrame(replay['results']).describe().round(2))
+
     # SECURITY TAB
     with admin_tab5 if st.session_state.get('is_ceo', False) else admin_tab4:
         st.write("### Security Dashboard")
@@ -1486,17 +1708,46 @@ if st.session_state.get('show_epa_tools', False) or st.session_state.get('is_ceo
         if st.sidebar.button("📊 Trend Analysis", key="trend_analysis"):
             st.info("### 📈 Long-term Water Quality Trends")
 
-            # Simulate historical data
-            dates = pd.date_range(end=dt.datetime.now(), periods=30, freq='D')
-            trend_data = pd.DataFrame({
-                'Date': dates,
-                'Pra River Turbidity': np.random.randint(80, 400, 30),
-                'Ankobra River pH': np.random.uniform(5.2, 7.0, 30),
-                'Birim River DO': np.random.uniform(2.0, 8.0, 30)
-            })
+            # Query the historical store: 30 days of three stations, answered from hourly rollups.
+            # Until readings are recorded, the synthetic demo backfill is shown instead (labelled)
+            demo_trend = not readings_history.has_data()
+            if demo_trend:
+                demo_history.seed(generate_historical_readings)
+            trend_store = demo_history if demo_trend else readings_retention
+            series = {
+                'Pra River Turbidity': ('PRA-01', 'turbidity_ntu'),
+                'Ankobra River pH': ('ANK-01', 'ph'),
+                'Birim River DO': ('BIR-01', 'dissolved_oxygen')
+            }
+            trend_range = (dt.date.today() - dt.timedelta(days=30), dt.date.today())
+
+            def load_trend():
+                history = trend_store.query(
+                    start=trend_range[0],
+                    keys=[station for station, _ in series.values()],
+                    parameters=sorted({parameter for _, parameter in series.values()})
+                )
+                # Irregular readings onto an hourly grid, gaps up to 3 hours interpolated
+                history = resample(history, 'hourly', columns=sorted({p for _, p in series.values()}),
+                                   fill='linear', max_gap=3)
+                history['Date'] = pd.to_datetime(history['timestamp'], unit='s')
+                return pd.concat([
+                    history.loc[history['station_id'] == station, ['Date', parameter]]
+                    .rename(columns={parameter: 'Value'}).assign(Series=label)
+                    for label, (station, parameter) in series.items()
+                ])
+
+            # Min/max envelope keeps every pollution spike within the chart's pixel budget
+            trend_data = chart_downsampler.get(
+                ('readings_trend', demo_trend, readings_history.version, readings_retention.version,
+                 demo_history.version), trend_range, CHART_WIDTH_PX, load_trend,
+                x='Date', y='Value', method='minmax', by='Series'
+            )
 
-            st.line_chart(trend_data.set_index('Date'))
-            st.caption("30-day water quality trends for major rivers")
+            st.line_chart(trend_data, x='Date', y='Value', color='Series')
+            st.caption("30-day water quality trends for major rivers " + (
+                "(synthetic demo data - no readings recorded yet)" if demo_trend
+                else "(hourly readings from the historical store)"))
 
     # ======== EPA SUCCESS METRICS ========
     st.sidebar.markdown("---")
@@ -1618,6 +1869,8 @@ if st.sidebar.checkbox("Show Business Dashboard", key="business_dashboard"):
         portal = enterprise_dashboard.generate_client_portal(client_type)
 
         st.success(f"### {portal['welcome_message']}")
+        st.caption(f"Data retention: {enterprise_dashboard.client_tiers[client_type]['data_retention']} "
+                   f"(hourly and daily rollups; raw readings for {readings_retention.raw_days} days)")
 
         col1, col2 = st.columns(2)
         with col1:
@@ -1,22 +1,24 @@
+import numpy as np
 import pandas as pd
 import random
 from datetime import datetime, timedelta
+from utils.schema import to_canonical, now_epoch
+
+# Major rivers affected by galamsey, one monitoring station each
+RIVERS = [
+    {"station_id": "PRA-01", "name": "Pra River", "lat": 5.5, "lon": -1.0, "risk": "high"},
+    {"station_id": "ANK-01", "name": "Ankobra River", "lat": 5.2, "lon": -2.2, "risk": "high"},
+    {"station_id": "BIR-01", "name": "Birim River", "lat": 6.2, "lon": -1.1, "risk": "medium"},
+    {"station_id": "TAN-01", "name": "Tano River", "lat": 6.3, "lon": -2.8, "risk": "medium"},
+    {"station_id": "OFF-01", "name": "Offin River", "lat": 6.2, "lon": -1.9, "risk": "high"},
+]
 
 
 def generate_sample_data(include_live_variation=False):
     """Generate realistic sample water quality data for major Ghanaian rivers"""
 
-    # Major rivers affected by galamsey
-    rivers = [
-        {"name": "Pra River", "lat": 5.5, "lon": -1.0, "risk": "high"},
-        {"name": "Ankobra River", "lat": 5.2, "lon": -2.2, "risk": "high"},
-        {"name": "Birim River", "lat": 6.2, "lon": -1.1, "risk": "medium"},
-        {"name": "Tano River", "lat": 6.3, "lon": -2.8, "risk": "medium"},
-        {"name": "Offin River", "lat": 6.2, "lon": -1.9, "risk": "high"},
-    ]
-
     data = []
-    for river in rivers:
+    for river in RIVERS:
         # Base values with some randomness to simulate real conditions
         base_turbidity = random.randint(10, 50) if river["risk"] == "low" else random.randint(50, 150)
         base_ph = random.uniform(6.0, 7.5) if river["risk"] == "low" else random.uniform(5.0, 6.5)
@@ -39,28 +41,75 @@ def generate_sample_data(include_live_variation=False):
             base_ph -= 1.5  # Simulate acidification
 
         record = {
+            "station_id": river["station_id"],
             "river_name": river["name"],
             "latitude": river["lat"],
             "longitude": river["lon"],
             "turbidity_ntu": max(1, base_turbidity + random.randint(-10, 10)),
             "ph": max(4.0, min(9.0, base_ph + random.uniform(-0.5, 0.5))),
             "dissolved_oxygen": random.uniform(2.0, 8.0),
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "timestamp": now_epoch(),
             "risk_level": river["risk"]
         }
         data.append(record)
 
-    return pd.DataFrame(data)
+    return to_canonical(pd.DataFrame(data))
 
 
-def get_water_quality_status(turbidity, ph):
-    """Determine status based on water quality parameters"""
-    if turbidity > 100 or ph < 5.5 or ph > 8.5:
-        return "🔴 Critical"
-    elif turbidity > 50 or ph < 6.0 or ph > 8.0:
-        return "🟡 Warning"
+def generate_historical_readings(days=730, freq='h', end=None, since=None):
+    """Generate a backfill of historical readings for every station (vectorized)
+
+    With since (epoch seconds) only the readings after it, up to end, are generated.
+    """
+    from utils.rules import classify_water_quality
+
+    end = end or datetime.now().replace(minute=0, second=0, microsecond=0)
+    if since is None:
+        times = pd.date_range(end=end, periods=int(pd.Timedelta(days=days) / pd.Timedelta(1, unit=freq)), freq=freq)
     else:
-        return "🟢 Normal"
+        since = pd.to_datetime(since, unit='s')
+        times = pd.date_range(since, end, freq=freq)
+        times = times[times > since]
+        if times.empty:
+            return pd.DataFrame()
+    rng = np.random.default_rng()
+    frames = []
+    for river in RIVERS:
+        n = len(times)
+        high = river["risk"] == "high"
+
+        # Seasonal rains (May-October) raise turbidity, mining activity peaks in daytime
+        wet_season = np.isin(times.month, [5, 6, 7, 8, 9, 10])
+        daytime = (times.hour >= 6) & (times.hour <= 18)
+        turbidity = rng.uniform(50, 150, n) * np.where(wet_season, 1.3, 1.0) * np.where(daytime, 1.2, 0.9)
+        ph = rng.uniform(5.0, 6.5, n) if high else rng.uniform(5.5, 7.0, n)
+
+        # Pollution spikes for high-risk rivers
+        spikes = rng.random(n) > (0.97 if high else 0.99)
+        turbidity = np.where(spikes, turbidity * 3, turbidity)
+        ph = np.where(spikes, ph - 1.0, ph)
+
+        frames.append(pd.DataFrame({
+            "station_id": river["station_id"],
+            "river_name": river["name"],
+            "latitude": river["lat"],
+            "longitude": river["lon"],
+            "turbidity_ntu": np.minimum(500, np.maximum(1, turbidity)),
+            "ph": np.clip(ph, 4.0, 9.0),
+            "dissolved_oxygen": rng.uniform(2.0, 8.0, n),
+            "timestamp": times,
+            "risk_level": river["risk"]
+        }))
+
+    df = to_canonical(pd.concat(frames, ignore_index=True))
+    df['status'] = classify_water_quality(df)
+    return df
+
+
+def get_water_quality_status(turbidity, ph):
+    """Determine status based on water quality parameters (single reading)"""
+    from utils.rules import water_quality_rules
+    return water_quality_rules.classify({'turbidity_ntu': [turbidity], 'ph': [ph]})[0]
 
 
 def get_historical_actual_data():
@@ -26,6 +26,11 @@ from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
+from utils.aggregates import AggregateEngine
+from utils.rules import compile_rules, mining_alert_rules, mining_compliance_rules
+from utils.history_store import mining_history
+from utils.downsample import chart_downsampler, CHART_WIDTH_PX
+from utils.resample import resample
 
 st.set_page_config(
     page_title="Mining Operations Portal - Guardian Ghana",
@@ -351,36 +356,85 @@ def generate_mining_operations_data(mine_name, days=30):
             base_turbidity *= 0.7
             base_do *= 1.1
 
-        # Compliance calculation
-        compliance = "🟢 Compliant"
-        if base_turbidity > 100 or base_ph < 6.0 or base_do < 5.0:
-            compliance = "🔴 Non-Compliant"
-        elif base_turbidity > 70 or base_ph < 6.5 or base_do < 6.0:
-            compliance = "🟡 Warning"
-
         data.append({
             "Date": date,
             "Turbidity_NTU": base_turbidity,
             "pH": round(base_ph, 2),
             "Dissolved_Oxygen": round(base_do, 2),
-            "Compliance_Status": compliance,
             "Mine": mine_name,
             "Daily_Throughput": np.random.randint(50000, 150000),
             "Water_Usage_m3": np.random.randint(5000, 15000),
             "Treatment_Cost_GH₵": np.random.randint(5000, 20000)
         })
 
-    return pd.DataFrame(data)
+    df = pd.DataFrame(data)
+
+    # Compliance calculation (one vectorized pass over all days)
+    df.insert(4, "Compliance_Status", mining_compliance_rules.classify(df))
+    return df
+
+
+def backfill_mining_history(days=3 * 365, since=None):
+    """Three years of operations data for both mines; with since, only the days after it"""
+    if since is not None:
+        days = (datetime.now().date() - pd.to_datetime(since, unit='s').date()).days
+        if days <= 0:
+            return pd.DataFrame()
+    return pd.concat([generate_mining_operations_data(mine, days) for mine in ("Tarkwa Mine", "Damang Mine")],
+                     ignore_index=True)
+
+
+# Historical data lives in the partitioned store; only the selected period is read
+mining_history.seed(backfill_mining_history)
+period = tuple(date_range) if isinstance(date_range, (list, tuple)) else (date_range,)
+period = (period[0], period[-1]) if period else (datetime.now().date() - timedelta(days=30), datetime.now().date())
 
+# Query the store and fold the period into the per-mine aggregates when it changes
+if st.session_state.get('mining_period') != period:
+    history = mining_history.query(start=period[0], end=period[1], keys=["Tarkwa Mine", "Damang Mine"])
 
-# Generate data
-tarkwa_data = generate_mining_operations_data("Tarkwa Mine", 30)
-damang_data = generate_mining_operations_data("Damang Mine", 30)
+    # Align both mines to exactly one row per day: readings averaged, volumes and costs
+    # summed, short reporting gaps (up to 2 days) forward-filled
+    history = resample(
+        history, 'daily',
+        columns=['Turbidity_NTU', 'pH', 'Dissolved_Oxygen', 'Daily_Throughput', 'Water_Usage_m3', 'Treatment_Cost_GH₵'],
+        agg={'Daily_Throughput': 'sum', 'Water_Usage_m3': 'sum', 'Treatment_Cost_GH₵': 'sum'},
+        fill='ffill', max_gap=2, station_column='Mine', time_column='Date'
+    )
+    history = history[history['Turbidity_NTU'].notna()].reset_index(drop=True)
+    for column in ['Daily_Throughput', 'Water_Usage_m3', 'Treatment_Cost_GH₵']:
+        history[column] = history[column].round().astype(int)
+    history['pH'] = history['pH'].round(2)
+    history['Dissolved_Oxygen'] = history['Dissolved_Oxygen'].round(2)
+    history['Date'] = pd.to_datetime(history['Date'], unit='s').dt.date
+    history['Compliance_Status'] = mining_compliance_rules.classify(history)
+    history = history[['Date', 'Turbidity_NTU', 'pH', 'Dissolved_Oxygen', 'Compliance_Status', 'Mine',
+                       'Daily_Throughput', 'Water_Usage_m3', 'Treatment_Cost_GH₵', 'n_readings', 'filled']]
+    st.session_state.mining_period = period
+    st.session_state.mining_data_by_mine = {
+        mine: history[history['Mine'] == mine].reset_index(drop=True) for mine in ("Tarkwa Mine", "Damang Mine")
+    }
+    st.session_state.mining_aggregates = AggregateEngine(
+        dimensions=('Mine',),
+        columns=('Turbidity_NTU', 'pH', 'Dissolved_Oxygen', 'Water_Usage_m3'),
+        category_columns=('Compliance_Status',),
+        station_column='Mine',
+        time_column='Date',
+        bucket_seconds=86400,
+        sliding_buckets=30
+    )
+    st.session_state.mining_aggregates.ingest(history)
+
+tarkwa_data = st.session_state.mining_data_by_mine["Tarkwa Mine"]
+damang_data = st.session_state.mining_data_by_mine["Damang Mine"]
+mining_aggregates = st.session_state.mining_aggregates
 
 if selected_mine == "Both Operations":
     mining_data = pd.concat([tarkwa_data, damang_data])
+    selected_mines = ["Tarkwa Mine", "Damang Mine"]
 else:
     mining_data = tarkwa_data if "Tarkwa" in selected_mine else damang_data
+    selected_mines = ["Tarkwa Mine" if "Tarkwa" in selected_mine else "Damang Mine"]
 
 # === DASHBOARD ===
 st.markdown('<div class="mining-section">', unsafe_allow_html=True)
@@ -390,26 +444,27 @@ st.header(f"📊 {selected_mine} - Environmental Performance")
 col1, col2, col3, col4, col5 = st.columns(5)
 
 with col1:
-    compliance_rate = (mining_data['Compliance_Status'] == "🟢 Compliant").mean() * 100
+    compliance_rate = (mining_aggregates.category_count('Mine', selected_mines, 'Compliance_Status', "🟢 Compliant")
+                       / max(1, mining_aggregates.category_count('Mine', selected_mines, 'Compliance_Status')) * 100)
     st.metric("Compliance Rate", f"{compliance_rate:.1f}%",
               delta=f"{(compliance_rate - 95):+.1f}%" if compliance_rate else None)
 
 with col2:
-    avg_turbidity = mining_data['Turbidity_NTU'].mean()
+    avg_turbidity = mining_aggregates.combined_stats('Mine', selected_mines, 'Turbidity_NTU').mean
     st.metric("Avg Turbidity", f"{avg_turbidity:.0f} NTU",
               delta="-5 NTU" if avg_turbidity < 75 else "+5 NTU")
 
 with col3:
-    avg_ph = mining_data['pH'].mean()
+    avg_ph = mining_aggregates.combined_stats('Mine', selected_mines, 'pH').mean
     st.metric("Avg pH", f"{avg_ph:.2f}",
               delta="Optimal" if 6.5 <= avg_ph <= 7.5 else "Review")
 
 with col4:
-    incidents = (mining_data['Compliance_Status'] == "🔴 Non-Compliant").sum()
+    incidents = mining_aggregates.category_count('Mine', selected_mines, 'Compliance_Status', "🔴 Non-Compliant")
     st.metric("Non-Compliance Incidents", incidents, delta="This Month")
 
 with col5:
-    water_usage = mining_data['Water_Usage_m3'].sum()
+    water_usage = int(mining_aggregates.combined_stats('Mine', selected_mines, 'Water_Usage_m3').total)
     st.metric("Total Water Usage", f"{water_usage:,} m³", delta="Monthly")
 
 st.markdown('</div>', unsafe_allow_html=True)
@@ -421,8 +476,12 @@ st.header("📈 Compliance Trend Analysis")
 col1, col2 = st.columns(2)
 
 with col1:
-    # Compliance Trend Chart
-    fig_compliance = px.line(mining_data, x='Date', y='Turbidity_NTU',
+    # Compliance Trend Chart (LTTB keeps the line shape within the chart's pixel budget)
+    turbidity_points = chart_downsampler.get(
+        ('mining_turbidity', selected_mine, mining_history.version), period, CHART_WIDTH_PX,
+        lambda: mining_data, x='Date', y='Turbidity_NTU', by='Mine'
+    )
+    fig_compliance = px.line(turbidity_points, x='Date', y='Turbidity_NTU',
                              color='Mine' if selected_mine == "Both Operations" else None,
                              title='Turbidity Trend vs EPA Limit (100 NTU)',
                              labels={'Turbidity_NTU': 'Turbidity (NTU)', 'Date': 'Date'})
@@ -434,8 +493,12 @@ with col1:
     st.plotly_chart(fig_compliance, use_container_width=True)
 
 with col2:
-    # pH Compliance Chart
-    fig_ph = px.scatter(mining_data, x='Date', y='pH',
+    # pH Compliance Chart (min/max envelope keeps every out-of-range reading)
+    ph_points = chart_downsampler.get(
+        ('mining_ph', selected_mine, mining_history.version), period, CHART_WIDTH_PX,
+        lambda: mining_data, x='Date', y='pH', method='minmax', by='Mine'
+    )
+    fig_ph = px.scatter(ph_points, x='Date', y='pH',
                         color='Compliance_Status',
                         title='pH Levels & Compliance Status',
                         labels={'pH': 'pH Level', 'Date': 'Date'},
@@ -703,6 +766,17 @@ with col1:
     st.number_input("pH Alert Range - Min:", min_value=4.0, max_value=7.0, value=6.0, step=0.1, key="ph_min")
     st.number_input("pH Alert Range - Max:", min_value=7.0, max_value=10.0, value=8.5, step=0.1, key="ph_max")
 
+    # Compile the configured ranges and check them against the selected history
+    alert_rules = compile_rules(mining_alert_rules(
+        selected_mine, st.session_state.turbidity_threshold, st.session_state.ph_min, st.session_state.ph_max))
+    _, fired_rules, _ = alert_rules.evaluate(mining_data)
+    breaches = pd.Series(fired_rules).dropna().value_counts()
+    if breaches.empty:
+        st.caption("✅ No readings in this period breach the configured ranges")
+    else:
+        st.caption("Readings breaching these settings: " +
+                   ", ".join(f"{rule.replace('_', ' ')}: {count}" for rule, count in breaches.items()))
+
     if st.button("💾 Save Alert Settings", key="save_alerts"):
         st.success("✅ Alert settings saved!")
 
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.gateway_format import HEADER, decode_payload, encode_readings, records_to_frame
+
+
+def readings():
+    return pd.DataFrame({
+        'station_id': ['PRA-01', 'ANK-01', 'XYZ-99', 'XYZ-99', 'OLD-01'],
+        'timestamp': [1_700_000_000, 1_700_000_060, 1_700_000_120, 1_700_000_180, 1_700_000_240],
+        'turbidity_ntu': [45.26, np.nan, 12.0, 13.0, 14.0],
+        'ph': [6.8, 5.92, 7.0, 7.0, 7.0],
+        'dissolved_oxygen': [5.2, 3.1, 4.0, 4.0, np.nan],
+    })
+
+
+def test_round_trip_quantizes_and_keeps_missing_values():
+    df = records_to_frame(decode_payload(encode_readings(readings())))
+
+    assert df['station_id'].tolist() == ['PRA-01', 'ANK-01']
+    assert df['river_name'].tolist() == ['Pra River', 'Ankobra River']
+    assert df['timestamp'].tolist() == [1_700_000_000, 1_700_000_060]
+    np.testing.assert_allclose(df['turbidity_ntu'], [45.3, np.nan], rtol=1e-9)
+    np.testing.assert_allclose(df['ph'], [6.8, 5.92], rtol=1e-9)
+    assert df['temperature'].isna().all()  # Not in the frame: stored as the missing sentinel
+
+
+def test_unknown_stations_are_counted():
+    df = records_to_frame(decode_payload(encode_readings(readings())))
+    assert df.attrs['unknown_stations'] == {'XYZ-99': 2, 'OLD-01': 1}
+
+
+def test_truncated_payload_is_rejected():
+    payload = encode_readings(readings())
+    with pytest.raises(ValueError):
+        decode_payload(payload[:-1])
+    with pytest.raises(ValueError):
+        decode_payload(payload[:HEADER.size - 1])
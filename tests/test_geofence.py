@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from utils.geofence import GeofenceIndex
+
+SQUARE = {'name': 'Square', 'coordinates': [[0, 0], [0, 1], [1, 1], [1, 0]]}
+
+
+def ray_cast(ring, lat, lon):
+    """Reference even-odd test, one point at a time"""
+    inside = False
+    for (y0, x0), (y1, x1) in zip(ring, ring[1:] + ring[:1]):
+        if (y0 > lat) != (y1 > lat) and lon < x0 + (lat - y0) * (x1 - x0) / (y1 - y0):
+            inside = not inside
+    return inside
+
+
+def test_edge_points_are_half_open():
+    index = GeofenceIndex([SQUARE])
+    points = {
+        (0.5, 0.5): 0, (0.0, 0.5): 0, (0.5, 0.0): 0, (0.0, 0.0): 0,  # South and west edges are inside
+        (1.0, 0.5): -1, (0.5, 1.0): -1, (1.0, 1.0): -1, (0.0, 1.0): -1, (1.0, 0.0): -1,  # North and east are not
+        (-1e-9, 0.5): -1, (0.5, 1 + 1e-9): -1, (np.nan, 0.5): -1, (0.5, np.inf): -1,
+    }
+    lat, lon = np.array(list(points)).T
+    assert index.locate(lat, lon).tolist() == list(points.values())
+
+
+def test_index_matches_brute_force_across_cells():
+    rng = np.random.default_rng(0)
+    zones = []
+    for i in range(12):
+        center = rng.uniform(-3, 3, 2)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, rng.integers(3, 9)))
+        radius = rng.uniform(0.1, 1.5, len(angles))
+        ring = np.round(center + np.c_[np.sin(angles), np.cos(angles)] * radius[:, None], 2)
+        zones.append({'name': f"Zone {i}", 'coordinates': ring.tolist()})
+    index = GeofenceIndex(zones, cell_size=0.5)
+
+    # Random points plus every vertex and the cell-boundary lines
+    lat = np.concatenate([rng.uniform(-5, 5, 3000), [p[0] for z in zones for p in z['coordinates']],
+                          np.repeat(np.arange(-5, 5.5, 0.5), 5)])
+    lon = np.concatenate([rng.uniform(-5, 5, 3000), [p[1] for z in zones for p in z['coordinates']],
+                          np.tile(np.linspace(-4, 4, 5), 21)])
+    point_idx, zone_idx = index.pairs(lat, lon)
+
+    expected = {(p, z) for z, zone in enumerate(zones) for p in range(len(lat))
+                if ray_cast(zone['coordinates'], lat[p], lon[p])}
+    assert set(zip(point_idx.tolist(), zone_idx.tolist())) == expected
+
+
+def test_breaches_inside_zones_only():
+    index = GeofenceIndex([SQUARE])
+    stations = pd.DataFrame({'river_name': ['Inside', 'Outside', 'Normal'], 'latitude': [0.5, 2.0, 0.5],
+                             'longitude': [0.5, 2.0, 0.5], 'status': ["🔴 Critical", "🔴 Critical", "🟢 Normal"]})
+    risk_cells = pd.DataFrame({'lat': [0.2, 0.2], 'lon': [0.2, 0.3], 'river_name': 'Pra', 'risk_score': [85, 79]})
+    breaches = index.breaches(stations, risk_cells)
+
+    assert breaches[['kind', 'name']].values.tolist() == [['station', 'Inside'], ['risk cell', 'Pra']]
+    assert breaches['detail'].tolist() == ["🔴 Critical", "Risk score 85/100"]
@@ -0,0 +1,53 @@
+import threading
+import time
+import pandas as pd
+from utils.history_store import HistoryStore
+
+HOUR = 3600
+START = 1_700_000_000 // HOUR * HOUR
+
+
+def hourly(first, last):
+    """One reading per hour for one station, first to last inclusive (epoch seconds)"""
+    times = range(first, last + 1, HOUR)
+    return pd.DataFrame({'station_id': 'PRA-01', 'timestamp': list(times), 'turbidity_ntu': 50.0})
+
+
+def test_concurrent_seeds_backfill_once(tmp_path):
+    store = HistoryStore(str(tmp_path / "readings"), 'station_id')
+    calls = []
+
+    def generate(since=None):
+        calls.append(since)
+        if since is not None:
+            return pd.DataFrame()
+        time.sleep(0.2)  # Long enough for every thread to reach the marker check
+        return hourly(START, START + 23 * HOUR)
+
+    threads = [threading.Thread(target=store.seed, args=(generate,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls.count(None) == 1
+    assert len(store.query()) == 24
+
+
+def test_seed_extends_backfill_to_now(tmp_path):
+    store = HistoryStore(str(tmp_path / "readings"), 'station_id')
+    now = [START + 23 * HOUR]
+
+    def generate(since=None):
+        first = START if since is None else since + HOUR
+        return hourly(first, now[0]) if first <= now[0] else pd.DataFrame()
+
+    assert store.seed(generate) == 24
+    assert store.seed(generate) == 0  # Nothing due yet
+
+    now[0] += 10 * HOUR  # Server restarted ten hours later
+    assert store.seed(generate) == 10
+    readings = store.query()
+    assert len(readings) == 34
+    assert readings['timestamp'].is_unique
+    assert readings['timestamp'].max() == now[0]
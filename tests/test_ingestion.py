@@ -0,0 +1,46 @@
+import io
+
+from utils.history_store import HistoryStore
+from utils.ingestion import ingest_csv_chunked, ingest_files
+
+HEADER = "latitude,longitude,turbidity_ntu,ph,river_name"
+
+
+def csv(rows, timestamps=None):
+    """CSV upload of rows for one river, with an optional timestamp column"""
+    lines = [HEADER + (",timestamp" if timestamps else "")]
+    for i in range(rows):
+        line = f"6.0,-1.5,{10 + i},7.0,Pra River"
+        lines.append(line + (f",{timestamps[i]}" if timestamps else ""))
+    return ("\n".join(lines) + "\n").encode()
+
+
+def test_rows_without_timestamps_are_not_duplicates():
+    merged, report = ingest_files([('pra.csv', csv(6))])
+    assert len(merged) == 6
+    assert report['duplicates'].tolist() == [0]
+
+
+def test_files_without_timestamps_are_not_merged():
+    merged, report = ingest_files([('a.csv', csv(3)), ('b.csv', csv(3))])
+    assert len(merged) == 6
+    assert report['duplicates'].tolist() == [0, 0]
+
+
+def test_timestamped_readings_are_deduplicated_across_files():
+    times = ['2024-05-01 10:00', '2024-05-01 11:00', '2024-05-01 12:00']
+    merged, report = ingest_files([('a.csv', csv(3, times)), ('b.csv', csv(3, times[1:] + ['2024-05-01 13:00']))])
+    assert len(merged) == 4
+    assert report['duplicates'].tolist() == [0, 2]
+    assert '_timestamped' not in merged.columns
+
+
+def test_chunked_upload_goes_to_history_without_cross_chunk_duplicates(tmp_path):
+    history = HistoryStore(str(tmp_path / "readings"), 'station_id')
+    times = ['2024-05-01 10:00', '2024-05-01 11:00', '2024-05-01 10:00', '2024-05-01 12:00']
+    summary = ingest_csv_chunked(io.BytesIO(csv(4, times)), history=history, chunksize=2)
+
+    assert summary['chunks'] == 2
+    assert summary['rows'] == 3
+    assert summary['validation']['duplicates'] == 1
+    assert len(history.query()) == 3
@@ -0,0 +1,16 @@
+import pandas as pd
+
+from utils.map_aggregation import aggregate_stations
+
+
+def test_cells_count_distinct_stations():
+    df = pd.DataFrame({
+        'station_id': ['PRA-001', 'PRA-001', 'PRA-001', 'PRA-002', 'ANK-001'],
+        'latitude': [5.50, 5.50, 5.50, 5.51, 9.5],
+        'longitude': [-1.50, -1.50, -1.50, -1.51, -2.5],
+        'status': ["🟢 Normal", "🟡 Warning", "🟢 Normal", "🔴 Critical", "🟢 Normal"],
+    })
+    cells = aggregate_stations(df, z=6).sort_values('lat').reset_index(drop=True)
+
+    assert cells['n'].tolist() == [2, 1]
+    assert cells['status'].tolist() == ["🔴 Critical", "🟢 Normal"]
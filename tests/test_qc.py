@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.qc import DRIFT, FLATLINE, SPIKE, qc_bit, run_qc
+
+# Per parameter: steady level with sensor noise, spike value, ramp over 30 readings
+SIGNALS = {'turbidity_ntu': (50.0, 1.0, 500.0, 100.0), 'ph': (7.0, 0.01, 9.0, 2.0)}
+
+
+def readings(parameter, values, station='PRA-001'):
+    return pd.DataFrame({'station_id': station, 'timestamp': np.arange(len(values)), parameter: values})
+
+
+def signal(parameter, check, n=30, seed=0):
+    level, noise, spike, ramp = SIGNALS[parameter]
+    values = level + np.random.default_rng(seed).normal(0, noise, n)
+    if check == SPIKE:
+        values[-2] = spike
+    elif check == FLATLINE:
+        values[:] = level
+    elif check == DRIFT:
+        values = level + np.linspace(0, ramp, n)
+    return values
+
+
+@pytest.mark.parametrize('parameter', SIGNALS)
+@pytest.mark.parametrize('check', [SPIKE, FLATLINE, DRIFT])
+def test_each_check_sets_its_bit(parameter, check):
+    flags = run_qc(readings(parameter, signal(parameter, check)))
+    bit = qc_bit(parameter, check)
+
+    flagged = np.flatnonzero(flags & bit)
+    expected = {SPIKE: [28], FLATLINE: list(range(5, 30)), DRIFT: list(range(23, 30))}[check]
+    assert flagged.tolist() == expected
+    assert not (flags & ~np.uint8(bit)).any()
+
+
+def test_windows_do_not_span_stations():
+    df = pd.concat([readings('turbidity_ntu', np.full(4, 50.0), 'ANK-001'),
+                    readings('turbidity_ntu', np.full(4, 50.0), 'PRA-001')], ignore_index=True)
+    assert not run_qc(df).any()
+
+
+def test_flags_follow_input_row_order():
+    df = readings('turbidity_ntu', signal('turbidity_ntu', SPIKE))
+    shuffled = df.sample(frac=1, random_state=0)
+    assert np.array_equal(run_qc(shuffled), run_qc(df)[shuffled.index])
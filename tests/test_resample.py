@@ -0,0 +1,26 @@
+import pandas as pd
+from utils.resample import resample
+
+DAY = 86400
+
+
+def mine_days(days):
+    """One operations row per listed day (offsets from a fixed start) for one mine"""
+    return pd.DataFrame({
+        'Mine': 'Tarkwa Mine',
+        'Date': [1_700_006_400 + day * DAY for day in days],
+        'Turbidity_NTU': [80.0] * len(days),
+        'Daily_Throughput': [100_000] * len(days),
+    })
+
+
+def test_forward_filled_days_have_zero_sums():
+    daily = resample(mine_days([0, 1, 3, 4]), 'daily', columns=['Turbidity_NTU', 'Daily_Throughput'],
+                     agg={'Daily_Throughput': 'sum'}, fill='ffill', max_gap=2,
+                     station_column='Mine', time_column='Date')
+
+    assert daily['filled'].tolist() == [False, False, True, False, False]
+    assert daily['Turbidity_NTU'].tolist() == [80.0] * 5
+    assert daily['Daily_Throughput'].tolist() == [100_000, 100_000, 0, 100_000, 100_000]
+    # The Mining Portal casts the daily sums to int
+    assert daily['Daily_Throughput'].round().astype(int).sum() == 400_000
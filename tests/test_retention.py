@@ -0,0 +1,28 @@
+import pandas as pd
+from utils.history_store import HistoryStore
+from utils.retention import RetentionManager
+
+HOUR = 3600
+DAY = pd.Timestamp("2024-03-15").value // 10 ** 9  # Midnight of day D
+
+
+def readings(first, last):
+    """Hourly readings of one station, first to last inclusive (epoch seconds)"""
+    times = list(range(first, last + 1, HOUR))
+    return pd.DataFrame({'station_id': 'PRA-01', 'timestamp': times, 'turbidity_ntu': 50.0, 'ph': 7.0})
+
+
+def test_compaction_keeps_readings_between_watermarks(tmp_path):
+    store = HistoryStore(str(tmp_path / "history" / "readings"), 'station_id')
+    retention = RetentionManager(store)
+    store.append(readings(DAY - 24 * HOUR, DAY + 10 * HOUR))  # D-1 and D 00:00-10:00
+
+    retention.compact(now=DAY + 10 * HOUR + 1800)
+    retention.compact(now=DAY + 25 * HOUR)  # Nothing was written in between
+
+    start, end = DAY - 24 * HOUR, DAY + 24 * HOUR
+    daily = retention.query(start, end, resolution='daily')
+    assert daily['n_readings'].tolist() == [24, 11]
+    hourly = retention.query(start, end, resolution='hourly')
+    assert hourly['n_readings'].sum() == 35
+    assert hourly['timestamp'].is_unique
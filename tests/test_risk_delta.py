@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from utils.risk_delta import RiskSnapshotStore
+
+
+def grid(scores, noise=0):
+    """Two 1-degree tiles of two cells each, with extra per-run columns"""
+    rng = np.random.default_rng(noise)
+    return pd.DataFrame({
+        'lat': [5.2, 5.4, 6.2, 6.4],
+        'lon': [-1.5, -1.5, -1.5, -1.5],
+        'river_name': ['Pra', 'Pra', 'Ankobra', 'Ankobra'],
+        'risk_score': scores,
+        'turbidity': rng.uniform(0, 100, 4),
+        'hotspot_distance': rng.uniform(0, 10, 4),
+    })
+
+
+def test_unchanged_tiles_are_shared(tmp_path):
+    store = RiskSnapshotStore(root=str(tmp_path))
+    first = store.record(grid([10.0, 20.0, 30.0, 40.0], noise=1))
+    second = store.record(grid([10.0, 20.0, 30.0, 90.0], noise=2), previous=first.attrs['snapshot'])
+
+    assert second.attrs['previous'] == first.attrs['snapshot']
+    assert second.attrs['tiles_unchanged'] == 1
+    assert second.attrs['tiles_shared'] == 1
+    assert second['kind'].tolist() == ['level']
+    assert list(store.load(second.attrs['snapshot']).columns) == ['lat', 'lon', 'river_name', 'risk_score']
+
+
+def test_no_baseline_without_previous_snapshot(tmp_path):
+    store = RiskSnapshotStore(root=str(tmp_path))
+    store.record(grid([10.0, 20.0, 30.0, 40.0]))  # Another session's snapshot
+    delta = store.record(grid([10.0, 20.0, 30.0, 40.0]))
+
+    assert delta.attrs['previous'] is None
+    assert (delta['kind'] == 'new').all() and len(delta) == 4
+
+    missing = store.record(grid([10.0, 20.0, 30.0, 40.0]), previous='123')
+    assert missing.attrs['previous'] is None
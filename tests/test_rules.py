@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from utils.qc import SPIKE, qc_bit
+from utils.rules import classify_water_quality, compile_rules, mining_alert_rules, water_quality_rules
+
+
+def test_first_matching_tier_wins_at_the_thresholds():
+    data = pd.DataFrame({
+        'turbidity_ntu': [100.0, 100.1, 50.0, 50.1, 10.0, 10.0, 10.0, 10.0, np.nan, 150.0],
+        'ph': [7.0, 7.0, 7.0, 7.0, 5.5, 5.49, 8.0, 8.01, np.nan, 5.0],
+    })
+    labels, rule_ids, thresholds = water_quality_rules.evaluate(data)
+
+    assert labels.tolist() == ["🟡 Warning", "🔴 Critical", "🟢 Normal", "🟡 Warning", "🟡 Warning",
+                               "🔴 Critical", "🟢 Normal", "🟡 Warning", "🟢 Normal", "🔴 Critical"]
+    assert rule_ids.tolist() == ['turbidity_warning', 'turbidity_critical', None, 'turbidity_warning',
+                                 'ph_low_warning', 'ph_low_critical', None, 'ph_high_warning', None,
+                                 'turbidity_critical']
+    assert thresholds[1] == 100 and np.isnan(thresholds[2])
+
+
+def test_no_default_rule_sets_report_none():
+    rules = compile_rules(mining_alert_rules('Tarkwa Mine', turbidity_threshold=60, ph_min=6.5))
+    data = {'Turbidity_NTU': [61, 59, 59, 59], 'pH': [5.0, 6.4, 8.6, 7.0]}
+    assert rules.classify(data).tolist() == ['Turbidity', 'pH', 'pH', None]
+
+
+def test_suspect_readings_do_not_drive_status():
+    df = pd.DataFrame({'turbidity_ntu': [500.0, 500.0], 'ph': [7.0, 7.0],
+                       'qc_flags': np.array([0, qc_bit('turbidity_ntu', SPIKE)], dtype=np.uint8)})
+    assert classify_water_quality(df).astype(str).tolist() == ["🔴 Critical", "🟢 Normal"]
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from utils.schema import RISK_DTYPE, STATUS_DTYPE, for_display, to_canonical
+
+
+def raw_readings():
+    return pd.DataFrame({
+        'river_name': ['Pra River', 'Ankobra River', 'Pra River'],
+        'station_id': ['PRA-01', 'ANK-01', 'PRA-01'],
+        'latitude': ['5.612345678', 5.3, 5.6],
+        'longitude': [-1.5, -2.1, -1.5],
+        'turbidity_ntu': ['45.2', 'n/a', 120],
+        'ph': [6.8, 5.9, 7.1],
+        'status': ["🟢 Normal", "🔴 Critical", "Offline"],
+        'risk_level': ['High', ' low', '🟡 Moderate'],
+        'timestamp': ['2024-05-01 10:00:00', '2024-05-01 11:00:00', 1714561200],
+        'notes': ['a', 'b', 'c'],
+    })
+
+
+def test_canonical_dtypes():
+    df = to_canonical(raw_readings())
+
+    assert isinstance(df['river_name'].dtype, pd.CategoricalDtype)
+    assert isinstance(df['station_id'].dtype, pd.CategoricalDtype)
+    assert df['status'].dtype == STATUS_DTYPE and df['risk_level'].dtype == RISK_DTYPE
+    assert df['turbidity_ntu'].dtype == np.float32 and df['ph'].dtype == np.float32
+    assert df['latitude'].dtype == np.float64 and df['latitude'][0] == 5.612345678
+    assert df['timestamp'].dtype == np.int64
+    assert df['notes'].tolist() == ['a', 'b', 'c']  # Unknown columns are kept
+
+
+def test_labels_fold_to_fixed_categories():
+    df = to_canonical(raw_readings())
+
+    assert df['status'].isna().tolist() == [False, False, True]
+    assert df['risk_level'].astype(object).tolist() == ['high', 'low', 'medium']
+    assert np.isnan(df['turbidity_ntu'][1])
+
+
+def test_canonical_is_idempotent_and_drops_unused_categories():
+    df = to_canonical(raw_readings())
+    assert to_canonical(df).equals(df)
+
+    subset = to_canonical(df[df['station_id'] == 'PRA-01'])
+    assert list(subset['station_id'].cat.categories) == ['PRA-01']
+    assert for_display(subset)['timestamp'].tolist() == ['2024-05-01 10:00:00', '2024-05-01 11:00:00']
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from utils.status_tracker import StatusTracker
+
+
+def snapshot(statuses):
+    return pd.DataFrame({'station_id': list(statuses), 'river_name': [f"{s} River" for s in statuses],
+                         'status': list(statuses.values())})
+
+
+def test_station_missing_for_a_tick_keeps_its_status():
+    tracker = StatusTracker()
+    first = tracker.update(snapshot({'PRA': "🔴 Critical", 'ANK': "🟢 Normal"}))
+    assert first['station_id'].tolist() == ['PRA']
+
+    assert tracker.update(snapshot({'ANK': "🟡 Warning"}))['station_id'].tolist() == ['ANK']
+    assert tracker.update(snapshot({'PRA': "🔴 Critical", 'ANK': "🟡 Warning"})).empty
+    assert tracker.count("🔴 Critical") == 1
+
+    back = tracker.update(snapshot({'PRA': "🟢 Normal"}))
+    assert back[['previous_status', 'status', 'escalated']].values.tolist() == [["🔴 Critical", "🟢 Normal", False]]
@@ -0,0 +1,20 @@
+from utils.map_helper import create_ghana_water_map, render_map
+from utils.map_metrics import MapMetrics, map_metrics
+from utils.stream_recorder import ReplayDriver
+from data.sample_data import generate_sample_data
+
+
+def test_empty_recording_replays_no_ticks(tmp_path):
+    driver = ReplayDriver(str(tmp_path))
+    assert len(driver) == 0
+    assert driver.run(lambda tick: tick)['ticks'] == 0
+
+
+def test_diverted_metrics_leave_the_global_sink_untouched():
+    before = len(map_metrics.renders)
+    sink = MapMetrics(map_metrics.budgets)
+    with map_metrics.diverted(sink):
+        render_map(create_ghana_water_map(generate_sample_data()))
+
+    assert len(map_metrics.renders) == before
+    assert [record['map'] for record in sink.renders] == ["Current Monitoring"]
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.ts_codec import (QUANTIZED, TIMESTAMP, XOR, CODES, decode_frame, encode_frame, varint_decode,
+                            varint_encode, zigzag_decode, zigzag_encode)
+
+SEEDS = range(20)
+
+
+def random_series(rng, n):
+    """Random walk with a random share of NaNs, constant runs and sign changes"""
+    values = np.cumsum(rng.normal(0, rng.choice([0.01, 1, 100]), n)) * rng.choice([-1, 1])
+    values[rng.random(n) < rng.random() * 0.3] = np.nan
+    if n and rng.random() < 0.3:
+        values[:n // 2] = values[0]
+    return values
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_integer_packing_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(np.iinfo(np.int64).min, np.iinfo(np.int64).max, 500, endpoint=True)
+    values[:4] = [0, -1, np.iinfo(np.int64).min, np.iinfo(np.int64).max]
+
+    packed = zigzag_encode(values)
+    assert np.array_equal(zigzag_decode(varint_decode(varint_encode(packed), len(values))), values)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_frame_round_trip(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 3000))
+    df = pd.DataFrame({
+        'station_id': rng.choice(['PRA-001', 'ANK-002', 'BIR-003'], n),
+        # Unsorted with repeats: negative deltas between stations and zero deltas within one
+        'timestamp': rng.integers(1_600_000_000, 1_700_000_000, n) // rng.choice([1, 3600]),
+        'turbidity_ntu': np.round(random_series(rng, n), 1),
+        'ph': random_series(rng, n),
+    })
+    columns = {'station_id': (CODES, 0.0), 'timestamp': (TIMESTAMP, 0.0),
+               'turbidity_ntu': (QUANTIZED, 0.1), 'ph': (XOR, 0.0)}
+    decoded = decode_frame(encode_frame(df, columns, block_rows=int(rng.integers(1, 1000))))
+    expected = df.sort_values(['station_id', 'timestamp'], kind='stable').reset_index(drop=True)
+
+    assert decoded['station_id'].astype(str).tolist() == expected['station_id'].tolist()
+    assert np.array_equal(decoded['timestamp'], expected['timestamp'])
+    np.testing.assert_allclose(decoded['turbidity_ntu'], expected['turbidity_ntu'], atol=0.05 + 1e-3, rtol=1e-6)
+    # XOR columns are lossless, bit for bit (NaN positions included)
+    assert np.array_equal(decoded['ph'].to_numpy(), expected['ph'].to_numpy(), equal_nan=True)
+
+
+def test_constant_and_special_float_series():
+    values = np.array([7.0] * 100 + [-0.0, np.inf, -np.inf, np.nan, 5e-324, np.finfo(float).max])
+    df = pd.DataFrame({'ph': values})
+    decoded = decode_frame(encode_frame(df, {'ph': (XOR, 0.0)}))
+
+    valid = ~np.isnan(values)
+    assert np.array_equal(decoded['ph'].to_numpy()[valid].view(np.uint64), values[valid].view(np.uint64))
+    assert np.isnan(decoded['ph'].to_numpy()[~valid]).all()
+
+    constant = decode_frame(encode_frame(pd.DataFrame({'ph': [6.5] * 1000}), {'ph': (QUANTIZED, 0.01)}))
+    np.testing.assert_allclose(constant['ph'], 6.5, rtol=1e-6)
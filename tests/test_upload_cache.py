@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.upload_cache import UploadCache
+
+
+def frame(value, rows=1000):
+    return pd.DataFrame({'turbidity_ntu': np.full(rows, value, dtype=np.float64)})  # About 8 KB
+
+
+def test_least_recently_used_frames_spill_and_reload(tmp_path):
+    cache = UploadCache(max_bytes=20_000, spill_dir=str(tmp_path))
+    cache.put('a', frame(1))
+    cache.put('b', frame(2))
+    assert cache.get('a') is not None  # 'b' is now the least recently used
+    cache.put('c', frame(3))
+
+    assert cache.stats()['entries'] == 2
+    assert sorted(os.listdir(tmp_path)) == ['b.feather']
+    assert cache.get('b')['turbidity_ntu'].iloc[0] == 2  # Reloaded from disk, 'a' spills in turn
+    assert sorted(os.listdir(tmp_path)) == ['a.feather', 'b.feather']
+    assert cache.get('missing') is None
+
+
+def test_spill_directory_keeps_most_recent_files(tmp_path):
+    cache = UploadCache(max_bytes=0, spill_dir=str(tmp_path))
+    for i, key in enumerate('abcd'):
+        cache.put(key, frame(i))
+        for name in os.listdir(tmp_path):  # Distinct mtimes: older spills look older
+            path = os.path.join(tmp_path, name)
+            os.utime(path, (os.path.getmtime(path) - 10, os.path.getmtime(path) - 10))
+    cache.max_spill_bytes = 2.5 * os.path.getsize(tmp_path / 'a.feather')  # Room for two spills
+    cache.put('e', frame(4))
+
+    assert sorted(os.listdir(tmp_path)) == ['c.feather', 'd.feather']
+
+
+def test_callers_get_copies(tmp_path):
+    class Upload:
+        name = 'readings.csv'
+
+        def getvalue(self):
+            return b'turbidity_ntu\n1\n'
+
+    cache, parses = UploadCache(spill_dir=str(tmp_path)), []
+    parse = lambda upload: parses.append(upload) or frame(1, rows=3)
+    first = cache.get_or_parse(Upload(), parse)
+    first['turbidity_ntu'] = 99.0
+
+    assert cache.get_or_parse(Upload(), parse)['turbidity_ntu'].tolist() == [1.0, 1.0, 1.0]
+    assert len(parses) == 1
@@ -0,0 +1,42 @@
+import pandas as pd
+from utils.schema import RISK_DTYPE, normalize_risk_levels, to_canonical
+from utils.validation import validate_readings, DROP_MASK, REJECT_MASK, UNKNOWN_RISK_LEVEL
+
+
+def readings(risk_levels):
+    n = len(risk_levels)
+    return pd.DataFrame({
+        'latitude': [6.0] * n, 'longitude': [-1.5] * n, 'turbidity_ntu': [5.0] * n, 'ph': [7.0] * n,
+        'river_name': [f"River {i}" for i in range(n)], 'risk_level': risk_levels,
+    })
+
+
+def test_risk_levels_are_normalised():
+    levels = normalize_risk_levels(['High', ' low ', '🔴 CRITICAL', 'Extreme', 'moderate', None])
+    assert levels.dtype == RISK_DTYPE
+    assert levels.tolist()[:5] == ['high', 'low', 'high', 'high', 'medium']
+    assert pd.isna(levels.iloc[5])
+
+
+def test_unknown_risk_levels_are_reported():
+    df, errors, summary = validate_readings(readings(['HIGH', 'catastrophic', None]))
+    assert df['risk_level'].tolist()[0] == 'high'
+    assert (errors & UNKNOWN_RISK_LEVEL).astype(bool).tolist() == [False, True, False]
+    assert summary['errors'] == {'unknown_risk_level': 1}
+
+
+def test_canonical_risk_levels_keep_known_labels():
+    df = to_canonical(readings(['Medium', 'critical']))
+    assert df['risk_level'].tolist() == ['medium', 'high']
+
+
+def test_duplicates_are_dropped_but_not_rejected():
+    df = readings(['low', 'low', 'oops', 'low'])
+    df['river_name'] = ['A', 'A', 'B', 'C']
+    df['timestamp'] = ['2024-05-01 10:00', '2024-05-01 10:00', '2024-05-01 10:00', 'not a time']
+    df.loc[3, 'latitude'] = 40.0
+    _, errors, summary = validate_readings(df)
+    assert ((errors & DROP_MASK) != 0).tolist() == [False, True, False, True]
+    assert ((errors & REJECT_MASK) != 0).tolist() == [False, False, False, True]
+    assert summary['rejected'] == 1
+    assert summary['duplicates'] == 1
@@ -0,0 +1,226 @@
+"""
+Incremental rolling aggregates for dashboard metric cards
+Readings are folded in as they arrive so metric reads never rescan history
+"""
+from collections import deque
+import numpy as np
+import pandas as pd
+from utils.schema import to_epoch_seconds, STATUS_DTYPE
+
+
+class RunningStats:
+    """Count, sum, sum of squares, min and max of a stream of values"""
+    __slots__ = ('count', 'total', 'total_sq', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+    def add(self, count, total, total_sq, minimum, maximum):
+        """Fold in the partial aggregate of a batch"""
+        if count == 0:
+            return
+        self.count += count
+        self.total += total
+        self.total_sq += total_sq
+        self.minimum = min(self.minimum, minimum)
+        self.maximum = max(self.maximum, maximum)
+
+    def merge(self, other):
+        """Fold in another RunningStats"""
+        self.add(other.count, other.total, other.total_sq, other.minimum, other.maximum)
+        return self
+
+    def subtract(self, other):
+        """Remove an expired bucket (min/max must be recomputed by the caller)"""
+        self.count -= other.count
+        self.total -= other.total
+        self.total_sq -= other.total_sq
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+    @property
+    def std(self):
+        if self.count < 2:
+            return np.nan
+        variance = (self.total_sq - self.total ** 2 / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.minimum if self.count else np.nan,
+            'max': self.maximum if self.count else np.nan,
+        }
+
+
+class AggregateEngine:
+    def __init__(self, dimensions=('station_id', 'river_name'),
+                 columns=('turbidity_ntu', 'ph', 'dissolved_oxygen'),
+                 category_columns=('status',), station_column='station_id',
+                 time_column='timestamp', bucket_seconds=3600, sliding_buckets=24):
+        self.dimensions = tuple(dimensions)
+        self.columns = tuple(columns)
+        self.category_columns = tuple(category_columns)
+        self.station_column = station_column
+        self.time_column = time_column
+        self.bucket_seconds = bucket_seconds
+        self.sliding_buckets = sliding_buckets
+
+        # (dimension, key, column) -> aggregates
+        self._totals = {}
+        self._buckets = {}   # deque of (bucket index, RunningStats), oldest first
+        self._sliding = {}
+
+        # (dimension, key, category column) -> {value: count}
+        self._categories = {}
+
+        # Last ingested timestamp per station, so re-sent rows are not counted twice
+        self._watermarks = {}
+
+        # Readings per status in the displayed frame, for the metric cards
+        self._status_counts = {}
+        self._displayed = 0
+
+    # ======== INGESTION ========
+    def ingest(self, df):
+        """Fold new readings into every window; returns the number of rows accepted"""
+        if df is None or df.empty:
+            return 0
+
+        epochs = to_epoch_seconds(df[self.time_column])
+        stations = df[self.station_column].astype(str).to_numpy()
+
+        # Drop rows at or before each station's watermark
+        watermarks = pd.Series(stations).map(self._watermarks).to_numpy(dtype=float)
+        fresh = np.isnan(watermarks) | (epochs > watermarks)
+        if not fresh.any():
+            return 0
+
+        batch = df.loc[fresh, list(self.dimensions) + list(self.columns) +
+                       [c for c in self.category_columns if c in df.columns]].copy()
+        batch['_bucket'] = epochs[fresh] // self.bucket_seconds
+
+        newest = pd.Series(epochs[fresh]).groupby(stations[fresh]).max()
+        self._watermarks.update(newest.to_dict())
+
+        numeric = batch[list(self.columns)].apply(pd.to_numeric, errors='coerce')
+        squares = numeric ** 2
+        for dimension in self.dimensions:
+            keys = [batch[dimension].astype(str), batch['_bucket']]
+            grouped = numeric.groupby(keys, sort=True)
+            counts, sums, mins, maxs = grouped.count(), grouped.sum(), grouped.min(), grouped.max()
+            sums_sq = squares.groupby(keys, sort=True).sum()
+
+            for (key, bucket) in counts.index:
+                for column in self.columns:
+                    partial = (int(counts.at[(key, bucket), column]), float(sums.at[(key, bucket), column]),
+                               float(sums_sq.at[(key, bucket), column]), mins.at[(key, bucket), column],
+                               maxs.at[(key, bucket), column])
+                    self._add(dimension, key, column, bucket, partial)
+
+            for category in self.category_columns:
+                if category not in batch.columns:
+                    continue
+                tallies = batch.groupby([batch[dimension].astype(str), batch[category]]).size()
+                for (key, value), n in tallies.items():
+                    counts_by_value = self._categories.setdefault((dimension, key, category), {})
+                    counts_by_value[value] = counts_by_value.get(value, 0) + int(n)
+
+        return int(fresh.sum())
+
+    def _add(self, dimension, key, column, bucket, partial):
+        """Add one (key, bucket) partial aggregate to total, tumbling and sliding windows"""
+        if partial[0] == 0:
+            return
+        slot = (dimension, key, column)
+        self._totals.setdefault(slot, RunningStats()).add(*partial)
+
+        buckets = self._buckets.setdefault(slot, deque())
+        if buckets and buckets[-1][0] == bucket:
+            buckets[-1][1].add(*partial)
+        elif not buckets or buckets[-1][0] < bucket:
+            stats = RunningStats()
+            stats.add(*partial)
+            buckets.append((bucket, stats))
+        else:
+            # Late reading for an older bucket still inside the window
+            for index, stats in buckets:
+                if index == bucket:
+                    stats.add(*partial)
+                    break
+            else:
+                if bucket <= buckets[-1][0] - self.sliding_buckets:
+                    return
+                stats = RunningStats()
+                stats.add(*partial)
+                buckets.append((bucket, stats))
+                self._buckets[slot] = buckets = deque(sorted(buckets, key=lambda item: item[0]))
+
+        sliding = self._sliding.setdefault(slot, RunningStats())
+        sliding.add(*partial)
+        self._expire(slot, buckets, sliding)
+
+    def _expire(self, slot, buckets, sliding):
+        """Drop buckets that slid out of the window"""
+        oldest_allowed = buckets[-1][0] - self.sliding_buckets + 1
+        expired = False
+        while buckets and buckets[0][0] < oldest_allowed:
+            sliding.subtract(buckets.popleft()[1])
+            expired = True
+        if expired:
+            # Bounded by sliding_buckets, independent of history length
+            sliding.minimum = min(stats.minimum for _, stats in buckets)
+            sliding.maximum = max(stats.maximum for _, stats in buckets)
+
+    def update_snapshot(self, df):
+        """Count the displayed readings per status (one bincount over the category codes)"""
+        status = df['status']
+        if status.dtype != STATUS_DTYPE:
+            status = status.astype(object).astype(STATUS_DTYPE)
+        codes = status.cat.codes.to_numpy()
+        counts = np.bincount(codes[codes >= 0], minlength=len(STATUS_DTYPE.categories))
+        self._status_counts = dict(zip(STATUS_DTYPE.categories, counts.tolist()))
+        self._displayed = len(df)
+
+    # ======== O(1) READS ========
+    def stats(self, dimension, key, column, window='total'):
+        """Aggregates for one key: window is 'total', 'tumbling' or 'sliding'"""
+        slot = (dimension, key, column)
+        if window == 'total':
+            return self._totals.get(slot, RunningStats())
+        if window == 'sliding':
+            return self._sliding.get(slot, RunningStats())
+        buckets = self._buckets.get(slot)
+        return buckets[-1][1] if buckets else RunningStats()
+
+    def combined_stats(self, dimension, keys, column, window='total'):
+        """Merge the aggregates of several keys (e.g. both mines)"""
+        merged = RunningStats()
+        for key in keys:
+            merged.merge(self.stats(dimension, key, column, window))
+        return merged
+
+    def category_count(self, dimension, keys, category, value=None):
+        """Count of readings with a category value (or all values) across keys"""
+        total = 0
+        for key in keys:
+            counts_by_value = self._categories.get((dimension, key, category), {})
+            total += sum(counts_by_value.values()) if value is None else counts_by_value.get(value, 0)
+        return total
+
+    def status_count(self, status):
+        """Number of displayed readings in a status"""
+        return self._status_counts.get(status, 0)
+
+    def monitored_count(self):
+        """Number of readings currently displayed"""
+        return self._displayed
@@ -1,6 +1,9 @@
 import requests
 import pandas as pd
 import streamlit as st
+from utils.rules import alert_parameter_rules
+from utils.qc import trusted_readings
+from utils.geofence import protected_zones
 
 
 def check_and_alert(df, predictions=None):
@@ -11,26 +14,22 @@ def check_and_alert(df, predictions=None):
     # 1. Check CURRENT data alerts (existing functionality)
     critical_cases = df[df['status'] == "🔴 Critical"]
 
-    for idx, row in critical_cases.iterrows():
-        # Determine which parameter triggered the alert
-        if row['turbidity_ntu'] > 100:
-            alert_system.send_current_alert(
-                row['river_name'],
-                'Turbidity',
-                row['turbidity_ntu'],
-                100,
-                row['status']
-            )
-            alerts_sent += 1
-        elif row['ph'] < 5.5:
-            alert_system.send_current_alert(
-                row['river_name'],
-                'pH',
-                row['ph'],
-                5.5,
-                row['status']
-            )
-            alerts_sent += 1
+    # Determine which parameter triggered each alert (one vectorized pass)
+    # Suspect (QC-flagged) measurements never trigger an alert
+    parameters, _, thresholds = alert_parameter_rules.evaluate(trusted_readings(critical_cases))
+    columns = {'Turbidity': 'turbidity_ntu', 'pH': 'ph'}
+
+    for (idx, row), parameter, threshold in zip(critical_cases.iterrows(), parameters, thresholds):
+        if parameter is None:
+            continue
+        alert_system.send_current_alert(
+            row['river_name'],
+            parameter,
+            row[columns[parameter]],
+            threshold,
+            row['status']
+        )
+        alerts_sent += 1
 
     # 2. Check AI PREDICTION alerts (NEW FUNCTIONALITY)
     # AUTO-INCLUDE predictions if they exist in session state
@@ -50,6 +49,17 @@ def check_and_alert(df, predictions=None):
             else:
                 st.error(f"❌ Failed to send prediction alert for {prediction['river_name']}")
 
+    # 3. Check PROTECTED ZONE breaches (critical stations / risk cells inside a geofence)
+    # Only risk cells that changed since the previous Risk Check can raise a new breach; the
+    # first snapshot has no baseline (every cell would be 'new'), so it raises none
+    risk_cells = st.session_state.get('risk_changes')
+    if risk_cells is not None and risk_cells.attrs.get('previous') is None:
+        risk_cells = None
+    breaches = protected_zones.breaches(stations=df, risk_cells=risk_cells)
+    for zone, zone_breaches in breaches.groupby('zone', sort=False):
+        if alert_system.send_zone_alert(zone, zone_breaches):
+            alerts_sent += 1
+
     return alerts_sent
 
 
@@ -109,6 +119,19 @@ class TelegramAlertSystem:
             simple_message = f"🔮 AI PREDICTION ALERT\nRiver: {prediction['river_name']}\nRisk: {prediction['risk_level']}\nScore: {prediction['risk_score']}"
             return self._send_telegram_message(simple_message)
 
+    def send_zone_alert(self, zone, breaches):
+        """Send one alert per protected zone listing everything that breached it"""
+        message = f"🛡️ PROTECTED ZONE BREACH\n"
+        message += f"📍 Zone: {zone}\n"
+        for breach in breaches.head(10).itertuples(index=False):
+            message += f"   • {breach.kind.title()}: {breach.name} ({breach.detail})\n"
+        if len(breaches) > 10:
+            message += f"   • ... and {len(breaches) - 10} more\n"
+        message += f"⏰ Time: {pd.Timestamp.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        message += f"🔍 Action: Field inspection of the protected zone recommended"
+
+        return self._send_telegram_message(message)
+
     def send_system_alert(self, alert_type, details):
         """Send system-level alerts"""
         message = f"⚙️ SYSTEM ALERT - {alert_type}\n"
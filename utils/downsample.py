@@ -0,0 +1,122 @@
+"""
+Chart downsampling to a pixel-width budget
+Largest-Triangle-Three-Buckets keeps the visual shape of a line, the min/max envelope
+keeps every spike; results are cached per (series, range, width)
+"""
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+CHART_WIDTH_PX = 800  # Budget for a full-width chart: about one point per pixel column
+
+
+def _as_numeric(x):
+    """Dates and datetimes -> int64 so triangle areas can be computed"""
+    x = pd.Series(x)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(dtype=float)
+    return pd.to_datetime(x).to_numpy('datetime64[s]').astype(np.int64).astype(float)
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the n_out points Largest-Triangle-Three-Buckets keeps (x sorted, no NaN)"""
+    x = _as_numeric(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], max(edges[i + 2], edges[i + 1] + 1)
+            avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return np.unique(selected)
+
+
+def minmax_indices(y, n_out):
+    """Indices of the min and max of each of n_out / 2 buckets, in order (no NaN)"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = n_out // 2
+    if n_out >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(np.int64)
+    counts = np.diff(edges)
+    bucket_ids = np.repeat(np.arange(buckets), counts)
+
+    # O(n): reduce each bucket, then take the first position that hits its min / max
+    keep = []
+    for reduce in (np.minimum, np.maximum):
+        hits = np.flatnonzero(y == np.repeat(reduce.reduceat(y, edges[:-1]), counts))
+        _, first = np.unique(bucket_ids[hits], return_index=True)
+        keep.append(hits[first])
+    return np.unique(np.concatenate(keep))
+
+
+def downsample(df, x, y, width=CHART_WIDTH_PX, method='lttb', by=None):
+    """Rows of df that keep the shape of y over x within the width budget (per `by` group)"""
+    if by is not None:
+        groups = [group for _, group in df.groupby(by, sort=False, observed=True)]
+        if not groups:
+            return df
+        # Every series gets the full budget: they are drawn on top of each other
+        return pd.concat([downsample(group, x, y, width, method) for group in groups])
+
+    df = df[df[y].notna()].sort_values(x, kind='stable')
+    if len(df) <= width:
+        return df
+    if method == 'minmax':
+        keep = minmax_indices(df[y].to_numpy(), width)
+    else:
+        keep = lttb_indices(df[x], df[y].to_numpy(), width)
+    return df.iloc[keep]
+
+
+class ChartDownsampler:
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # (series, range, width, method) -> frame
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, series, x_range, width, load, x, y, method='lttb', by=None):
+        """Downsampled frame for a series over a range, calling load() only on a cache miss
+
+        `series` should identify the data and its version (e.g. store key and append count).
+        """
+        key = (series, x_range, width, method)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+
+        self.misses += 1
+        reduced = downsample(load(), x, y, width, method, by)
+        self._cache[key] = reduced
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return reduced
+
+    def stats(self):
+        return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# Create global instance (shared by all sessions of this server process)
+chart_downsampler = ChartDownsampler()
@@ -6,7 +6,11 @@ import pandas as pd
 import random
 from datetime import datetime, timedelta
 import time
-from data.sample_data import generate_sample_data, get_water_quality_status
+from data.sample_data import generate_sample_data
+from utils.rules import classify_water_quality
+from utils.schema import now_epoch
+from utils.status_tracker import StatusTracker
+from utils.qc import QCEngine
 
 
 class EnhancedLiveSystem:
@@ -18,6 +22,20 @@ class EnhancedLiveSystem:
         # River state tracking
         self.river_states = {}
 
+    @property
+    def qc_engine(self):
+        """Sensor QC history of this session (shared with the app's live refresh)"""
+        if 'qc_engine' not in st.session_state:
+            st.session_state.qc_engine = QCEngine()
+        return st.session_state.qc_engine
+
+    @property
+    def status_tracker(self):
+        """Status snapshot of this session (shared with the app's live refresh)"""
+        if 'status_tracker' not in st.session_state:
+            st.session_state.status_tracker = StatusTracker()
+        return st.session_state.status_tracker
+
     def start_live_mode(self):
         """Start enhanced live mode"""
         st.session_state.enhanced_live = True
@@ -94,14 +112,12 @@ class EnhancedLiveSystem:
             df.at[idx, 'turbidity_ntu'] = min(500, df.at[idx, 'turbidity_ntu'])
             df.at[idx, 'ph'] = max(4.0, min(9.0, df.at[idx, 'ph']))
 
-        # Add status column
-        df['status'] = df.apply(
-            lambda row: get_water_quality_status(row['turbidity_ntu'], row['ph']),
-            axis=1
-        )
+        # Update timestamp (epoch seconds, formatted only at display time)
+        df['timestamp'] = now_epoch()
 
-        # Update timestamp
-        df['timestamp'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Sensor QC against each station's recent readings, then status
+        df = self.qc_engine.apply(df)
+        df['status'] = classify_water_quality(df)
 
         self.update_cycle += 1
         self.last_update_time = datetime.now()
@@ -148,12 +164,8 @@ class EnhancedLiveSystem:
         else:
             next_refresh = self.refresh_interval
 
-        # Get critical river count from latest data
-        critical_count = 0
-        if 'live_data_df' in st.session_state and st.session_state.live_data_df is not None:
-            critical_count = len(st.session_state.live_data_df[
-                                     st.session_state.live_data_df['status'] == "🔴 Critical"
-                                     ])
+        # Get critical river count from the tracked statuses
+        critical_count = self.status_tracker.count("🔴 Critical")
 
         return {
             'active': True,
@@ -186,28 +198,24 @@ class EnhancedLiveSystem:
         return True
 
     def _check_critical_changes(self, new_data):
-        """Check for new critical rivers and trigger alerts"""
-        if 'previous_critical_count' not in st.session_state:
-            st.session_state.previous_critical_count = 0
+        """Track per-river status transitions and alert on rivers that became critical"""
+        transitions = self.status_tracker.update(new_data)
+        st.session_state.status_transitions = transitions
 
-        current_critical = len(new_data[new_data['status'] == "🔴 Critical"])
-        previous_critical = st.session_state.previous_critical_count
-
-        if current_critical > previous_critical:
-            # New critical rivers detected
-            new_critical = current_critical - previous_critical
-            critical_rivers = new_data[new_data['status'] == "🔴 Critical"]['river_name'].tolist()
+        # Only rivers that changed status this tick reach the UI and alerts
+        for _, change in transitions.iterrows():
+            self.river_states.setdefault(change['river_name'], {'event_count': 0})['status'] = change['status'].split()[-1].lower()
 
+        newly_critical = transitions[transitions['status'] == "🔴 Critical"]
+        if not newly_critical.empty:
             # Store alert
             st.session_state.last_alert = {
                 'type': 'critical',
-                'count': new_critical,
-                'rivers': critical_rivers[:3],  # First 3 rivers
+                'count': len(newly_critical),
+                'rivers': newly_critical['river_name'].tolist()[:3],  # First 3 rivers
                 'time': datetime.now()
             }
 
-        st.session_state.previous_critical_count = current_critical
-
 
 # Create global instance
 enhanced_live = EnhancedLiveSystem()
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Compact binary upload format for field gateways on metered rural links
+A payload is an 8-byte header followed by fixed-width little-endian records
+"""
+import struct
+import numpy as np
+import pandas as pd
+from data.sample_data import RIVERS
+from utils.schema import to_epoch_seconds
+
+MAGIC = b'GG'
+CURRENT_VERSION = 1
+
+# magic, version, reserved byte, record count
+HEADER = struct.Struct('<2sBxI')
+
+# Version 1: 20 bytes per reading
+RECORD_DTYPES = {
+    1: np.dtype([
+        ('station_id', 'S8'),
+        ('timestamp', '<u4'),      # epoch seconds (UTC)
+        ('turbidity', '<u2'),      # 0.1 NTU
+        ('ph', '<u2'),             # 0.01 pH
+        ('do', '<u2'),             # 0.01 mg/L
+        ('temperature', '<i2'),    # 0.01 °C
+    ])
+}
+
+# Quantization step for each measurement field
+SCALES = {
+    'turbidity': 0.1,
+    'ph': 0.01,
+    'do': 0.01,
+    'temperature': 0.01,
+}
+
+# Sentinel stored when a sensor did not report
+MISSING = {
+    'turbidity': 0xFFFF,
+    'ph': 0xFFFF,
+    'do': 0xFFFF,
+    'temperature': -0x8000,
+}
+
+# Station id -> (river, latitude, longitude)
+STATIONS = {r['station_id']: (r['name'], r['lat'], r['lon']) for r in RIVERS}
+
+
+def encode_readings(df, version=CURRENT_VERSION):
+    """Pack a readings frame (station_id, timestamp, turbidity_ntu, ph, ...) into a payload"""
+    dtype = RECORD_DTYPES[version]
+    records = np.zeros(len(df), dtype=dtype)
+
+    records['station_id'] = df['station_id'].astype(str).str.encode('ascii').to_numpy()
+    records['timestamp'] = to_epoch_seconds(df['timestamp'])
+
+    columns = {
+        'turbidity': 'turbidity_ntu',
+        'ph': 'ph',
+        'do': 'dissolved_oxygen',
+        'temperature': 'temperature',
+    }
+    for field, column in columns.items():
+        field_type = dtype[field]
+        if column not in df.columns:
+            records[field] = MISSING[field]
+            continue
+        values = df[column].to_numpy(dtype=float) / SCALES[field]
+        info = np.iinfo(field_type)
+        # Keep the sentinel out of the valid range
+        upper = info.max - 1 if MISSING[field] == info.max else info.max
+        lower = info.min + 1 if MISSING[field] == info.min else info.min
+        quantized = np.clip(np.rint(values), lower, upper)
+        records[field] = np.where(np.isnan(values), MISSING[field], quantized)
+
+    return HEADER.pack(MAGIC, version, len(records)) + records.tobytes()
+
+
+def decode_payload(payload):
+    """Decode a payload into a read-only structured array that views the payload bytes"""
+    if len(payload) < HEADER.size:
+        raise ValueError("Gateway payload is shorter than its header")
+
+    magic, version, count = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("Not a Guardian Ghana gateway payload")
+    if version not in RECORD_DTYPES:
+        raise ValueError(f"Unsupported gateway format version: {version}")
+
+    dtype = RECORD_DTYPES[version]
+    expected = HEADER.size + count * dtype.itemsize
+    if len(payload) != expected:
+        raise ValueError(f"Gateway payload is {len(payload)} bytes, expected {expected}")
+
+    # No copy: the array is a view over the uploaded bytes
+    return np.frombuffer(payload, dtype=dtype, count=count, offset=HEADER.size)
+
+
+def records_to_frame(records, stations=None):
+    """Dequantize decoded records into the readings frame used by the dashboard
+
+    Records from station ids missing from the registry are dropped; their counts per id are
+    kept in the frame's attrs['unknown_stations'] so ingestion can report them.
+    """
+    if stations is None:
+        stations = STATIONS
+
+    station_ids = pd.Series(records['station_id']).str.decode('ascii').str.rstrip('\x00')
+    known = station_ids.isin(stations).to_numpy()
+    unknown = {str(k): int(v) for k, v in station_ids[~known].value_counts().items()}
+    if unknown:
+        print(f"Gateway payload: dropped {int((~known).sum())} readings from unregistered stations "
+              f"{sorted(unknown)} (non-critical)")
+    records = records[known]
+    station_ids = station_ids[known].reset_index(drop=True)
+
+    lookup = pd.DataFrame.from_dict(stations, orient='index',
+                                    columns=['river_name', 'latitude', 'longitude'])
+    df = lookup.reindex(station_ids).reset_index(drop=True)
+    df.insert(0, 'station_id', station_ids)
+
+    measurements = {
+        'turbidity': 'turbidity_ntu',
+        'ph': 'ph',
+        'do': 'dissolved_oxygen',
+        'temperature': 'temperature',
+    }
+    for field, column in measurements.items():
+        raw = records[field]
+        df[column] = np.where(raw == MISSING[field], np.nan, raw * SCALES[field])
+
+    df['timestamp'] = records['timestamp'].astype(np.int64)
+    df.attrs['unknown_stations'] = unknown
+
+    return df
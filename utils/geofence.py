@@ -0,0 +1,167 @@
+"""
+Geofence engine for the protected zones
+Zone bounding boxes are bucketed on a coarse lat/lon grid; a batch of points is matched to
+candidate zones through that index and tested with a vectorized even-odd ray cast, so
+stations, risk grid cells and mining detections are tagged by zone in one pass
+"""
+import numpy as np
+import pandas as pd
+from utils.map_helper import create_protected_zones
+
+INDEX_CELL_DEG = 0.5  # Bounding-box index cell size
+EDGE_BATCH = 2 ** 20  # Points x edges evaluated at once by the ray cast
+
+# What counts as a breach inside a protected zone
+BREACH_STATUS = "🔴 Critical"
+BREACH_RISK_SCORE = 80
+
+_KEY_OFFSET = 2 ** 20  # Keeps negative cell rows / columns positive in the int64 cell key
+
+
+class GeofenceIndex:
+    def __init__(self, zones, cell_size=INDEX_CELL_DEG):
+        """zones: dicts with 'name' and 'coordinates' ([[lat, lon], ...]), as create_protected_zones()"""
+        self.zones = list(zones)
+        self.names = np.array([zone['name'] for zone in self.zones], dtype=object)
+        self.cell_size = cell_size
+
+        rings = [np.asarray(zone['coordinates'], dtype=float).reshape(-1, 2) for zone in self.zones]
+        self.bboxes = np.array([[r[:, 0].min(), r[:, 1].min(), r[:, 0].max(), r[:, 1].max()] for r in rings]
+                               ).reshape(-1, 4)  # south, west, north, east
+
+        # Closed rings as one edge table; zone i owns edges edge_offsets[i]:edge_offsets[i + 1]
+        self.edge_start = np.concatenate(rings) if rings else np.empty((0, 2))
+        self.edge_end = np.concatenate([np.roll(r, -1, axis=0) for r in rings]) if rings else np.empty((0, 2))
+        self.edge_offsets = np.concatenate([[0], np.cumsum([len(r) for r in rings])]).astype(np.int64)
+
+        # Bounding-box index: sorted cell keys, each with a slice of cell_zones
+        keys, ids = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+        for i, (south, west, north, east) in enumerate(self.bboxes):
+            rows = np.arange(np.floor(south / cell_size), np.floor(north / cell_size) + 1)
+            cols = np.arange(np.floor(west / cell_size), np.floor(east / cell_size) + 1)
+            cell_keys = self._key(rows[:, None], cols[None, :]).ravel()
+            keys.append(cell_keys)
+            ids.append(np.full(len(cell_keys), i, dtype=np.int64))
+        keys, ids = np.concatenate(keys), np.concatenate(ids)
+        order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.cell_starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.cell_counts = counts
+        self.cell_zones = ids[order]
+
+    @staticmethod
+    def _key(rows, cols):
+        return (np.asarray(rows, dtype=np.int64) + _KEY_OFFSET) * (2 * _KEY_OFFSET) + (
+            np.asarray(cols, dtype=np.int64) + _KEY_OFFSET)
+
+    def __len__(self):
+        return len(self.zones)
+
+    # ======== MATCHING ========
+    def candidates(self, lat, lon):
+        """(point index, zone index) pairs whose point lies in the zone's bounding box"""
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        finite = np.isfinite(lat) & np.isfinite(lon)
+        if not len(self.cell_keys) or not finite.any():
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        points = np.flatnonzero(finite)
+        keys = self._key(np.floor(lat[points] / self.cell_size), np.floor(lon[points] / self.cell_size))
+        slot = np.minimum(np.searchsorted(self.cell_keys, keys), len(self.cell_keys) - 1)
+        hit = self.cell_keys[slot] == keys
+        points, slot = points[hit], slot[hit]
+
+        # Expand each point into one pair per zone listed in its cell
+        counts = self.cell_counts[slot]
+        point_idx = np.repeat(points, counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        zone_idx = self.cell_zones[np.repeat(self.cell_starts[slot], counts) + within]
+
+        south, west, north, east = self.bboxes[zone_idx].T
+        plat, plon = lat[point_idx], lon[point_idx]
+        inside = (plat >= south) & (plat <= north) & (plon >= west) & (plon <= east)
+        return point_idx[inside], zone_idx[inside]
+
+    def _contains(self, zone, lat, lon):
+        """Even-odd ray cast of points against one zone's edges"""
+        start, end = self.edge_offsets[zone], self.edge_offsets[zone + 1]
+        y0, x0 = self.edge_start[start:end].T
+        y1, x1 = self.edge_end[start:end].T
+        inside = np.zeros(len(lat), dtype=bool)
+        step = max(1, EDGE_BATCH // max(1, end - start))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for i in range(0, len(lat), step):
+                py, px = lat[i:i + step, None], lon[i:i + step, None]
+                crosses = (y0 > py) != (y1 > py)
+                x_cross = x0 + (py - y0) * (x1 - x0) / (y1 - y0)
+                inside[i:i + step] = (crosses & (px < x_cross)).sum(axis=1) % 2 == 1
+        return inside
+
+    def pairs(self, lat, lon):
+        """Every (point index, zone index) membership; overlapping zones give several pairs"""
+        lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+        point_idx, zone_idx = self.candidates(lat, lon)
+        order = np.argsort(zone_idx, kind='stable')
+        point_idx, zone_idx = point_idx[order], zone_idx[order]
+
+        inside = np.zeros(len(point_idx), dtype=bool)
+        zones, starts = np.unique(zone_idx, return_index=True)
+        for zone, start, end in zip(zones, starts, np.append(starts[1:], len(zone_idx))):
+            points = point_idx[start:end]
+            inside[start:end] = self._contains(zone, lat[points], lon[points])
+        return point_idx[inside], zone_idx[inside]
+
+    def locate(self, lat, lon):
+        """Zone index per point (-1 outside every zone); the first listed zone wins on overlaps"""
+        result = np.full(len(np.asarray(lat)), len(self.zones), dtype=np.int64)
+        point_idx, zone_idx = self.pairs(lat, lon)
+        np.minimum.at(result, point_idx, zone_idx)
+        result[result == len(self.zones)] = -1
+        return result
+
+    def tag(self, df, lat_column='latitude', lon_column='longitude'):
+        """Zone name per row of a frame (None outside every zone)"""
+        zone = self.locate(df[lat_column].to_numpy(dtype=float), df[lon_column].to_numpy(dtype=float))
+        names = np.append(self.names, None)
+        return pd.Series(names[zone], index=df.index, dtype=object)
+
+    # ======== BREACHES ========
+    def breaches(self, stations=None, risk_cells=None, detections=None):
+        """Critical stations, critical risk cells and mining detections inside a protected zone
+
+        Returns one row per breach: zone, kind, name, latitude, longitude, detail.
+        """
+        batches = []
+        if stations is not None and len(stations):
+            stations = stations[(stations['status'].astype(object) == BREACH_STATUS).to_numpy()]
+            batches.append(('station', stations['latitude'], stations['longitude'],
+                            stations['river_name'], stations['status'].astype(str)))
+        if risk_cells is not None and len(risk_cells):
+            score = pd.to_numeric(risk_cells['risk_score'], errors='coerce')
+            risk_cells = risk_cells[(score >= BREACH_RISK_SCORE).to_numpy()]
+            batches.append(('risk cell', risk_cells['lat'], risk_cells['lon'], risk_cells['river_name'],
+                            score[score >= BREACH_RISK_SCORE].map(lambda s: f"Risk score {s:.0f}/100")))
+        if detections is not None and len(detections):
+            detections = pd.DataFrame(detections)
+            detail = (detections['type'].astype(str).str.replace('_', ' ').str.title() + " mining"
+                      if 'type' in detections.columns else "Mining activity")
+            batches.append(('detection', detections['lat'], detections['lon'], detections['name'], detail))
+
+        frames = []
+        for kind, lat, lon, name, detail in batches:
+            lat, lon = pd.to_numeric(lat, errors='coerce'), pd.to_numeric(lon, errors='coerce')
+            point_idx, zone_idx = self.pairs(lat.to_numpy(dtype=float), lon.to_numpy(dtype=float))
+            detail = detail if isinstance(detail, str) else pd.Series(detail).to_numpy()[point_idx]
+            frames.append(pd.DataFrame({
+                'zone': self.names[zone_idx], 'kind': kind,
+                'name': pd.Series(name).astype(str).to_numpy()[point_idx],
+                'latitude': lat.to_numpy(dtype=float)[point_idx],
+                'longitude': lon.to_numpy(dtype=float)[point_idx],
+                'detail': detail,
+            }))
+        if not frames:
+            return pd.DataFrame(columns=['zone', 'kind', 'name', 'latitude', 'longitude', 'detail'])
+        return pd.concat(frames, ignore_index=True).sort_values('zone', kind='stable').reset_index(drop=True)
+
+
+# Create global instance
+protected_zones = GeofenceIndex(create_protected_zones())
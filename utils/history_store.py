@@ -0,0 +1,211 @@
+"""
+Partitioned on-disk store for historical readings
+Parquet files are laid out by partition key (river station or mine) and month, so a
+query for a date range and a few stations only opens the partitions it needs
+"""
+import os
+import json
+import shutil
+import uuid
+import threading
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from utils.schema import to_epoch_seconds, now_epoch
+
+HISTORY_DIR = os.path.join("data_store", "history")
+MONTH_COLUMN = "month"
+
+
+def month_key(epochs):
+    """Epoch seconds -> 'YYYY-MM' partition values"""
+    return pd.to_datetime(pd.Series(epochs), unit='s').dt.strftime("%Y-%m")
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> (first second of the month, first second of the next month)"""
+    start = pd.Timestamp(f"{month}-01")
+    return int(start.timestamp()), int((start + pd.DateOffset(months=1)).timestamp())
+
+
+class HistoryStore:
+    def __init__(self, root, partition_column, time_column='timestamp'):
+        self.root = root
+        self.partition_column = partition_column
+        self.time_column = time_column
+        self.partitioning = ds.partitioning(
+            pa.schema([(partition_column, pa.string()), (MONTH_COLUMN, pa.string())]), flavor='hive')
+        self._lock = threading.RLock()
+        self.version = 0  # Bumped on every append, so caches of query results can key on it
+
+    # ======== WRITES ========
+    def append(self, df):
+        """Append readings; the time column is stored as int64 epoch seconds"""
+        return self._write(df, 'overwrite_or_ignore')
+
+    def replace(self, df):
+        """Write df, replacing every (key, month) partition it touches"""
+        return self._write(df, 'delete_matching')
+
+    def _write(self, df, existing_data_behavior):
+        if df is None or df.empty:
+            return 0
+
+        df = df.copy(deep=False)
+        df[self.time_column] = to_epoch_seconds(df[self.time_column])
+        df[self.partition_column] = df[self.partition_column].astype(str)
+        df[MONTH_COLUMN] = month_key(df[self.time_column]).to_numpy()
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with self._lock:
+            ds.write_dataset(
+                table, self.root, format='parquet', partitioning=self.partitioning,
+                basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+                existing_data_behavior=existing_data_behavior
+            )
+            self.version += 1
+        return len(df)
+
+    def seed(self, generate):
+        """Backfill the store with generate(since=None), then extend it up to now on later calls
+
+        generate(since=epoch) returns the readings after `since` (empty when nothing is due).
+        The marker records how far the backfill reaches; the lock is held from the check to
+        the marker write, so concurrent sessions never backfill the same period twice.
+        """
+        marker = os.path.join(self.root, "_SEEDED")  # '_' files are skipped by dataset discovery
+        with self._lock:
+            seeded = self._read_marker(marker)
+            since = seeded['through'] if seeded else None
+            df = generate(since=since)
+            rows = self.append(df)
+            if seeded and not rows:
+                return 0
+
+            through = int(to_epoch_seconds(df[self.time_column]).max()) if rows else now_epoch()
+            os.makedirs(self.root, exist_ok=True)
+            temporary = f"{marker}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, 'w') as f:
+                json.dump({'rows': rows + (seeded['rows'] if seeded else 0), 'through': through}, f)
+            os.replace(temporary, marker)
+            return rows
+
+    @staticmethod
+    def _read_marker(marker):
+        try:
+            with open(marker) as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        if content.lstrip().startswith('{'):
+            return json.loads(content)
+        # Markers written before the backfill was extended hold only the row count
+        return {'rows': int(content or 0), 'through': int(os.path.getmtime(marker))}
+
+    def compact(self, month):
+        """Rewrite a month as one file per key (every live tick leaves a small file behind)"""
+        if all(files == 1 for _, value, _, files in self._month_dirs() if value == month):
+            return 0
+        start, end = month_bounds(month)
+        with self._lock:
+            return self.replace(self.query(start, end - 1))
+
+    def drop_before(self, month, keep=()):
+        """Delete the partitions of every month before `month` (except those in keep)"""
+        removed = 0
+        with self._lock:
+            for path, value, _, _ in self._month_dirs():
+                if value < month and value not in keep:
+                    shutil.rmtree(path)
+                    removed += 1
+                    parent = os.path.dirname(path)
+                    if not os.listdir(parent):
+                        os.rmdir(parent)
+            if removed:
+                self.version += 1
+        return removed
+
+    # ======== READS ========
+    def has_data(self):
+        if not os.path.isdir(self.root):
+            return False
+        for _, _, files in os.walk(self.root):
+            if any(name.endswith('.parquet') for name in files):
+                return True
+        return False
+
+    def _month_dirs(self):
+        """(directory, month, newest file mtime, file count) of every partition on disk"""
+        if not os.path.isdir(self.root):
+            return []
+        found = []
+        for path, _, files in os.walk(self.root):
+            name = os.path.basename(path)
+            files = [os.path.join(path, f) for f in files if f.endswith('.parquet')]
+            if name.startswith(f"{MONTH_COLUMN}=") and files:
+                found.append((path, name.split('=', 1)[1], max(os.path.getmtime(f) for f in files), len(files)))
+        return found
+
+    def months(self, modified_since=None):
+        """Months on disk, optionally only those written to after an epoch time"""
+        return {month for _, month, modified, _ in self._month_dirs()
+                if modified_since is None or modified > modified_since}
+
+    def disk_bytes(self):
+        total = 0
+        for path, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(path, f)) for f in files if f.endswith('.parquet'))
+        return total
+
+    def _dataset(self):
+        return ds.dataset(self.root, format='parquet', partitioning=self.partitioning)
+
+    def query(self, start=None, end=None, keys=None, parameters=None):
+        """Readings between start and end (inclusive) for some partition keys and parameters
+
+        Partition pruning skips months and keys outside the request, the time filter is
+        pushed down to Parquet row-group statistics and only the requested columns are read.
+        """
+        if not self.has_data():
+            return pd.DataFrame()
+
+        conditions = []
+        if keys is not None:
+            conditions.append(ds.field(self.partition_column).isin([str(key) for key in keys]))
+        if start is not None:
+            start = int(to_epoch_seconds([start])[0])
+            conditions.append(ds.field(MONTH_COLUMN) >= month_key([start])[0])
+            conditions.append(ds.field(self.time_column) >= start)
+        if end is not None:
+            end = int(to_epoch_seconds([end])[0])
+            conditions.append(ds.field(MONTH_COLUMN) <= month_key([end])[0])
+            conditions.append(ds.field(self.time_column) <= end)
+
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        columns = None
+        if parameters is not None:
+            columns = [self.partition_column, self.time_column] + [p for p in parameters
+                                                                  if p not in (self.partition_column, self.time_column)]
+
+        table = self._dataset().to_table(columns=columns, filter=expression)
+        df = table.to_pandas()
+        if MONTH_COLUMN in df.columns:
+            df = df.drop(columns=MONTH_COLUMN)
+        return df.sort_values([self.partition_column, self.time_column], kind='stable').reset_index(drop=True)
+
+    def partitions(self):
+        """(partition key, month) pairs currently on disk"""
+        if not self.has_data():
+            return []
+        table = self._dataset().to_table(columns=[self.partition_column, MONTH_COLUMN])
+        return sorted(set(zip(table[self.partition_column].to_pylist(), table[MONTH_COLUMN].to_pylist())))
+
+
+# Create global instances
+readings_history = HistoryStore(os.path.join(HISTORY_DIR, "readings"), 'station_id')
+# Synthetic backfill (generate_historical_readings) for demos, kept apart from recorded readings
+demo_history = HistoryStore(os.path.join(HISTORY_DIR, "demo_readings"), 'station_id')
+mining_history = HistoryStore(os.path.join(HISTORY_DIR, "mining"), 'Mine', time_column='Date')
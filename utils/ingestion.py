@@ -0,0 +1,210 @@
+"""
+Shared ingestion path for uploaded files and field gateway payloads
+Every source of readings goes through prepare_readings before display
+"""
+import io
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.history_store import readings_history
+from utils.rules import classify_water_quality
+from utils.schema import to_canonical, now_epoch, to_epoch_seconds
+from utils.qc import run_qc
+from utils.validation import validate_readings, merge_summaries, describe_errors, add_dropped, DROP_MASK, UNKNOWN_STATION
+
+REQUIRED_COLUMNS = ['latitude', 'longitude', 'turbidity_ntu', 'ph', 'river_name']
+
+# Streaming ingestion for multi-gigabyte historical exports
+STREAM_CHUNK_ROWS = 250_000
+
+# Multi-file batches from regional offices
+BATCH_MAX_WORKERS = 4
+DEDUP_KEY = ['station_id', 'timestamp']
+TIMESTAMPED = '_timestamped'  # Per row: the file had a timestamp for it (workers -> ingest_files)
+
+
+def missing_columns(user_df):
+    """Return the required columns that are not present in the frame"""
+    return [col for col in REQUIRED_COLUMNS if col not in user_df.columns]
+
+
+def read_uploaded_file(uploaded_file):
+    """Read an uploaded CSV, Excel or gateway binary file into a DataFrame"""
+    if uploaded_file.name.endswith('.csv'):
+        return pd.read_csv(uploaded_file)
+    elif uploaded_file.name.endswith('.bin'):
+        from utils.gateway_format import decode_payload, records_to_frame
+        return records_to_frame(decode_payload(uploaded_file.getvalue()))
+    else:  # Excel file
+        return pd.read_excel(uploaded_file)
+
+
+def prepare_readings(user_df):
+    """Add missing optional columns, QC flags and the status column, in the canonical schema"""
+    # Add missing columns with defaults
+    if 'timestamp' not in user_df.columns:
+        user_df['timestamp'] = now_epoch()
+    if 'dissolved_oxygen' not in user_df.columns:
+        user_df['dissolved_oxygen'] = 5.0
+    if 'station_id' not in user_df.columns:
+        user_df['station_id'] = user_df['river_name']
+
+    # Sensor QC per station (spikes, flatlines, drift) before classification
+    user_df['timestamp'] = to_epoch_seconds(user_df['timestamp'])
+    user_df['qc_flags'] = run_qc(user_df)
+
+    # Add status column (one vectorized pass instead of a row-wise apply)
+    user_df['status'] = classify_water_quality(user_df)
+
+    return to_canonical(user_df)
+
+
+def load_uploaded_readings(uploaded_file):
+    """Parse, validate and classify an upload; unchanged files come from the content-hash cache
+
+    The validation summary is kept in the frame's attrs['validation'].
+    """
+    from utils.upload_cache import upload_cache
+
+    def parse(f):
+        user_df = read_uploaded_file(f)
+        if missing_columns(user_df):
+            return user_df
+        user_df, validation = _prepare_chunk(user_df)
+        user_df.attrs['validation'] = validation
+        return user_df
+
+    return upload_cache.get_or_parse(uploaded_file, parse)
+
+
+def _prepare_chunk(chunk):
+    """Coerce, validate and classify one chunk; returns (clean chunk, validation summary)"""
+    unknown = sum(chunk.attrs.get('unknown_stations', {}).values())
+    chunk, errors, validation = validate_readings(chunk)
+    chunk = prepare_readings(chunk[(errors & DROP_MASK) == 0].copy())
+    return chunk, add_dropped(validation, UNKNOWN_STATION, unknown)
+
+
+def _drop_seen(df, timestamped, seen):
+    """Drop rows with a real timestamp whose (station_id, timestamp) repeats within df or is in
+    seen (a sorted array of key hashes); returns the fresh rows, the updated index and the count"""
+    hashes = pd.util.hash_pandas_object(df[DEDUP_KEY], index=False).to_numpy()[timestamped]
+    positions = np.minimum(np.searchsorted(seen, hashes), max(len(seen) - 1, 0))
+    known = seen[positions] == hashes if len(seen) else np.zeros(len(hashes), dtype=bool)
+    duplicate = np.zeros(len(df), dtype=bool)
+    duplicate[timestamped] = pd.Series(hashes).duplicated().to_numpy() | known
+    fresh = np.sort(hashes[~duplicate[timestamped]])
+    seen = np.insert(seen, np.searchsorted(seen, fresh), fresh)
+    return df[~duplicate], seen, int(duplicate.sum())
+
+
+def ingest_csv_chunked(source, history=readings_history, chunksize=STREAM_CHUNK_ROWS, progress=None):
+    """Stream a CSV (path or file object) into the historical store, one chunk at a time
+
+    Peak memory is bounded by the chunk size (plus 8 bytes per row for the duplicate index);
+    the rows then follow the store's retention like live ticks. Readings repeated across
+    chunks are dropped. progress(fraction, rows) is called after each chunk.
+    Returns a summary with row counts, status counts and the latest reading per station.
+    """
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    total_bytes = os.path.getsize(source) if isinstance(source, str) else getattr(source, 'size', None)
+
+    summary = {'rows': 0, 'rejected': 0, 'chunks': 0, 'status_counts': {}, 'validation': {}}
+    latest = None
+    seen = np.empty(0, dtype='uint64')
+
+    for index, chunk in enumerate(pd.read_csv(source, chunksize=chunksize)):
+        if index == 0:
+            missing = missing_columns(chunk)
+            if missing:
+                raise ValueError(f"Missing columns: {missing}")
+
+        chunk[TIMESTAMPED] = chunk['timestamp'].notna() if 'timestamp' in chunk.columns else False
+        chunk, validation = _prepare_chunk(chunk)
+        chunk, seen, repeated = _drop_seen(chunk, chunk.pop(TIMESTAMPED).to_numpy(dtype=bool), seen)
+        history.append(chunk)
+
+        summary['rows'] += len(chunk)
+        summary['rejected'] += validation['rejected']
+        validation['duplicates'] += repeated
+        if repeated:
+            validation['errors']['duplicate'] = validation['errors'].get('duplicate', 0) + repeated
+        merge_summaries(summary['validation'], validation)
+        summary['chunks'] += 1
+        for status, count in chunk['status'].value_counts().items():
+            summary['status_counts'][status] = summary['status_counts'].get(status, 0) + int(count)
+
+        # Latest reading per station stays small no matter how long the file is
+        tail = chunk.drop_duplicates('station_id', keep='last')
+        latest = tail if latest is None else pd.concat([latest, tail]).drop_duplicates('station_id', keep='last')
+
+        if progress is not None:
+            position = source.tell() if hasattr(source, 'tell') else None
+            fraction = min(1.0, position / total_bytes) if position and total_bytes else 0.0
+            progress(fraction, summary['rows'])
+
+    summary['latest'] = to_canonical(latest.reset_index(drop=True)) if latest is not None else pd.DataFrame()
+    if progress is not None:
+        progress(1.0, summary['rows'])
+    return summary
+
+
+def _parse_batch_file(name, data):
+    """Parse and normalize one file of a batch (runs in a worker process)"""
+    report = {'file': name, 'rows': 0, 'accepted': 0, 'rejected': 0, 'duplicates': 0, 'issues': None, 'error': None}
+    try:
+        buffer = io.BytesIO(data)
+        buffer.name = name
+        user_df = read_uploaded_file(buffer)
+        report['rows'] = len(user_df) + sum(user_df.attrs.get('unknown_stations', {}).values())
+
+        missing = missing_columns(user_df)
+        if missing:
+            report['rejected'] = len(user_df)
+            report['error'] = f"Missing columns: {missing}"
+            return None, report
+
+        # Only readings with a real timestamp can be duplicates: missing ones become the ingestion time
+        user_df[TIMESTAMPED] = user_df['timestamp'].notna() if 'timestamp' in user_df.columns else False
+        user_df, validation = _prepare_chunk(user_df)
+        report['rejected'] = validation['rejected']
+        report['duplicates'] = validation['duplicates']
+        report['issues'] = describe_errors(validation)
+        return user_df, report
+    except Exception as e:
+        report['error'] = str(e)
+        return None, report
+
+
+def ingest_files(files, max_workers=BATCH_MAX_WORKERS):
+    """Parse a batch of (name, bytes) uploads in a process pool and merge them
+
+    Rows whose file gave them a timestamp are de-duplicated on (station_id, timestamp)
+    through a hash index; the first file in the batch wins. Returns the merged readings
+    and a per-file report frame.
+    """
+    names = [name for name, _ in files]
+    payloads = [data for _, data in files]
+    if len(files) > 1:
+        # spawn: forking a process that runs the Streamlit server threads is not safe
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(min(len(files), max_workers), mp_context=context) as pool:
+            results = list(pool.map(_parse_batch_file, names, payloads))
+    else:
+        results = [_parse_batch_file(name, data) for name, data in files]
+
+    seen = np.empty(0, dtype='uint64')
+    frames, reports = [], []
+    for user_df, report in results:
+        if user_df is not None and not user_df.empty:
+            user_df, seen, repeated = _drop_seen(user_df, user_df.pop(TIMESTAMPED).to_numpy(dtype=bool), seen)
+            report['duplicates'] += repeated
+            frames.append(user_df)
+        report['accepted'] = 0 if user_df is None else len(user_df)
+        reports.append(report)
+
+    merged = to_canonical(pd.concat(frames, ignore_index=True)) if frames else pd.DataFrame()
+    return merged, pd.DataFrame(reports)
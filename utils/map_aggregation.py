@@ -0,0 +1,127 @@
+"""
+Zoom-aware aggregation of stations into screen-space grid cells
+Every zoom level groups stations by a CELL_PX-pixel Web Mercator cell (station count, worst
+status, highest risk); the cells are precomputed once per data version and served as
+compact GeoJSON, so the national view draws a few hundred symbols instead of every station
+"""
+import json
+import os
+import shutil
+import uuid
+import numpy as np
+import pandas as pd
+from utils.schema import STATUS_DTYPE, RISK_DTYPE
+from utils.tiles import TILE_SIZE, TILES_DIR, is_referenced, lat_to_tile_y, lon_to_tile_x, tile_server
+
+AGGREGATE_ZOOMS = range(4, 11)  # Individual stations are drawn from STATION_ZOOM on
+STATION_ZOOM = 11
+CELL_PX = 64
+AGGREGATES_DIR = os.path.join(TILES_DIR, "aggregates")
+KEEP_VERSIONS = 8  # Older versions are deleted unless a cached page still links to them
+
+STATUS_COLORS = {"🟢 Normal": 'green', "🟡 Warning": 'orange', "🔴 Critical": 'red'}
+
+
+def aggregate_stations(df, z, cell_px=CELL_PX):
+    """One row per occupied cell at zoom z: centroid, station count, worst status and highest risk"""
+    lat = df['latitude'].to_numpy(dtype=float)
+    lon = df['longitude'].to_numpy(dtype=float)
+    cx = np.floor(lon_to_tile_x(lon, z) * TILE_SIZE / cell_px).astype(np.int64)
+    cy = np.floor(lat_to_tile_y(lat, z) * TILE_SIZE / cell_px).astype(np.int64)
+    _, cell, counts = np.unique(cx * (2 ** (z + 8)) + cy, return_inverse=True, return_counts=True)
+    cell = cell.ravel()
+
+    cells = pd.DataFrame({
+        'lat': np.bincount(cell, weights=lat) / counts,
+        'lon': np.bincount(cell, weights=lon) / counts,
+        'n': counts,
+    })
+    if 'station_id' in df.columns:
+        # Distinct stations, not readings: a station may report several rows
+        station, stations = pd.factorize(df['station_id'])
+        pairs = np.unique(cell * (len(stations) + 1) + station + 1)
+        cells['n'] = np.bincount(pairs // (len(stations) + 1), minlength=len(counts))
+
+    # Status codes are ordered by severity (Normal < Warning < Critical); -1 is unknown
+    worst = np.full(len(counts), -1)
+    if 'status' in df.columns:
+        np.maximum.at(worst, cell, df['status'].astype(object).astype(STATUS_DTYPE).cat.codes.to_numpy())
+    labels = np.array(list(STATUS_DTYPE.categories) + ['Unknown'], dtype=object)
+    cells['status'] = labels[worst]
+    cells['color'] = cells['status'].map(STATUS_COLORS).fillna('gray')
+
+    if 'risk_score' in df.columns:
+        risk = np.full(len(counts), -np.inf)
+        np.maximum.at(risk, cell, pd.to_numeric(df['risk_score'], errors='coerce').fillna(-np.inf).to_numpy())
+        cells['risk'] = np.where(np.isfinite(risk), np.round(risk), np.nan)
+    elif 'risk_level' in df.columns:
+        highest = np.full(len(counts), -1)
+        np.maximum.at(highest, cell, df['risk_level'].astype(object).astype(RISK_DTYPE).cat.codes.to_numpy())
+        cells['risk'] = np.array(list(RISK_DTYPE.categories) + [None], dtype=object)[highest]
+    return cells
+
+
+def to_geojson(cells):
+    """Compact FeatureCollection: 4-decimal coordinates (about 10 m) and short properties"""
+    properties = cells.drop(columns=['lat', 'lon']).astype(object).where(cells.notna(), None)
+    return {'type': 'FeatureCollection', 'features': [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': props}
+        for lon, lat, props in zip(cells['lon'].round(4).tolist(), cells['lat'].round(4).tolist(),
+                                   properties.to_dict('records'))
+    ]}
+
+
+class StationAggregates:
+    def __init__(self, root=AGGREGATES_DIR, zooms=AGGREGATE_ZOOMS):
+        self.root = root
+        self.zooms = zooms
+
+    def build(self, df, version):
+        """Precompute every zoom level for a data version (once); returns {zoom: GeoJSON bytes}"""
+        directory = os.path.join(self.root, version)
+        layers = {z: self.geojson(version, z) for z in self.zooms}
+        if all(layers.values()):
+            os.utime(directory)  # Reused: newest again for pruning
+            return layers
+
+        os.makedirs(directory, exist_ok=True)
+        for z in self.zooms:
+            data = json.dumps(to_geojson(aggregate_stations(df, z)), separators=(',', ':')).encode()
+            path = os.path.join(directory, f"{z}.geojson")
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+            layers[z] = data
+        self._prune(keep=version)
+        return layers
+
+    def geojson(self, version, z):
+        """Stored GeoJSON bytes for one zoom level, or None"""
+        path = os.path.join(self.root, os.path.basename(version), f"{int(z)}.geojson")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _prune(self, keep):
+        versions = sorted((os.path.join(self.root, v) for v in os.listdir(self.root)),
+                          key=os.path.getmtime, reverse=True)
+        for directory in versions[KEEP_VERSIONS:]:
+            if os.path.basename(directory) != keep and not is_referenced(os.path.basename(directory)):
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def serve(self, parts):
+        """Tile server route: /aggregates/<version>/<z>.geojson"""
+        if len(parts) != 2 or not parts[1].endswith('.geojson'):
+            return None
+        try:
+            data = self.geojson(parts[0], int(parts[1][:-len('.geojson')]))
+        except ValueError:
+            return None
+        return None if data is None else ('application/geo+json', data)
+
+
+# Create global instance (its GeoJSON is served by the local tile server)
+station_aggregates = StationAggregates()
+tile_server.route('aggregates', station_aggregates.serve)
@@ -0,0 +1,95 @@
+"""
+Lazy popup details for map layers
+Markers carry a compact data row for a shared popup template; heavy per-point fields (the
+risk factor lists) are published here once per data version and fetched from the local
+tile server when a popup is opened
+"""
+import hashlib
+import json
+import os
+import threading
+import uuid
+from utils.tiles import TILES_DIR, is_referenced, tile_server
+
+DETAILS_DIR = os.path.join(TILES_DIR, "details")
+KEEP_VERSIONS = 8  # Per layer; older versions are deleted unless a cached page still links to them
+
+
+class DetailStore:
+    def __init__(self, root=DETAILS_DIR):
+        self.root = root
+        self._records = {}  # (layer, version) -> list of per-point detail dicts
+        self._lock = threading.Lock()
+
+    def _path(self, layer, version):
+        return os.path.join(self.root, os.path.basename(layer), f"{os.path.basename(version)}.json")
+
+    def publish(self, layer, records):
+        """Store one detail dict per point (point id = list position); returns the version"""
+        data = json.dumps(records, separators=(',', ':'), default=str).encode()
+        version = hashlib.blake2b(data, digest_size=8).hexdigest()
+        path = self._path(layer, version)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(temporary, 'wb') as f:
+                f.write(data)
+            os.replace(temporary, path)
+            self._prune(layer, keep=path)
+        else:
+            os.utime(path)  # Republished: newest again for pruning
+        with self._lock:
+            self._records[(layer, version)] = json.loads(data)
+        return version
+
+    def _prune(self, layer, keep):
+        layer_dir = os.path.join(self.root, layer)
+        versions = []
+        for name in os.listdir(layer_dir):
+            if name.endswith('.json'):
+                try:  # Another session may be pruning the same directory
+                    versions.append((os.path.getmtime(os.path.join(layer_dir, name)), name))
+                except FileNotFoundError:
+                    continue
+        for _, name in sorted(versions, reverse=True)[KEEP_VERSIONS:]:
+            path, version = os.path.join(layer_dir, name), name[:-len('.json')]
+            if path == keep or is_referenced(version):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self._records.pop((layer, version), None)
+
+    def records(self, layer, version):
+        """All detail dicts of a published version (None if unknown)"""
+        with self._lock:
+            if (layer, version) in self._records:
+                return self._records[(layer, version)]
+        path = self._path(layer, version)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            records = json.load(f)
+        with self._lock:
+            self._records[(layer, version)] = records
+        return records
+
+    def serve(self, parts):
+        """Tile server route: /details/<layer>/<version>/<point id>.json"""
+        if len(parts) != 3 or not parts[2].endswith('.json'):
+            return None
+        records = self.records(parts[0], parts[1])
+        try:
+            point = int(parts[2][:-len('.json')])
+        except ValueError:
+            return None
+        if records is None or not 0 <= point < len(records):
+            return None
+        return 'application/json', json.dumps(records[point], separators=(',', ':')).encode()
+
+
+# Create global instance (its details are served by the local tile server)
+detail_store = DetailStore()
+tile_server.route('details', detail_store.serve)
@@ -1,6 +1,35 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
 import folium
+from branca.element import MacroElement
+from folium.plugins import FastMarkerCluster
+from folium.template import Template
+from folium.utilities import JsCode
+from folium.raster_layers import ImageOverlay
 import streamlit as st
+import numpy as np
 import pandas as pd
+from utils.rules import map_marker_rules
+from utils.schema import format_timestamps
+from utils.qc import describe_flags
+from utils.risk_raster import risk_raster
+from utils.tiles import tile_pyramid, tile_server, keep_referenced, MAX_ZOOM
+from utils.map_aggregation import station_aggregates, AGGREGATE_ZOOMS, STATION_ZOOM
+from utils.map_details import detail_store
+from utils.map_metrics import map_metrics
+
+# Above this many points a layer is emitted as one GeoJSON / clustered layer instead of
+# a folium marker (with its own popup HTML) per point
+MARKER_LIMIT = 200
+RASTER_LIMIT = 5000  # Above this many risk cells even GeoJSON is too heavy: draw one image
+AGGREGATE_LIMIT = 1000  # Above this many stations zoomed-out views show per-cell aggregates
+LAYER_MODES = ('auto', 'markers', 'geojson', 'cluster', 'raster', 'tiles', 'aggregate')
+STATION_MODES = ('auto', 'markers', 'cluster', 'aggregate')  # Other (risk layer) modes draw stations clustered
+
+STATUS_TEXTS = {'red': "🔴 CRITICAL", 'orange': "🟡 WARNING", 'green': "🟢 NORMAL"}
+RISK_COLORS = {"🔴 CRITICAL": 'red', "🟠 HIGH": 'orange', "🟡 MEDIUM": 'yellow', "🟢 LOW": 'green'}
 
 
 # ======== GEOFENCING FUNCTIONS ========
@@ -42,11 +71,33 @@ def add_geofences_to_map(ghana_map):
 
 
 # ======== PREDICTION FUNCTIONS ========
+# Reasons are fetched when the popup opens (see PointLayer)
+PREDICTION_MARKER_JS = """
+function (row, id, loadDetail) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {
+        icon: L.AwesomeMarkers.icon({icon: 'exclamation-triangle', prefix: 'fa', markerColor: row[2]})
+    });
+    var head = '<b>🚨 PREDICTION: ' + row[3] + '</b><br><b>Risk Level:</b> ' + row[4] +
+        '<br><b>Confidence:</b> ' + row[5] + '%<br><b>Timeframe:</b> ' + row[6] + '<br>';
+    var tail = '<b>Generated:</b> ' + row[7] + '<br><i>AI-powered risk assessment</i>';
+    marker.bindPopup(head + tail, {maxWidth: 300});
+    marker.on('popupopen', function (e) {
+        loadDetail(id, function (detail) {
+            if (detail) { e.popup.setContent(head + '<b>Reasons:</b> ' + detail.reasons.join(', ') + '<br>' + tail); }
+        });
+    });
+    marker.bindTooltip('PREDICTION: ' + row[3] + ' - ' + row[4]);
+    return marker;
+}
+"""
+
+
 def add_predictions_to_map(ghana_map, predictions):
     """Add prediction markers to the map"""
     if not predictions:
         return ghana_map
 
+    rows, details = [], []
     for pred in predictions:
         # Determine marker color based on risk
         if "HIGH" in pred['risk_level']:
@@ -56,30 +107,392 @@ def add_predictions_to_map(ghana_map, predictions):
         else:
             color = 'green'
 
-        # Create prediction popup
-        popup_text = f"""
-        <b>🚨 PREDICTION: {pred['river_name']}</b><br>
-        <b>Risk Level:</b> {pred['risk_level']}<br>
-        <b>Confidence:</b> {pred['confidence']}%<br>
-        <b>Timeframe:</b> {pred['timeframe']}<br>
-        <b>Reasons:</b> {', '.join(pred['reasons'])}<br>
-        <b>Generated:</b> {pred['prediction_time']}<br>
-        <i>AI-powered risk assessment</i>
-        """
-
-        # Add prediction marker (different icon to distinguish from current data)
-        folium.Marker(
-            location=[pred['latitude'], pred['longitude']],
-            popup=folium.Popup(popup_text, max_width=300),
-            icon=folium.Icon(color=color, icon='exclamation-triangle', prefix='fa'),
-            tooltip=f"PREDICTION: {pred['river_name']} - {pred['risk_level']}"
-        ).add_to(ghana_map)
+        # Different icon to distinguish predictions from current data
+        rows.append([pred['latitude'], pred['longitude'], color, pred['river_name'], pred['risk_level'],
+                     pred['confidence'], pred['timeframe'], pred['prediction_time']])
+        details.append({'reasons': list(pred['reasons'])})
+
+    PointLayer(rows, PREDICTION_MARKER_JS, name="AI Predictions", details=details,
+               detail_layer='predictions').add_to(ghana_map)
+    return ghana_map
+
+
+# ======== BULK LAYERS ========
+class PointLayer(folium.map.Layer):
+    """Markers built in the browser from one compact data row each and a shared JS template
+
+    callback(row, id, loadDetail) returns the Leaflet layer for a row. Per-point details
+    (one dict per row) are kept out of the page: loadDetail(id, done) fetches them from the
+    local tile server, or reads them from the page if the server could not be started.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+            var rows = {{ this.rows|tojson }};
+            var detailUrl = {{ this.detail_url|tojson }};
+            var embedded = {{ this.embedded|tojson }};
+            var loaded = {};
+            function loadDetail(id, done) {
+                if (embedded) { done(embedded[id]); return; }
+                if (!detailUrl) { done(null); return; }
+                if (loaded[id]) { done(loaded[id]); return; }
+                fetch(detailUrl + '/' + id + '.json')
+                    .then(function (response) { return response.json(); })
+                    .then(function (detail) { loaded[id] = detail; done(detail); })
+                    .catch(function () { done(null); });
+            }
+            var create = {{ this.callback }};
+            var layer = L.featureGroup();
+            for (var i = 0; i < rows.length; i++) { layer.addLayer(create(rows[i], i, loadDetail)); }
+            return layer.addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, rows, callback, name=None, details=None, detail_layer='points'):
+        super().__init__(name=name)
+        self._name = 'PointLayer'
+        self.rows = rows
+        self.callback = callback
+        self.detail_url, self.embedded = None, None
+        if details is not None:
+            version = detail_store.publish(detail_layer, details)
+            if tile_server.browser_reachable():
+                self.detail_url = f"{tile_server.url}/details/{detail_layer}/{version}"
+            else:
+                self.embedded = details
+
+
+def _layer_mode(n_points, mode, bulk_mode, layer, budget_mode):
+    """Resolve 'auto': per-point markers for small maps, one bulk layer for large ones and
+    budget_mode when the layer would exceed the render budgets (see map_metrics)"""
+    if mode not in LAYER_MODES:
+        raise ValueError(f"Unknown map layer mode: {mode}")
+    if mode != 'auto':
+        return map_metrics.layer_mode(layer, n_points, mode)
+    mode = 'markers' if n_points <= MARKER_LIMIT else bulk_mode
+    return map_metrics.layer_mode(layer, n_points, mode, budget_mode)
+
+
+def _display_times(timestamps):
+    if pd.api.types.is_integer_dtype(timestamps):
+        return format_timestamps(timestamps).to_numpy()
+    return pd.Series(timestamps).astype(str).to_numpy()
+
+
+def station_points(df, status=None):
+    """Marker data for readings, computed column-wise: one row per station"""
+    colors = np.asarray(map_marker_rules.classify(df))
+    if status is None:
+        status = df['status'].astype(str).to_numpy() if 'status' in df.columns else np.full(len(df), 'Unknown')
+
+    points = pd.DataFrame({
+        'lat': df['latitude'].to_numpy(dtype=float),
+        'lon': df['longitude'].to_numpy(dtype=float),
+        'color': colors,
+        'river_name': df['river_name'].astype(str).to_numpy(),
+        'status': status,
+        'turbidity': df['turbidity_ntu'].to_numpy(dtype=float).round(1),
+        'ph': df['ph'].to_numpy(dtype=float).round(2),
+        'dissolved_oxygen': (df['dissolved_oxygen'].to_numpy(dtype=float).round(2)
+                             if 'dissolved_oxygen' in df.columns else np.nan),
+        'updated': _display_times(df['timestamp']),
+        'qc': '',
+    })
+
+    # Only a handful of distinct QC flag values exist, so describe each once
+    if 'qc_flags' in df.columns:
+        flags = df['qc_flags'].fillna(0).astype(int).to_numpy()
+        names = {flag: ', '.join(describe_flags(flag)).replace('_', ' ') for flag in np.unique(flags) if flag}
+        points['qc'] = [names.get(flag, '') for flag in flags]
+    return points
+
+
+# Shared popup template: the page carries one data row per station instead of one popup per marker
+# row = [lat, lon, color, river, status, turbidity, pH, DO or null, last update, QC flags]
+STATION_MARKER_JS = """
+function (row) {
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {
+        icon: L.AwesomeMarkers.icon({icon: 'tint', prefix: 'fa', markerColor: row[2]})
+    });
+    var html = '<b>' + row[3] + '</b><br>Status: ' + row[4] +
+        '<br>Turbidity: ' + row[5].toFixed(1) + ' NTU<br>pH: ' + row[6].toFixed(2);
+    if (row[7] !== null) { html += '<br>DO: ' + row[7].toFixed(2) + ' mg/L'; }
+    html += '<br>Last Update: ' + row[8];
+    if (row[9]) { html += '<br>⚠️ Sensor QC: ' + row[9]; }
+    marker.bindPopup(html, {maxWidth: 300});
+    marker.bindTooltip(row[3] + ' - ' + row[4]);
+    return marker;
+}
+"""
+
+
+class ZoomAggregateLayer(MacroElement):
+    """Station aggregates below STATION_ZOOM, the stations layer itself from there on
+
+    The per-zoom GeoJSON is fetched from the local tile server, or embedded in the page
+    when the server could not be started.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function () {
+            var map = {{ this._parent.get_name() }};
+            var stations = {{ this.stations.get_name() }};
+            var url = {{ this.url|tojson }};
+            var embedded = {{ this.embedded|tojson }};
+            var loaded = {};
+            var zoomLevel = null;
+            var cells = L.geoJSON(null, {
+                pointToLayer: function (feature, latlng) {
+                    var p = feature.properties;
+                    return L.circleMarker(latlng, {
+                        radius: 6 + 3 * Math.log2(p.n + 1), color: p.color, fillColor: p.color,
+                        fillOpacity: 0.6, weight: 1
+                    });
+                },
+                onEachFeature: function (feature, layer) {
+                    var p = feature.properties;
+                    var text = p.n + (p.n === 1 ? ' station' : ' stations') + ' • worst: ' + p.status;
+                    if (p.risk !== undefined && p.risk !== null) { text += ' • max risk: ' + p.risk; }
+                    layer.bindTooltip(text);
+                    layer.on('click', function () { map.setView(layer.getLatLng(), map.getZoom() + 2); });
+                }
+            });
+
+            function draw(z, data) {
+                loaded[z] = data;
+                if (z !== zoomLevel) { return; }
+                cells.clearLayers();
+                cells.addData(data);
+            }
+
+            function update() {
+                var zoom = map.getZoom();
+                if (zoom >= {{ this.station_zoom }}) {
+                    zoomLevel = null;
+                    map.removeLayer(cells);
+                    map.addLayer(stations);
+                    return;
+                }
+                map.removeLayer(stations);
+                cells.addTo(map);
+                var z = Math.max({{ this.min_zoom }}, Math.min({{ this.max_zoom }}, Math.round(zoom)));
+                if (z === zoomLevel) { return; }
+                zoomLevel = z;
+                if (loaded[z]) {
+                    draw(z, loaded[z]);
+                } else if (embedded) {
+                    draw(z, embedded[z]);
+                } else {
+                    fetch(url + '/' + z + '.geojson')
+                        .then(function (response) { return response.json(); })
+                        .then(function (data) { draw(z, data); })
+                        .catch(function () { map.addLayer(stations); });
+                }
+            }
+
+            map.on('zoomend', update);
+            update();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, stations, layers, version):
+        super().__init__()
+        self._name = 'ZoomAggregateLayer'
+        self.stations = stations
+        self.station_zoom = STATION_ZOOM
+        self.min_zoom, self.max_zoom = min(AGGREGATE_ZOOMS), max(AGGREGATE_ZOOMS)
+        if tile_server.browser_reachable():
+            self.url, self.embedded = f"{tile_server.url}/aggregates/{version}", None
+        else:
+            self.url, self.embedded = None, {z: json.loads(data) for z, data in layers.items()}
+
+
+def add_station_markers(ghana_map, df, mode='auto', title_prefix='', status=None):
+    """Add current readings to the map as markers or, for many stations, one clustered layer
+    (zoomed out to country scale, very large networks show per-cell aggregates instead)"""
+    points = station_points(df, status)
+    if mode in LAYER_MODES and mode not in STATION_MODES:
+        mode = 'cluster'
+    mode = _layer_mode(len(points), mode, 'aggregate' if len(points) > AGGREGATE_LIMIT else 'cluster',
+                       'stations', 'aggregate')
+
+    points['river_name'] = title_prefix + points['river_name']
+    rows = points.astype(object).where(points.notna(), None).to_numpy().tolist()
+    if mode == 'markers':
+        PointLayer(rows, STATION_MARKER_JS, name="Monitoring Stations").add_to(ghana_map)
+    else:
+        # GeoJSON can't vary marker icons per feature, so stations always use the cluster layer
+        stations = FastMarkerCluster(rows, callback=STATION_MARKER_JS, name="Monitoring Stations",
+                                     options={'disableClusteringAtZoom': 10}).add_to(ghana_map)
+        if mode == 'aggregate':
+            version = data_version(df)
+            layers = station_aggregates.build(df, version)
+            ZoomAggregateLayer(stations, layers, version).add_to(ghana_map)
+    return ghana_map
+
+
+def risk_points(risk_data):
+    """Valid risk grid cells with their colors, computed column-wise"""
+    lat = pd.to_numeric(risk_data['lat'], errors='coerce')
+    lon = pd.to_numeric(risk_data['lon'], errors='coerce')
+    valid = lat.between(4.0, 12.0) & lon.between(-4.0, 2.0)
+    risk_data = risk_data[valid.to_numpy()]
+
+    score = pd.to_numeric(risk_data['risk_score'], errors='coerce').fillna(0).to_numpy(dtype=float)
+    level = risk_data['risk_level'].astype(str)
+    risk_text = np.select(
+        [level.str.contains("CRITICAL").to_numpy() | (score >= 80),
+         level.str.contains("HIGH").to_numpy() | (score >= 60),
+         level.str.contains("MEDIUM").to_numpy() | (score >= 40)],
+        ["🔴 CRITICAL", "🟠 HIGH", "🟡 MEDIUM"], "🟢 LOW")
+
+    return pd.DataFrame({
+        'lat': lat[valid].to_numpy(dtype=float),
+        'lon': lon[valid].to_numpy(dtype=float),
+        'risk_text': risk_text,
+        'color': pd.Series(risk_text).map(RISK_COLORS).to_numpy(),
+        'risk_score': score.round(),
+        'radius': np.round(8 + score / 20),  # Size based on risk (whole pixels keep styles shared)
+        'river_name': risk_data['river_name'].astype(str).to_numpy(),
+        'nearest_hotspot': (risk_data['nearest_hotspot'].astype(str).to_numpy()
+                            if 'nearest_hotspot' in risk_data.columns else 'Unknown'),
+        'turbidity': (pd.to_numeric(risk_data['turbidity'], errors='coerce').to_numpy(dtype=float)
+                      if 'turbidity' in risk_data.columns else np.nan),
+        'factors': (risk_data['factors'].fillna('').astype(str).to_numpy()
+                    if 'factors' in risk_data.columns else ''),
+    })
+
+
+# row = [lat, lon, color, radius, river, risk level, risk score, nearest hotspot]; the factor
+# list is fetched when the popup opens (see PointLayer)
+RISK_MARKER_JS = """
+function (row, id, loadDetail) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: row[3], color: row[2], fillColor: row[2], fill: true, fillOpacity: 0.7, weight: 1
+    });
+    var html = '<b>AI PREDICTION: ' + row[4] + '</b><br><b>Risk Level:</b> ' + row[5] +
+        '<br><b>Risk Score:</b> ' + row[6] + '/100<br><b>Nearest Hotspot:</b> ' + row[7] + '<br>';
+    var footer = '<i>AI-powered pollution risk forecast</i>';
+    marker.bindPopup(html + footer, {maxWidth: 300});
+    marker.on('popupopen', function (e) {
+        loadDetail(id, function (detail) {
+            if (detail && detail.factors.length) {
+                e.popup.setContent(html + '<b>Key Factors:</b><br>• ' + detail.factors.join('<br>• ') + '<br>' + footer);
+            }
+        });
+    });
+    marker.bindTooltip('PREDICTION: ' + row[5] + ' - ' + row[4]);
+    return marker;
+}
+"""
+
+RISK_STYLE_JS = """
+function (feature, layer) {
+    var p = feature.properties;
+    layer.setStyle({color: p.color, fillColor: p.color, radius: p.radius});
+}
+"""
+
+
+def add_risk_layer(ghana_map, points, mode='auto', resolution=None, smoothing=0.0):
+    """Add risk grid cells as circle markers, one GeoJSON layer styled from its properties or
+    one colorized raster image (resolution in degrees, smoothing as a Gaussian sigma in pixels)"""
+    if mode == 'auto' and len(points) > RASTER_LIMIT:
+        mode = 'raster'
+    mode = _layer_mode(len(points), mode, 'geojson', 'risk', 'raster')
+    if mode == 'tiles' and not tile_server.browser_reachable():
+        mode = 'raster'  # No tile URL the browser can reach: embed the same grid as one image
+
+    if mode == 'raster':
+        image, bounds = risk_raster(points, resolution, smoothing)
+        ImageOverlay(image, bounds=bounds, name="AI Risk Heatmap", mercator_project=True,
+                     interactive=False, zindex=1).add_to(ghana_map)
+        return ghana_map
+
+    if mode == 'tiles':
+        # z/x/y tiles from the tile server: the browser fetches only the visible ones
+        layers = [('risk', 'risk_score', "AI Risk (tiles)", True),
+                  ('turbidity', 'turbidity', "Satellite Turbidity (tiles)", False)]
+        for layer, column, name, show in layers:
+            if points[column].isna().all():
+                continue
+            version = tile_pyramid.publish(layer, points['lat'], points['lon'], points[column])
+            folium.TileLayer(tiles=tile_server.url_template(layer, version), attr="Guardian Ghana",
+                             name=name, overlay=True, control=True, show=show, opacity=0.8,
+                             max_zoom=MAX_ZOOM).add_to(ghana_map)
+        return ghana_map
+
+    if mode == 'markers':
+        columns = ['lat', 'lon', 'color', 'radius', 'river_name', 'risk_text', 'risk_score', 'nearest_hotspot']
+        rows = points[columns].astype({'radius': int, 'risk_score': int}).to_numpy().tolist()
+        details = [{'factors': factors.split('; ') if factors else []} for factors in points['factors']]
+        PointLayer(rows, RISK_MARKER_JS, name="AI Risk Prediction", details=details,
+                   detail_layer='risk').add_to(ghana_map)
+        return ghana_map
+
+    properties = points.drop(columns=['lat', 'lon', 'factors'])
+    properties['risk_score'] = properties['risk_score'].astype(int)
+    features = [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [lon, lat]}, 'properties': props}
+        for lon, lat, props in zip(points['lon'].round(5).tolist(), points['lat'].round(5).tolist(),
+                                   properties.to_dict('records'))
+    ]
+    # Styled in the browser from each feature's properties (a Python style_function would
+    # write a per-feature style table into the page)
+    folium.GeoJson(
+        {'type': 'FeatureCollection', 'features': features},
+        name="AI Risk Prediction",
+        marker=folium.CircleMarker(fill=True, fill_opacity=0.7, weight=1),
+        on_each_feature=JsCode(RISK_STYLE_JS),
+        popup=folium.GeoJsonPopup(fields=['river_name', 'risk_text', 'risk_score', 'nearest_hotspot'],
+                                  aliases=['AI PREDICTION', 'Risk Level', 'Risk Score', 'Nearest Hotspot']),
+        tooltip=folium.GeoJsonTooltip(fields=['risk_text', 'river_name'], aliases=['PREDICTION', 'River'])
+    ).add_to(ghana_map)
+    return ghana_map
 
+
+# row = [lat, lon, color, river, previous score, score, previous band, band, kind]
+CHANGE_MARKER_JS = """
+function (row) {
+    var marker = L.circleMarker(new L.LatLng(row[0], row[1]), {
+        radius: 12, color: row[2], weight: 3, fill: false, dashArray: row[8] === 'removed' ? '4 4' : null
+    });
+    var text = 'CHANGED: ' + row[3] + ' ' + (row[4] === null ? 'new' : row[4]) + ' → ' +
+        (row[5] === null ? 'removed' : row[5]);
+    if (row[6] !== row[7]) { text += ' (' + (row[6] || '–') + ' → ' + (row[7] || '–') + ')'; }
+    marker.bindTooltip(text);
+    return marker;
+}
+"""
+
+
+def add_risk_changes_layer(ghana_map, changes):
+    """'What changed since last check': rings around changed risk cells (red up, green down,
+    gray removed); changes is a utils.risk_delta frame"""
+    if changes is None or changes.empty:
+        return ghana_map
+    color = np.select([changes['kind'].to_numpy() == 'removed', changes['change'].to_numpy() < 0],
+                      ['gray', 'green'], 'red')
+    rows = pd.DataFrame({
+        'lat': changes['lat'], 'lon': changes['lon'], 'color': color, 'river_name': changes['river_name'],
+        'previous_score': changes['previous_score'].round(), 'risk_score': changes['risk_score'].round(),
+        'previous_level': changes['previous_level'], 'risk_level': changes['risk_level'], 'kind': changes['kind'],
+    })
+    rows = rows.astype(object).where(rows.notna(), None).to_numpy().tolist()
+    PointLayer(rows, CHANGE_MARKER_JS, name="What Changed Since Last Check").add_to(ghana_map)
     return ghana_map
 
 
-def create_ghana_water_map(df, predictions=None):
-    """Create a Folium map with water quality monitoring points and predictions"""
+@map_metrics.instrument("Current Monitoring")
+def create_ghana_water_map(df, predictions=None, mode='auto'):
+    """Create a Folium map with water quality monitoring points and predictions
+
+    mode: 'markers' (one folium marker per station), 'cluster' (one clustered layer with a
+    shared popup template), 'aggregate' (per-cell aggregates until zoomed in to STATION_ZOOM)
+    or 'auto' (markers up to MARKER_LIMIT stations, aggregates above AGGREGATE_LIMIT).
+    """
 
     # Center map on Ghana
     ghana_map = folium.Map(location=[7.9465, -1.0232], zoom_start=7)
@@ -92,38 +505,18 @@ def create_ghana_water_map(df, predictions=None):
         ghana_map = add_predictions_to_map(ghana_map, predictions)
 
     # Add CURRENT DATA markers last (on top)
-    for idx, row in df.iterrows():
-        # Determine color based on status
-        if row['turbidity_ntu'] > 100 or row['ph'] < 5.5:
-            color = 'red'
-        elif row['turbidity_ntu'] > 50 or row['ph'] < 6.0:
-            color = 'orange'
-        else:
-            color = 'green'
+    return add_station_markers(ghana_map, df, mode)
 
-        # Create popup text
-        popup_text = f"""
-        <b>{row['river_name']}</b><br>
-        Status: {row.get('status', 'Unknown')}<br>
-        Turbidity: {row['turbidity_ntu']} NTU<br>
-        pH: {row['ph']:.2f}<br>
-        DO: {row['dissolved_oxygen']:.2f} mg/L<br>
-        Last Update: {row['timestamp']}
-        """
-
-        # Add marker to map
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=folium.Popup(popup_text, max_width=300),
-            icon=folium.Icon(color=color, icon='tint', prefix='fa'),
-            tooltip=f"Click for {row['river_name']} details"
-        ).add_to(ghana_map)
 
-    return ghana_map
+@map_metrics.instrument("AI Risk Prediction")
+def create_risk_overlay_map(df, risk_data=None, mode='auto', resolution=None, smoothing=0.0, changes=None):
+    """FIXED: Create map with proper error handling and data validation
 
-
-def create_risk_overlay_map(df, risk_data=None):
-    """FIXED: Create map with proper error handling and data validation"""
+    mode: 'markers', 'geojson' / 'raster' / 'tiles' (risk cells), 'cluster' / 'aggregate' (stations) or
+    'auto' (by point count). resolution and smoothing only apply to the raster heatmap.
+    changes: cells changed since the previous Risk Check (utils.risk_delta), drawn as their own layer.
+    Status messages are attached as the map's notices (shown by display_map, also on cache hits).
+    """
 
     # Center map on Ghana with better default view
     ghana_map = folium.Map(
@@ -133,127 +526,121 @@ def create_risk_overlay_map(df, risk_data=None):
     )
 
     # Add risk heatmap if we have valid prediction data
+    ghana_map.notices = []
     if risk_data is not None and not risk_data.empty:
-        st.info(f"🔄 Rendering {len(risk_data)} risk points...")
-
         # Validate required columns exist
         required_columns = ['lat', 'lon', 'risk_score', 'risk_level', 'river_name']
         missing_columns = [col for col in required_columns if col not in risk_data.columns]
 
         if missing_columns:
-            st.error(f"❌ Missing columns in risk data: {missing_columns}")
             # Fallback to current monitoring map
-            return create_ghana_water_map(df)
-
-        # Add risk points to map with CORRECT colors
-        valid_points = 0
-        for idx, row in risk_data.iterrows():
-            try:
-                # Validate coordinates
-                if (pd.isna(row['lat']) or pd.isna(row['lon']) or
-                        row['lat'] < 4.0 or row['lat'] > 12.0 or
-                        row['lon'] < -4.0 or row['lon'] > 2.0):
-                    continue  # Skip invalid coordinates
-
-                # DETERMINE CORRECT COLOR BASED ON RISK LEVEL
-                risk_score = float(row['risk_score']) if pd.notna(row['risk_score']) else 0
-                risk_level = str(row['risk_level'])
-
-                if "CRITICAL" in risk_level or risk_score >= 80:
-                    color = 'red'
-                    risk_text = "🔴 CRITICAL"
-                elif "HIGH" in risk_level or risk_score >= 60:
-                    color = 'orange'
-                    risk_text = "🟠 HIGH"
-                elif "MEDIUM" in risk_level or risk_score >= 40:
-                    color = 'yellow'
-                    risk_text = "🟡 MEDIUM"
-                else:
-                    color = 'green'
-                    risk_text = "🟢 LOW"
-
-                # Create popup content
-                popup_content = f"""
-                <b>AI PREDICTION: {row['river_name']}</b><br>
-                <b>Risk Level:</b> {risk_text}<br>
-                <b>Risk Score:</b> {risk_score:.0f}/100<br>
-                <b>Nearest Hotspot:</b> {row.get('nearest_hotspot', 'Unknown')}<br>
-                <i>AI-powered pollution risk forecast</i>
-                """
-
-                # Add risk prediction marker
-                folium.CircleMarker(
-                    location=[row['lat'], row['lon']],
-                    radius=8 + (risk_score / 20),  # Size based on risk
-                    popup=folium.Popup(popup_content, max_width=300),
-                    tooltip=f"PREDICTION: {risk_text} - {row['river_name']}",
-                    color=color,
-                    fillColor=color,
-                    fill=True,
-                    fillOpacity=0.7,
-                    weight=1
-                ).add_to(ghana_map)
-
-                valid_points += 1
-
-            except Exception as e:
-                # Skip this point but continue with others
-                continue
-
-        st.success(f"✅ Successfully rendered {valid_points} risk points")
+            fallback_map = create_ghana_water_map(df, mode=mode)
+            fallback_map.notices = [('error', f"❌ Missing columns in risk data: {missing_columns}")]
+            return fallback_map
 
+        # Invalid coordinates are skipped; colors follow the risk level or score
+        points = risk_points(risk_data)
+        valid_points = len(points)
         if valid_points == 0:
-            st.warning("⚠️ No valid risk points to display - showing current monitoring instead")
-            return create_ghana_water_map(df)
+            fallback_map = create_ghana_water_map(df, mode=mode)
+            fallback_map.notices = [('warning', "⚠️ No valid risk points to display - showing current monitoring instead")]
+            return fallback_map
 
-    # Add current monitoring data (on top)
-    for idx, row in df.iterrows():
-        try:
-            # Determine color based on current status
-            if row['turbidity_ntu'] > 100 or row['ph'] < 5.5:
-                color = 'red'
-                status_text = "🔴 CRITICAL"
-            elif row['turbidity_ntu'] > 50 or row['ph'] < 6.0:
-                color = 'orange'
-                status_text = "🟡 WARNING"
-            else:
-                color = 'green'
-                status_text = "🟢 NORMAL"
-
-            popup_text = f"""
-            <b>CURRENT: {row['river_name']}</b><br>
-            <b>Status:</b> {status_text}<br>
-            <b>Turbidity:</b> {row['turbidity_ntu']} NTU<br>
-            <b>pH:</b> {row['ph']:.2f}<br>
-            <b>Last Update:</b> {row['timestamp']}
-            """
-
-            folium.Marker(
-                location=[row['latitude'], row['longitude']],
-                popup=folium.Popup(popup_text, max_width=300),
-                icon=folium.Icon(color=color, icon='tint', prefix='fa'),
-                tooltip=f"CURRENT: {row['river_name']} - {status_text}"
-            ).add_to(ghana_map)
-
-        except Exception as e:
-            continue
+        add_risk_layer(ghana_map, points, mode, resolution, smoothing)
+        add_risk_changes_layer(ghana_map, changes)
+        ghana_map.notices.append(('success', f"✅ Successfully rendered {valid_points} of {len(risk_data)} risk points"))
 
+    # Add current monitoring data (on top)
+    status = pd.Series(np.asarray(map_marker_rules.classify(df))).map(STATUS_TEXTS).to_numpy()
+    add_station_markers(ghana_map, df, mode, title_prefix="CURRENT: ", status=status)
+    if mode == 'tiles' or (changes is not None and not changes.empty):
+        folium.LayerControl(collapsed=False).add_to(ghana_map)
     return ghana_map
 
-def display_map(folium_map):
-    """Display Folium map in Streamlit without streamlit-folium"""
-    import tempfile
-    import os
-
-    # Save the map to a temporary HTML file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as tmp:
-        folium_map.save(tmp.name)
-
-        # Read the HTML file and display it
-        with open(tmp.name, 'r', encoding='utf-8') as f:
-            html_content = f.read()
 
-        st.components.v1.html(html_content, height=500)
-
-    # Clean up the temporary file
-    os.unlink(tmp.name)
\ No newline at end of file
+# ======== RENDERING ========
+def data_version(*frames):
+    """Content hash of the frames a map is built from (None / empty frames included)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for frame in frames:
+        if frame is None or len(frame) == 0:
+            digest.update(b'-')
+            continue
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        digest.update(','.join(map(str, frame.columns)).encode())
+    return digest.hexdigest()
+
+
+def render_map(folium_map):
+    """Folium map -> standalone HTML page, in memory (size and serialization time go to map_metrics)"""
+    started = time.perf_counter()
+    html = folium_map.get_root().render()
+    map_metrics.rendered(folium_map, html, time.perf_counter() - started)
+    return html
+
+
+class MapCache:
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()  # (data version, view, layer options) -> (html, render metrics, notices)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """Rendered HTML, render metrics and notices of a map, calling build() (which returns
+        the folium map) only on a miss"""
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            html, record, notices = self._cache[key]
+            return html, map_metrics.cache_hit(record, html), notices
+
+        self.misses += 1
+        folium_map = build()
+        html = render_map(folium_map)
+        record = folium_map.render_metrics
+        notices = getattr(folium_map, 'notices', [])
+        self._cache[key] = (html, record, notices)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return html, record, notices
+
+    def references(self, version):
+        """Whether a cached page links to a published version (tiles, aggregates, details)"""
+        return any(version in html for html, _, _ in list(self._cache.values()))
+
+    def stats(self):
+        return {'entries': len(self._cache), 'hits': self.hits, 'misses': self.misses,
+                'bytes': sum(len(html) for html, _, _ in self._cache.values())}
+
+
+# Create global instance (shared by all sessions of this server process)
+map_cache = MapCache()
+keep_referenced(map_cache.references)  # Pruning never removes what a cached page still loads
+
+
+def display_map(folium_map=None, key=None, build=None, height=500):
+    """Display a Folium map in Streamlit without streamlit-folium
+
+    Pass a built map, or a cache key and a build() function so unchanged maps are served
+    from map_cache instead of being rebuilt and re-serialized. The render budgets are part of
+    the key, since 'auto' layers switch mode on them.
+    """
+    if key is not None and build is not None:
+        key = (key, tuple(sorted(map_metrics.budgets.items())))
+        html_content, record, notices = map_cache.get(key, build)
+    else:
+        folium_map = folium_map if folium_map is not None else build()
+        html_content = render_map(folium_map)
+        record = folium_map.render_metrics
+        notices = getattr(folium_map, 'notices', [])
+    st.components.v1.html(html_content, height=height)
+
+    # Builder messages (kept with the cached page, so they show on every rerun)
+    for level, message in notices:
+        getattr(st, level)(message)
+
+    exceeded = map_metrics.exceeded(record)
+    if exceeded:
+        st.caption(f"⚠️ Map over render budget ({', '.join(exceeded)}): {record['markers']:,} markers, "
+                   f"{record['html_bytes'] / 1e6:.1f} MB")
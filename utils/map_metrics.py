@@ -0,0 +1,164 @@
+"""
+Render metrics and budgets for the Folium maps
+Every map build records its marker count, Python build time, serialization time and HTML
+size; layers in 'auto' mode whose predicted cost exceeds the budgets switch to their bulk
+fallback (station aggregates, risk raster) before they are built
+"""
+import contextlib
+import functools
+import json
+import threading
+import time
+from collections import deque
+from utils.tiles import tile_server
+
+# Per map render; html_bytes and render_s are predicted from the cost per marker of the
+# previous render of the same map
+MAP_BUDGETS = {'markers': 2000, 'html_bytes': 3_000_000, 'render_s': 2.0}
+HISTORY_SIZE = 200
+IMAGE_MODES = ('raster', 'tiles')  # Layers drawn as images have no markers
+
+
+class MapMetrics:
+    def __init__(self, budgets=None, history=HISTORY_SIZE):
+        self.budgets = dict(MAP_BUDGETS if budgets is None else budgets)
+        self.renders = deque(maxlen=history)
+        self._costs = {}  # map name -> (HTML bytes, render seconds) per marker of the last build
+        self._local = threading.local()  # Record of the map being built / diverted sink, per thread
+        self._lock = threading.Lock()
+
+    # ======== RECORDING ========
+    @contextlib.contextmanager
+    def diverted(self, sink):
+        """Record maps built and rendered on this thread into sink (another MapMetrics) instead"""
+        self._local.sink = sink
+        try:
+            yield sink
+        finally:
+            self._local.sink = None
+
+    def _sink(self):
+        return getattr(self._local, 'sink', None) or self
+
+    def instrument(self, name):
+        """Decorator for map builders: times the build and attaches the record to the map"""
+        def decorate(create_map):
+            @functools.wraps(create_map)
+            def wrapper(*args, **kwargs):
+                return self._sink()._build(name, create_map, args, kwargs)
+            return wrapper
+        return decorate
+
+    def _build(self, name, create_map, args, kwargs):
+        if getattr(self._local, 'record', None) is not None:
+            return create_map(*args, **kwargs)  # Fallback map built inside another one
+
+        record = {'map': name, 'time': time.time(), 'markers': 0, 'layers': {}, 'switched': {},
+                  'build_s': None, 'serialize_s': None, 'html_bytes': None, 'cached': False}
+        self._local.record = record
+        started = time.perf_counter()
+        try:
+            folium_map = create_map(*args, **kwargs)
+        finally:
+            record['build_s'] = time.perf_counter() - started
+            self._local.record = None
+        folium_map.render_metrics = record
+        return folium_map
+
+    def layer_mode(self, layer, n_points, mode, budget_mode=None):
+        """Layer mode within the budgets, recorded against the map being built
+
+        mode is the one chosen by point count; budget_mode (if given) replaces it when the
+        layer would exceed the marker budget or its predicted HTML size / render time would.
+        """
+        if self._sink() is not self:
+            return self._sink().layer_mode(layer, n_points, mode, budget_mode)
+        record = getattr(self._local, 'record', None)
+        if budget_mode is not None and mode != budget_mode and mode not in IMAGE_MODES:
+            reasons = self.over_budget(record['map'] if record else None, n_points)
+            if reasons:
+                mode = budget_mode
+                if record is not None:
+                    record['switched'][layer] = f"{budget_mode} ({', '.join(reasons)})"
+        if record is not None:
+            record['layers'][layer] = {'points': n_points, 'mode': mode}
+            if mode not in IMAGE_MODES:
+                record['markers'] += n_points
+        return mode
+
+    def over_budget(self, name, n_markers):
+        """Budgets a layer of n_markers would exceed (predicted from the map's last build)"""
+        reasons = []
+        if n_markers > self.budgets['markers']:
+            reasons.append('markers')
+        bytes_per_marker, seconds_per_marker = self._costs.get(name, (0, 0))
+        if n_markers * bytes_per_marker > self.budgets['html_bytes']:
+            reasons.append('html_bytes')
+        if n_markers * seconds_per_marker > self.budgets['render_s']:
+            reasons.append('render_s')
+        return reasons
+
+    def rendered(self, folium_map, html, serialize_s):
+        """Complete a map's record once its HTML exists (maps built elsewhere count as 'Other')"""
+        if self._sink() is not self:
+            return self._sink().rendered(folium_map, html, serialize_s)
+        record = getattr(folium_map, 'render_metrics', None)
+        if record is None:
+            record = {'map': 'Other', 'time': time.time(), 'markers': 0, 'layers': {}, 'switched': {},
+                      'build_s': None, 'cached': False}
+            folium_map.render_metrics = record
+        record.update(serialize_s=serialize_s, html_bytes=len(html.encode()))
+        # Cost per marker is learned from marker-only maps (image layers would inflate it)
+        if record['markers'] and all(layer['mode'] not in IMAGE_MODES for layer in record['layers'].values()):
+            render_s = (record['build_s'] or 0) + serialize_s
+            self._costs[record['map']] = (record['html_bytes'] / record['markers'], render_s / record['markers'])
+        with self._lock:
+            self.renders.append(record)
+        return record
+
+    def cache_hit(self, record, html):
+        """Record a render served from the map cache (no build or serialization)"""
+        if self._sink() is not self:
+            return self._sink().cache_hit(record, html)
+        record = dict(record or {'map': 'Other', 'markers': 0, 'layers': {}, 'switched': {}},
+                      time=time.time(), build_s=0.0, serialize_s=0.0, html_bytes=len(html.encode()), cached=True)
+        with self._lock:
+            self.renders.append(record)
+        return record
+
+    # ======== REPORTING ========
+    def exceeded(self, record):
+        """Budgets a finished render exceeded"""
+        render_s = (record.get('build_s') or 0) + (record.get('serialize_s') or 0)
+        values = {'markers': record['markers'], 'html_bytes': record['html_bytes'], 'render_s': render_s}
+        return [budget for budget, value in values.items() if value is not None and value > self.budgets[budget]]
+
+    def summary(self):
+        """Per map: renders, cache hits, latest and worst cost"""
+        with self._lock:
+            renders = list(self.renders)
+        maps = {}
+        for record in renders:
+            entry = maps.setdefault(record['map'], {'renders': 0, 'cache_hits': 0, 'max_html_bytes': 0,
+                                                    'max_build_s': 0.0, 'max_serialize_s': 0.0})
+            entry['renders'] += 1
+            entry['cache_hits'] += record['cached']
+            entry['max_html_bytes'] = max(entry['max_html_bytes'], record['html_bytes'] or 0)
+            entry['max_build_s'] = max(entry['max_build_s'], record['build_s'] or 0)
+            entry['max_serialize_s'] = max(entry['max_serialize_s'], record['serialize_s'] or 0)
+            entry['last'] = record
+        return maps
+
+    def serve(self, parts):
+        """Metrics API (tile server route): /metrics/maps.json"""
+        if parts != ['maps.json']:
+            return None
+        with self._lock:
+            recent = list(self.renders)[-50:]
+        body = {'budgets': self.budgets, 'maps': self.summary(), 'recent': recent}
+        return 'application/json', json.dumps(body, default=str).encode(), 'no-store'
+
+
+# Create global instance (its metrics API is served by the local tile server)
+map_metrics = MapMetrics()
+tile_server.route('metrics', map_metrics.serve)
@@ -27,6 +27,9 @@ class PollutionPredictor:
         self._prediction_cache = {}
         self._cache_timeout = 300  # 5 minutes
 
+        # Observed station turbidity per river (from the hourly resampled history)
+        self.observed_turbidity = {}
+
     def _initialize_hotspots(self):
         """Initialize mining hotspots with optimized data structure"""
         return [
@@ -94,6 +97,7 @@ class PollutionPredictor:
             'confidence': confidence,
             'factors': self.get_risk_factors_optimized(satellite_data, weather_data, river_name, nearest_hotspot),
             'nearest_hotspot': nearest_hotspot,
+            'turbidity_index': satellite_data['turbidity_index'],
             'prediction_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'data_sources': ['NASA Satellite', 'Weather API', 'Ghana EPA Hotspots']
         }
@@ -129,8 +133,11 @@ class PollutionPredictor:
         # Factor 1: Mining proximity (40% weight) - OPTIMIZED
         mining_risk = self.calculate_mining_proximity_risk_optimized(lat, lon) * 0.40
 
-        # Factor 2: Satellite turbidity (30% weight)
-        turbidity_risk = (min(satellite_data['turbidity_index'] / 150, 1)) * 0.30
+        # Factor 2: Satellite turbidity (30% weight) - station readings win when they are worse
+        turbidity_index = satellite_data['turbidity_index']
+        if river_name in self.observed_turbidity:
+            turbidity_index = max(turbidity_index, self.observed_turbidity[river_name]['mean_24h'])
+        turbidity_risk = (min(turbidity_index / 150, 1)) * 0.30
 
         # Factor 3: Rainfall runoff (20% weight)
         rainfall_risk = (min(weather_data['rainfall'] / 30, 1)) * 0.20
@@ -214,6 +221,11 @@ class PollutionPredictor:
         if satellite_data['water_color'] != "Clear (Green-Blue)":
             factors.append(f"Water discoloration detected")
 
+        # Observed station trend
+        observed = self.observed_turbidity.get(river_name)
+        if observed and observed['change_24h'] > 20:
+            factors.append(f"Rising turbidity (+{observed['change_24h']:.0f} NTU in 24h)")
+
         # Weather factors
         if weather_data['rainfall'] > 20:
             factors.append(f"Heavy rainfall ({weather_data['rainfall']}mm - runoff risk)")
@@ -248,7 +260,9 @@ class PollutionPredictor:
                     'risk_level': prediction['risk_level'],
                     'river_name': closest_river,
                     'nearest_hotspot': prediction['nearest_hotspot']['name'],
-                    'hotspot_distance': prediction['nearest_hotspot']['distance_km']
+                    'hotspot_distance': prediction['nearest_hotspot']['distance_km'],
+                    'turbidity': prediction.get('turbidity_index'),
+                    'factors': '; '.join(prediction['factors'])  # Shown in the map popup on demand
                 })
 
         # Create DataFrame and ensure proper data types
@@ -288,6 +302,24 @@ class PollutionPredictor:
         """Legacy method for backward compatibility with app.py"""
         return self.generate_risk_map_data_optimized()
 
+    def update_observations(self, hourly_readings):
+        """Feed observed turbidity from a regular hourly grid (utils.resample) into the risk score"""
+        self.observed_turbidity = {}
+        if hourly_readings.empty:
+            return
+        for river, readings in hourly_readings.groupby('river_name', observed=True):
+            turbidity = readings.sort_values('timestamp')['turbidity_ntu'].to_numpy()
+            recent, earlier = turbidity[-24:], turbidity[-48:-24]
+            if np.isnan(recent).all():
+                continue
+            self.observed_turbidity[river] = {
+                'mean_24h': float(np.nanmean(recent)),
+                'change_24h': float(np.nanmean(recent) - np.nanmean(earlier))
+                if len(earlier) and not np.isnan(earlier).all() else 0.0
+            }
+        # Cached predictions were scored without these observations
+        self._prediction_cache.clear()
+
     def clear_cache(self):
         """Clear prediction cache"""
         self._prediction_cache.clear()
@@ -0,0 +1,164 @@
+"""
+Sensor quality control for readings
+Spikes (Hampel filter), flatlines and drift are detected per station over trailing
+windows and stored as a uint8 bitmask in the qc_flags column. All stations are checked in
+one pass over the (station, time)-sorted values; windows reaching back into the previous
+station are discarded
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# QC bits, three per checked parameter
+SPIKE, FLATLINE, DRIFT = 1, 2, 4
+PARAMETER_SHIFT = {'turbidity_ntu': 0, 'ph': 3}
+
+# Spikes and flatlines make a reading untrustworthy; drift is flagged for maintenance only
+SUSPECT_CHECKS = SPIKE | FLATLINE
+
+QC_CONFIG = {
+    'turbidity_ntu': {
+        'hampel_window': 24, 'hampel_k': 3.5, 'min_deviation': 5.0,
+        'flatline_window': 6, 'resolution': 0.1,
+        'drift_window': 24, 'drift_change': 40.0, 'drift_r2': 0.9,
+    },
+    'ph': {
+        'hampel_window': 24, 'hampel_k': 3.5, 'min_deviation': 0.1,
+        'flatline_window': 6, 'resolution': 0.005,
+        'drift_window': 24, 'drift_change': 0.4, 'drift_r2': 0.9,
+    },
+}
+
+QC_NAMES = {
+    (parameter, check): f"{parameter}_{name}"
+    for parameter in PARAMETER_SHIFT
+    for check, name in ((SPIKE, 'spike'), (FLATLINE, 'flatline'), (DRIFT, 'drift'))
+}
+
+
+def qc_bit(parameter, check):
+    """Bit of one check for one parameter"""
+    return check << PARAMETER_SHIFT[parameter]
+
+
+def suspect_mask(flags, parameter):
+    """True where a reading of this parameter failed spike or flatline QC"""
+    return (np.asarray(flags, dtype=np.uint8) & qc_bit(parameter, SUSPECT_CHECKS)) != 0
+
+
+def trusted_readings(df):
+    """Copy of df with suspect measurements blanked out (NaN never matches a rule)"""
+    if 'qc_flags' not in df.columns:
+        return df
+    df = df.copy(deep=False)
+    for parameter in PARAMETER_SHIFT:
+        if parameter in df.columns:
+            df[parameter] = df[parameter].where(~suspect_mask(df['qc_flags'], parameter))
+    return df
+
+
+# ======== CHECKS (values in time order) ========
+def hampel_spikes(values, window, k, min_deviation):
+    """Readings further than k scaled MADs from the median of the previous `window` readings
+
+    The jump from the previous reading must be just as large, so a steady rise (a real
+    pollution trend) isn't mistaken for a run of spikes.
+    """
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) <= window:
+        return flags
+    median_fn = np.nanmedian if np.isnan(values).any() else np.median
+    windows = sliding_window_view(values[:-1], window)  # windows[i] precedes values[i + window]
+    median = median_fn(windows, axis=1)
+    threshold = np.maximum(k * 1.4826 * median_fn(np.abs(windows - median[:, None]), axis=1), min_deviation)
+    deviation = np.abs(values[window:] - median)
+    jump = np.abs(values[window:] - values[window - 1:-1])
+    flags[window:] = (deviation > threshold) & (jump > threshold)
+    return flags
+
+
+def flatlines(values, window, resolution):
+    """Readings that close a run of `window` values that did not move by more than the resolution"""
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < window:
+        return flags
+    windows = sliding_window_view(values, window)
+    flags[window - 1:] = (np.nanmax(windows, axis=1) - np.nanmin(windows, axis=1)) <= resolution
+    return flags
+
+
+def drift(values, window, min_change, min_r2):
+    """Readings that end a smooth monotonic ramp (high R² linear fit) of at least min_change"""
+    flags = np.zeros(len(values), dtype=bool)
+    if len(values) < window:
+        return flags
+    windows = sliding_window_view(values, window)
+    t = np.arange(window) - (window - 1) / 2
+    centered = windows - windows.mean(axis=1, keepdims=True)
+    slope = (centered @ t) / (t @ t)
+    total = (centered ** 2).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r2 = np.where(total > 0, slope ** 2 * (t @ t) / total, 0.0)
+    flags[window - 1:] = (np.abs(slope) * (window - 1) >= min_change) & (r2 >= min_r2)
+    return flags
+
+
+def run_qc(df, station_column='station_id', time_column='timestamp'):
+    """uint8 QC flags for every row of a readings frame (aligned with df's rows)"""
+    flags = np.zeros(len(df), dtype=np.uint8)
+    if df.empty or station_column not in df.columns:
+        return flags
+
+    order = np.lexsort((df[time_column].to_numpy(), df[station_column].astype(str).to_numpy()))
+    stations = df[station_column].astype(str).to_numpy()[order]
+    starts = np.concatenate([[0], np.flatnonzero(stations[1:] != stations[:-1]) + 1])
+    # Position of each sorted row within its station: a window is valid once it fits in the station
+    rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.append(starts, len(order))))
+
+    for parameter, config in QC_CONFIG.items():
+        if parameter not in df.columns:
+            continue
+        values = df[parameter].to_numpy(dtype=float)[order]
+        checks = [
+            (SPIKE, hampel_spikes(values, config['hampel_window'], config['hampel_k'], config['min_deviation']),
+             config['hampel_window']),
+            (FLATLINE, flatlines(values, config['flatline_window'], config['resolution']),
+             config['flatline_window'] - 1),
+            (DRIFT, drift(values, config['drift_window'], config['drift_change'], config['drift_r2']),
+             config['drift_window'] - 1),
+        ]
+        for check, flagged, preceding in checks:
+            flags[order[flagged & (rank >= preceding)]] |= qc_bit(parameter, check)
+    return flags
+
+
+def describe_flags(flags):
+    """Names of the checks a single qc_flags value failed"""
+    return [name for (parameter, check), name in QC_NAMES.items() if int(flags) & qc_bit(parameter, check)]
+
+
+class QCEngine:
+    """Keeps a trailing window per station so live ticks (one reading each) can be checked"""
+
+    def __init__(self, station_column='station_id', time_column='timestamp'):
+        self.station_column = station_column
+        self.time_column = time_column
+        self.history_rows = max(max(config['hampel_window'] + 1, config['drift_window'])
+                                for config in QC_CONFIG.values())
+        self._history = None
+
+    def apply(self, df):
+        """Add the qc_flags column to a new batch of readings"""
+        columns = [self.station_column, self.time_column] + [p for p in QC_CONFIG if p in df.columns]
+        batch = df[columns].assign(_new=True)
+        combined = batch if self._history is None else pd.concat([self._history, batch], ignore_index=True)
+
+        flags = run_qc(combined, self.station_column, self.time_column)
+        df = df.copy(deep=False)
+        df['qc_flags'] = flags[combined['_new'].to_numpy()]
+
+        # Keep only the trailing window of each station
+        self._history = (combined.assign(_new=False)
+                         .groupby(combined[self.station_column].astype(str), observed=True)
+                         .tail(self.history_rows).reset_index(drop=True))
+        return df
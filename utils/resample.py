@@ -0,0 +1,138 @@
+"""
+Resampling of irregular station readings onto regular time grids
+All stations are processed at once: each gets a contiguous slice of one flat grid, so
+aggregation and gap-filling are plain NumPy array operations
+"""
+import numpy as np
+import pandas as pd
+from utils.schema import to_epoch_seconds
+
+FREQUENCIES = {'15min': 900, 'hourly': 3600, 'daily': 86400}
+
+# Additive aggregates are never gap-filled: a missing day didn't use any water, so its sum is 0
+ADDITIVE_AGGREGATES = ('sum', 'count')
+
+
+def _step_seconds(freq):
+    if isinstance(freq, (int, np.integer)):
+        return int(freq)
+    if freq in FREQUENCIES:
+        return FREQUENCIES[freq]
+    return int(pd.Timedelta(freq).total_seconds())
+
+
+def _aggregate(cell, values, total, how, times):
+    """Reduce the readings of every grid cell; empty cells are NaN (0 for sum and count)"""
+    valid = ~np.isnan(values)
+    cell, values, times = cell[valid], values[valid], times[valid]
+    n = np.bincount(cell, minlength=total)
+    out = np.full(total, np.nan)
+    has = n > 0
+
+    if how == 'count':
+        return n.astype(float)
+    if how == 'sum':
+        return np.bincount(cell, weights=values, minlength=total)
+    if how == 'mean':
+        sums = np.bincount(cell, weights=values, minlength=total)
+        out[has] = sums[has] / n[has]
+    elif how in ('min', 'max'):
+        ufunc = np.minimum if how == 'min' else np.maximum
+        out[has] = np.inf if how == 'min' else -np.inf
+        ufunc.at(out, cell, values)
+    elif how in ('first', 'last'):
+        order = np.lexsort((times, cell))
+        sorted_cells = cell[order]
+        if how == 'first':
+            pick = np.flatnonzero(np.r_[True, sorted_cells[1:] != sorted_cells[:-1]])
+        else:
+            pick = np.flatnonzero(np.r_[sorted_cells[1:] != sorted_cells[:-1], True])
+        out[sorted_cells[pick]] = values[order[pick]]
+    else:
+        raise ValueError(f"Unknown aggregation: {how}")
+    return out
+
+
+def _fill(values, starts, ends, method, max_gap):
+    """Fill empty cells inside each station's slice; returns (values, filled mask)"""
+    positions = np.arange(len(values))
+    valid = ~np.isnan(values)
+
+    # Nearest valid cell before / after every position, limited to the same station
+    previous = np.maximum.accumulate(np.where(valid, positions, -1))
+    following = np.minimum.accumulate(np.where(valid, positions, len(values))[::-1])[::-1]
+    has_previous = previous >= starts
+    has_following = following < ends
+
+    if method == 'ffill':
+        fill = ~valid & has_previous & (positions - previous <= max_gap)
+        values = values.copy()
+        values[fill] = values[previous[fill]]
+    elif method == 'linear':
+        fill = ~valid & has_previous & has_following & (following - previous - 1 <= max_gap)
+        values = values.copy()
+        left, right = previous[fill], following[fill]
+        weight = (positions[fill] - left) / (right - left)
+        values[fill] = values[left] + weight * (values[right] - values[left])
+    else:
+        raise ValueError(f"Unknown fill method: {method}")
+    return values, fill
+
+
+def resample(df, freq, columns=None, agg='mean', fill=None, max_gap=None,
+             station_column='station_id', time_column='timestamp'):
+    """Align every station to a regular grid
+
+    freq: seconds, '15min' / 'hourly' / 'daily' or a pandas duration ('30min', '6h').
+    agg: one aggregation ('mean', 'sum', 'min', 'max', 'first', 'last', 'count') or a
+    dict per column. fill: None, 'ffill' or 'linear'; max_gap is the longest run of
+    empty cells to fill, as a cell count or a duration. Returns one row per grid cell
+    with the epoch timestamp, the aggregated columns, n_readings and a filled flag.
+    """
+    step = _step_seconds(freq)
+    if columns is None:
+        columns = [c for c in df.columns
+                   if c not in (station_column, time_column) and pd.api.types.is_numeric_dtype(df[c])]
+    aggregations = agg if isinstance(agg, dict) else {column: agg for column in columns}
+    if max_gap is None:
+        max_gap = np.inf
+    elif isinstance(max_gap, str):
+        max_gap = pd.Timedelta(max_gap).total_seconds() / step
+
+    if df.empty:
+        return pd.DataFrame(columns=[station_column, time_column] + list(columns) + ['n_readings', 'filled'])
+
+    times = to_epoch_seconds(df[time_column])
+    codes, stations = pd.factorize(df[station_column].astype(str))
+    buckets = times // step
+
+    # Each station's grid runs from its first to its last bucket
+    first = np.full(len(stations), np.iinfo(np.int64).max)
+    last = np.full(len(stations), np.iinfo(np.int64).min)
+    np.minimum.at(first, codes, buckets)
+    np.maximum.at(last, codes, buckets)
+    lengths = last - first + 1
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    total = int(lengths.sum())
+
+    cell = starts[codes] + buckets - first[codes]
+    station_of_cell = np.repeat(np.arange(len(stations)), lengths)
+    cell_starts = starts[station_of_cell]
+    cell_ends = cell_starts + lengths[station_of_cell]
+
+    result = {
+        station_column: stations[station_of_cell],
+        time_column: (first[station_of_cell] + np.arange(total) - cell_starts) * step,
+    }
+    filled = np.zeros(total, dtype=bool)
+    for column in columns:
+        how = aggregations.get(column, 'mean')
+        values = _aggregate(cell, df[column].to_numpy(dtype=float), total, how, times)
+        if fill is not None and how not in ADDITIVE_AGGREGATES:
+            values, column_filled = _fill(values, cell_starts, cell_ends, fill, max_gap)
+            filled |= column_filled
+        result[column] = values
+
+    result['n_readings'] = np.bincount(cell, minlength=total)
+    result['filled'] = filled
+    return pd.DataFrame(result)
@@ -0,0 +1,240 @@
+"""
+Tiered retention for the readings history
+Raw readings are kept for RAW_RETENTION_DAYS and rolled up into hourly and daily tables that
+live as long as the client tiers promise; long-range queries are answered from the rollups
+"""
+import json
+import os
+import threading
+import time
+import pandas as pd
+from utils.enterprise_features import enterprise_dashboard
+from utils.history_store import HistoryStore, month_bounds, month_key, readings_history
+from utils.qc import trusted_readings
+from utils.resample import FREQUENCIES, resample
+from utils.schema import now_epoch, to_epoch_seconds
+
+RAW_RETENTION_DAYS = 90
+ROLLUP_RETENTION_DAYS = {'hourly': 2 * 365, 'daily': None}  # None: the longest client tier
+ROLLUP_STATS = ('min', 'max')  # Stored next to the mean as <parameter>_min / <parameter>_max
+ROLLUP_PARAMETERS = ['turbidity_ntu', 'ph', 'dissolved_oxygen', 'temperature']
+
+# Longest range (days) answered from raw readings / hourly rollups; anything longer uses daily
+ROUTING_MAX_DAYS = {'raw': 7, 'hourly': 120}
+COMPACTION_INTERVAL_S = 15 * 60
+
+DAY_SECONDS = 86400
+RETENTION_UNITS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+
+def parse_retention(text):
+    """'7 years' / '18 months' / '90 days' -> days"""
+    count, unit = text.split()
+    return int(count) * RETENTION_UNITS[unit.lower().rstrip('s')]
+
+
+def tier_retention_days(tiers=None):
+    """Retention in days per client tier (EnterpriseDashboard.client_tiers data_retention)"""
+    tiers = enterprise_dashboard.client_tiers if tiers is None else tiers
+    return {name: parse_retention(tier['data_retention']) for name, tier in tiers.items()}
+
+
+def rollup(df, freq, parameters, station_column='station_id', time_column='timestamp'):
+    """Mean, min and max of every parameter per station and period (QC-suspect readings excluded)"""
+    df = trusted_readings(df)
+    parameters = [p for p in parameters if p in df.columns]
+    table = resample(df, freq, columns=parameters, station_column=station_column, time_column=time_column)
+    for stat in ROLLUP_STATS:
+        extremes = resample(df, freq, columns=parameters, agg=stat,
+                            station_column=station_column, time_column=time_column)
+        for parameter in parameters:
+            table[f"{parameter}_{stat}"] = extremes[parameter].to_numpy()
+
+    # Empty grid cells are not stored: a gap in the rollup is a gap in the readings
+    table = table[table['n_readings'].to_numpy() > 0].drop(columns='filled')
+    for column in table.columns.drop([station_column, time_column, 'n_readings']):
+        table[column] = table[column].astype('float32')
+    return table.astype({'n_readings': 'int32'}).reset_index(drop=True)
+
+
+def rollup_columns(parameters):
+    return [column for p in parameters for column in (p, *(f"{p}_{stat}" for stat in ROLLUP_STATS))]
+
+
+class RetentionManager:
+    def __init__(self, store, parameters=None, raw_days=RAW_RETENTION_DAYS, rollup_days=None, tiers=None):
+        self.store = store
+        self.parameters = list(parameters or ROLLUP_PARAMETERS)
+        self.raw_days = raw_days
+        self.tier_days = tier_retention_days(tiers)
+        longest = max(self.tier_days.values())
+        self.rollup_days = {freq: days or longest
+                            for freq, days in (rollup_days or ROLLUP_RETENTION_DAYS).items()}
+
+        # data_store/history/readings -> data_store/history/rollups/readings/<freq>
+        root = os.path.join(os.path.dirname(store.root), "rollups", os.path.basename(store.root))
+        self.rollups = {freq: HistoryStore(os.path.join(root, freq), store.partition_column, store.time_column)
+                        for freq in self.rollup_days}
+        self.state_path = os.path.join(root, "_state.json")
+        self.state = self._load_state()
+        self.last_run = None  # Summary of the most recent compaction
+        self.version = 0      # Bumped on every compaction, like HistoryStore.version
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'compacted_at': None, 'watermarks': {}}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        with open(self.state_path, 'w') as f:
+            json.dump(self.state, f)
+
+    # ======== COMPACTION ========
+    def compact(self, now=None):
+        """Roll up raw months written since the last run, merge finished months and expire old data
+
+        Rollups only cover complete periods (up to a watermark per frequency); queries roll up
+        the raw readings after the watermark on the fly.
+        """
+        with self._lock:
+            started = time.time()
+            now = now_epoch() if now is None else int(now)
+            time_column = self.store.time_column
+            summary = {'months_rolled_up': 0, 'months_merged': 0, 'partitions_expired': 0}
+
+            raw_cutoff = month_key([now - self.raw_days * DAY_SECONDS])[0]
+            current_month = month_key([now])[0]
+            watermarks = {freq: now // FREQUENCIES[freq] * FREQUENCIES[freq] for freq in self.rollups}
+
+            # Months written to since the last run, and every month the watermarks moved across:
+            # readings between the old and new watermark leave the raw tail and must be rolled up
+            previous = [self.state['watermarks'].get(freq) for freq in self.rollups]
+            if None in previous:
+                months = self.store.months()
+            else:
+                months = self.store.months(modified_since=self.state['compacted_at'])
+                first, last = month_key([min(previous)])[0], month_key([max(watermarks.values()) - 1])[0]
+                months |= {month for month in self.store.months() if first <= month <= last}
+
+            for month in sorted(months):
+                start, end = month_bounds(month)
+                raw = self.store.query(start, end - 1)
+                if raw.empty:
+                    continue
+                for freq, store in self.rollups.items():
+                    complete = raw[raw[time_column].to_numpy() < watermarks[freq]]
+                    store.replace(rollup(complete, freq, self.parameters, self.store.partition_column,
+                                         time_column))
+                summary['months_rolled_up'] += 1
+                if raw_cutoff <= month < current_month and self.store.compact(month):
+                    summary['months_merged'] += 1
+
+            # Months written to while this run was reading are rolled up next time, not dropped
+            pending = self.store.months(modified_since=started)
+            summary['partitions_expired'] += self.store.drop_before(raw_cutoff, keep=pending)
+            for freq, store in self.rollups.items():
+                summary['partitions_expired'] += store.drop_before(
+                    month_key([now - self.rollup_days[freq] * DAY_SECONDS])[0])
+
+            self.state = {'compacted_at': started, 'watermarks': watermarks}
+            self._save_state()
+            self.version += 1
+            summary['elapsed_s'] = time.time() - started
+            self.last_run = summary
+            return summary
+
+    def start(self, interval=COMPACTION_INTERVAL_S):
+        """Compact every `interval` seconds in a daemon thread (one per process)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"Retention compaction error (non-critical): {e}")
+                time.sleep(interval)
+
+        self._thread = threading.Thread(target=run, name="retention-compaction", daemon=True)
+        self._thread.start()
+
+    # ======== QUERIES ========
+    def route(self, start, end, now=None):
+        """Smallest table that still answers the range: 'raw', 'hourly' or 'daily'"""
+        if start is None:
+            return 'daily'
+        now = now_epoch() if now is None else now
+        age_days, span_days = (now - start) / DAY_SECONDS, (end - start) / DAY_SECONDS
+        if age_days <= self.raw_days and span_days <= ROUTING_MAX_DAYS['raw']:
+            return 'raw'
+        if age_days <= self.rollup_days['hourly'] and span_days <= ROUTING_MAX_DAYS['hourly']:
+            return 'hourly'
+        return 'daily'
+
+    def query(self, start=None, end=None, keys=None, parameters=None, tier=None, resolution=None):
+        """Readings for a range from the raw store or a rollup table
+
+        tier ('government', 'corporate', 'research') limits how far back the query reaches;
+        resolution forces 'raw', 'hourly' or 'daily' (chosen by route() otherwise). The
+        table used is reported in result.attrs['resolution'].
+        """
+        now = now_epoch()
+        start = None if start is None else int(to_epoch_seconds([start])[0])
+        end = now if end is None else int(to_epoch_seconds([end])[0])
+        if tier is not None:
+            earliest = now - self.tier_days[tier] * DAY_SECONDS
+            start = earliest if start is None else max(start, earliest)
+
+        resolution = resolution or self.route(start, end, now)
+        if resolution == 'raw':
+            df = self.store.query(start, end, keys, parameters)
+        else:
+            df = self._query_rollup(resolution, start, end, keys, parameters)
+        df.attrs['resolution'] = resolution
+        return df
+
+    def _query_rollup(self, freq, start, end, keys, parameters):
+        columns = None
+        if parameters is None:
+            parameters = self.parameters
+        else:
+            parameters = [p for p in parameters if p in self.parameters]
+            columns = rollup_columns(parameters) + ['n_readings']
+
+        watermark = self.state['watermarks'].get(freq)
+        parts = []
+        if watermark is not None and (start is None or start < watermark):
+            parts.append(self.rollups[freq].query(start, min(end, watermark - 1), keys, columns))
+
+        # Raw readings newer than the last compaction
+        tail_start = start if watermark is None or (start is not None and start > watermark) else watermark
+        if self.store.has_data() and (tail_start is None or tail_start <= end):
+            raw = self.store.query(tail_start, end, keys)
+            if not raw.empty:
+                parts.append(rollup(raw, freq, parameters, self.store.partition_column, self.store.time_column))
+
+        parts = [part for part in parts if not part.empty]
+        if not parts:
+            return pd.DataFrame()
+        df = pd.concat(parts, ignore_index=True)
+        return df.sort_values([self.store.partition_column, self.store.time_column],
+                              kind='stable').reset_index(drop=True)
+
+    def stats(self):
+        """Partitions and bytes on disk per table, for the admin panel"""
+        tables = {'raw': self.store, **self.rollups}
+        return {
+            name: {'months': len(store.months()), 'bytes': store.disk_bytes(),
+                   'retention_days': self.raw_days if name == 'raw' else self.rollup_days[name]}
+            for name, store in tables.items()
+        }
+
+
+# Create global instance
+readings_retention = RetentionManager(readings_history)
@@ -0,0 +1,183 @@
+"""
+Risk grid snapshots and deltas between Risk Checks
+Each grid's cells (position, river and risk score) are split into SNAPSHOT_TILE_DEG tiles
+stored once under their content hash, so a snapshot is a manifest of tile hashes and
+unchanged tiles are shared; snapshots are diffed only where tile hashes differ, and only
+the changed cells are passed on
+"""
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+import pandas as pd
+from utils.map_helper import data_version
+from utils.risk_raster import RISK_BANDS
+
+RISK_SNAPSHOTS_DIR = os.path.join("data_store", "risk_snapshots")
+SNAPSHOT_TILE_DEG = 1.0
+SCORE_TOLERANCE = 5.0  # Risk score points; smaller moves within a band are not a change
+KEEP_SNAPSHOTS = 48
+
+DELTA_COLUMNS = ['lat', 'lon', 'river_name', 'previous_score', 'risk_score', 'change',
+                 'previous_level', 'risk_level', 'kind']
+
+
+def risk_band(scores):
+    """Band label (RISK_BANDS) per score; None where there is no score"""
+    scores = pd.to_numeric(pd.Series(scores), errors='coerce').to_numpy(dtype=float)
+    labels = np.select([scores >= low for low, _, _ in RISK_BANDS], [label for _, label, _ in RISK_BANDS], '')
+    return np.where(labels == '', None, labels).astype(object)
+
+
+def _cells(frame):
+    columns = {'lat': float, 'lon': float, 'river_name': object, 'risk_score': float}
+    if frame is None or frame.empty:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in columns.items()})
+    cells = frame[list(columns)].copy()
+    for column in ('lat', 'lon', 'risk_score'):
+        cells[column] = pd.to_numeric(cells[column], errors='coerce')
+    cells[['lat', 'lon']] = cells[['lat', 'lon']].round(6)
+    return cells.astype({'river_name': object})
+
+
+def diff_risk_grids(previous, current, tolerance=SCORE_TOLERANCE):
+    """Cells that are new, were removed, changed risk band or moved more than tolerance points
+
+    kind is 'new', 'removed', 'level' or 'score'; change is the score difference.
+    """
+    merged = _cells(current).merge(_cells(previous), on=['lat', 'lon'], how='outer',
+                                   suffixes=('', '_previous'), indicator=True)
+    merged['river_name'] = merged['river_name'].fillna(merged['river_name_previous'])
+    merged['previous_score'] = merged['risk_score_previous']
+    merged['change'] = merged['risk_score'] - merged['previous_score']
+    merged['previous_level'] = risk_band(merged['previous_score'])
+    merged['risk_level'] = risk_band(merged['risk_score'])
+
+    state = merged['_merge'].astype(str).to_numpy()
+    merged['kind'] = np.select(
+        [state == 'left_only', state == 'right_only',
+         merged['previous_level'].to_numpy() != merged['risk_level'].to_numpy(),
+         merged['change'].abs().to_numpy() > tolerance],
+        ['new', 'removed', 'level', 'score'], '')
+    return merged.loc[merged['kind'] != '', DELTA_COLUMNS].reset_index(drop=True)
+
+
+class RiskSnapshotStore:
+    def __init__(self, root=RISK_SNAPSHOTS_DIR, tile_deg=SNAPSHOT_TILE_DEG, tolerance=SCORE_TOLERANCE):
+        self.root = root
+        self.tile_deg = tile_deg
+        self.tolerance = tolerance
+        self.tiles_dir = os.path.join(root, "tiles")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self._lock = threading.Lock()
+
+    def _split(self, risk_data):
+        """Grid -> {tile id: cells of that tile, in a canonical order}"""
+        ordered = _cells(risk_data).sort_values(['lat', 'lon'], kind='stable').reset_index(drop=True)
+        rows = np.floor(pd.to_numeric(ordered['lat']).to_numpy(dtype=float) / self.tile_deg).astype(int)
+        cols = np.floor(pd.to_numeric(ordered['lon']).to_numpy(dtype=float) / self.tile_deg).astype(int)
+        tile_ids = pd.Series(rows).astype(str) + '_' + pd.Series(cols).astype(str)
+        return {tile: frame.reset_index(drop=True) for tile, frame in ordered.groupby(tile_ids, sort=True)}
+
+    def _tile_path(self, digest):
+        return os.path.join(self.tiles_dir, f"{digest}.parquet")
+
+    def _write_atomic(self, path, write):
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        write(temporary)
+        os.replace(temporary, path)
+
+    # ======== SNAPSHOTS ========
+    def _save(self, tiles, cells):
+        os.makedirs(self.tiles_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        manifest = {'id': str(time.time_ns()), 'time': time.time(), 'cells': cells, 'tiles': {},
+                    'tiles_written': 0}
+        for tile, frame in tiles.items():
+            digest = data_version(frame)
+            path = self._tile_path(digest)
+            if not os.path.exists(path):
+                self._write_atomic(path, lambda temporary: frame.to_parquet(temporary, index=False))
+                manifest['tiles_written'] += 1
+            manifest['tiles'][tile] = digest
+
+        def write_manifest(temporary):
+            with open(temporary, 'w') as f:
+                json.dump(manifest, f)
+        self._write_atomic(os.path.join(self.snapshots_dir, f"{manifest['id']}.json"), write_manifest)
+        self._prune()
+        return manifest
+
+    def save(self, risk_data):
+        """Store a grid as a snapshot; returns its manifest (tiles already on disk are shared)"""
+        with self._lock:
+            return self._save(self._split(risk_data), len(risk_data))
+
+    def snapshots(self):
+        """Snapshot ids, oldest first"""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted((name[:-len('.json')] for name in os.listdir(self.snapshots_dir) if name.endswith('.json')),
+                      key=int)
+
+    def manifest(self, snapshot_id):
+        with open(os.path.join(self.snapshots_dir, f"{snapshot_id}.json")) as f:
+            return json.load(f)
+
+    def load(self, snapshot_id, tiles=None):
+        """Cells of a snapshot (optionally only some of its tiles)"""
+        manifest = self.manifest(snapshot_id)
+        digests = [digest for tile, digest in manifest['tiles'].items() if tiles is None or tile in tiles]
+        frames = [pd.read_parquet(self._tile_path(digest)) for digest in digests]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def _prune(self):
+        """Keep the KEEP_SNAPSHOTS most recent snapshots and the tiles they reference"""
+        snapshots = self.snapshots()
+        for snapshot_id in snapshots[:-KEEP_SNAPSHOTS]:
+            os.remove(os.path.join(self.snapshots_dir, f"{snapshot_id}.json"))
+        if len(snapshots) <= KEEP_SNAPSHOTS:
+            return
+        referenced = {f"{digest}.parquet" for snapshot_id in snapshots[-KEEP_SNAPSHOTS:]
+                      for digest in self.manifest(snapshot_id)['tiles'].values()}
+        for name in os.listdir(self.tiles_dir):
+            if name.endswith('.parquet') and name not in referenced:
+                os.remove(os.path.join(self.tiles_dir, name))
+
+    # ======== DELTAS ========
+    def record(self, risk_data, previous=None):
+        """Snapshot a new grid and return the cells that changed since snapshot previous
+
+        previous is the caller's own last snapshot id (other sessions write to the same
+        store). Only tiles whose content hash differs are loaded and compared. The result's
+        attrs carry the snapshot ids (previous is None when there is no baseline - none given
+        or already pruned - and all cells are 'new'), how many tiles changed or are unchanged
+        since the previous snapshot, and how many were shared with tiles already on disk.
+        """
+        tiles = self._split(risk_data)
+        with self._lock:
+            try:
+                previous = self.manifest(previous) if previous is not None else None
+            except FileNotFoundError:
+                previous = None
+            current = self._save(tiles, len(risk_data))
+
+        previous_tiles = previous['tiles'] if previous else {}
+        changed = sorted(tile for tile in set(previous_tiles) | set(current['tiles'])
+                         if previous_tiles.get(tile) != current['tiles'].get(tile))
+        before = self.load(previous['id'], changed) if previous else None
+        frames = [tiles[tile] for tile in changed if tile in tiles]
+        after = pd.concat(frames, ignore_index=True) if frames else None
+
+        delta = diff_risk_grids(before, after, self.tolerance)
+        delta.attrs.update(snapshot=current['id'], previous=previous['id'] if previous else None,
+                           tiles=len(current['tiles']), tiles_changed=len(changed),
+                           tiles_unchanged=len(current['tiles']) - len(set(changed) & set(current['tiles'])),
+                           tiles_shared=len(current['tiles']) - current['tiles_written'])
+        return delta
+
+
+# Create global instance
+risk_snapshots = RiskSnapshotStore()
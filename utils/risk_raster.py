@@ -0,0 +1,130 @@
+"""
+Raster rendering of the gridded risk scores
+The risk grid becomes one RGBA image (resampled to any resolution, optionally smoothed and
+colored by the CRITICAL/HIGH/MEDIUM/LOW bands) instead of one map symbol per cell
+"""
+import numpy as np
+import pandas as pd
+
+# Lower score bound, label and RGBA color of each band (colors match the map's circle markers)
+RISK_BANDS = [
+    (80, "🔴 CRITICAL", (255, 0, 0, 170)),
+    (60, "🟠 HIGH", (255, 165, 0, 160)),
+    (40, "🟡 MEDIUM", (255, 255, 0, 150)),
+    (0, "🟢 LOW", (0, 128, 0, 120)),
+]
+TRANSPARENT = (0, 0, 0, 0)
+
+
+def grid_from_points(lat, lon, score):
+    """Scattered cells on a regular lattice -> 2D score array (NaN where there is no cell)
+
+    Returns (grid, lat_min, lon_min, lat_step, lon_step); row 0 is the southernmost row.
+    """
+    lat, lon, score = (np.asarray(a, dtype=float) for a in (lat, lon, score))
+
+    def axis(values):
+        unique = np.unique(values.round(9))
+        steps = np.diff(unique)
+        return unique[0], (steps.min() if len(steps) else 1.0), unique[-1]
+
+    lat_min, lat_step, lat_max = axis(lat)
+    lon_min, lon_step, lon_max = axis(lon)
+    rows = np.rint((lat - lat_min) / lat_step).astype(np.int64)
+    cols = np.rint((lon - lon_min) / lon_step).astype(np.int64)
+    shape = (int(round((lat_max - lat_min) / lat_step)) + 1, int(round((lon_max - lon_min) / lon_step)) + 1)
+
+    # Mean score when several points share a cell
+    valid = ~np.isnan(score)
+    flat = rows[valid] * shape[1] + cols[valid]
+    counts = np.bincount(flat, minlength=shape[0] * shape[1])
+    sums = np.bincount(flat, weights=score[valid], minlength=shape[0] * shape[1])
+    grid = np.full(shape[0] * shape[1], np.nan)
+    grid[counts > 0] = sums[counts > 0] / counts[counts > 0]
+    return grid.reshape(shape), lat_min, lon_min, lat_step, lon_step
+
+
+def _interpolate_axis(values, positions, axis):
+    """Linear interpolation of a 2D array at fractional indices along one axis"""
+    positions = np.clip(positions, 0, values.shape[axis] - 1)
+    low = np.clip(np.floor(positions).astype(np.int64), 0, values.shape[axis] - 1)
+    high = np.clip(low + 1, 0, values.shape[axis] - 1)
+    weight = positions - low
+    if axis == 0:
+        return values[low] * (1 - weight)[:, None] + values[high] * weight[:, None]
+    return values[:, low] * (1 - weight) + values[:, high] * weight
+
+
+def sample_grid(grid, rows, cols):
+    """Bilinear samples at fractional row / column indices, ignoring NaN cells
+
+    Returns a len(rows) x len(cols) array; samples more than half a cell outside the grid are NaN.
+    """
+    valid = (~np.isnan(grid)).astype(float)
+    filled = np.where(valid > 0, grid, 0.0)
+    results = []
+    for values in (filled, valid):
+        values = _interpolate_axis(values, rows, 0)
+        results.append(_interpolate_axis(values, cols, 1))
+    values, weights = results
+
+    inside = (((rows >= -0.5) & (rows <= grid.shape[0] - 0.5))[:, None] &
+              ((cols >= -0.5) & (cols <= grid.shape[1] - 0.5))[None, :])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(inside & (weights > 0.5), values / weights, np.nan)
+
+
+def resample_grid(grid, factor_lat, factor_lon):
+    """Bilinear resampling by a scale factor per axis"""
+    rows, cols = [np.linspace(0, n - 1, max(1, int(round((n - 1) * f)) + 1))
+                  for n, f in zip(grid.shape, (factor_lat, factor_lon))]
+    return sample_grid(grid, rows, cols)
+
+
+def smooth_grid(grid, sigma):
+    """Separable Gaussian blur (sigma in pixels); NaN cells stay NaN and don't pull scores down"""
+    if not sigma:
+        return grid
+    radius = max(1, int(3 * sigma))
+    kernel = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    kernel /= kernel.sum()
+
+    valid = ~np.isnan(grid)
+    results = []
+    for values in (np.where(valid, grid, 0.0), valid.astype(float)):
+        values = np.apply_along_axis(np.convolve, 0, values, kernel, mode='same')
+        results.append(np.apply_along_axis(np.convolve, 1, values, kernel, mode='same'))
+    values, weights = results
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, values / weights, np.nan)
+
+
+def colorize(grid, bands=RISK_BANDS):
+    """Value grid -> RGBA uint8 image; bands are (lower bound, label, color), highest first"""
+    valid = ~np.isnan(grid)
+    values = np.where(valid, grid, -np.inf)
+    conditions = [valid & (values >= low) for low, _, _ in bands]
+    image = np.zeros(grid.shape + (4,), dtype=np.uint8)
+    for channel in range(4):
+        image[..., channel] = np.select(conditions, [color[channel] for _, _, color in bands],
+                                        TRANSPARENT[channel])
+    return image
+
+
+def risk_raster(risk_data, resolution=None, smoothing=0.0):
+    """RGBA image and [[south, west], [north, east]] bounds for a risk grid frame
+
+    resolution: output pixel size in degrees (defaults to the grid's own spacing).
+    smoothing: Gaussian sigma in output pixels.
+    """
+    grid, lat_min, lon_min, lat_step, lon_step = grid_from_points(
+        risk_data['lat'], risk_data['lon'], pd.to_numeric(risk_data['risk_score'], errors='coerce'))
+    if resolution:
+        grid = resample_grid(grid, lat_step / resolution, lon_step / resolution)
+        lat_step = lon_step = resolution
+    grid = smooth_grid(grid, smoothing)
+
+    # Pixels are centered on the cells; images are drawn top (north) row first
+    bounds = [[float(lat_min - lat_step / 2), float(lon_min - lon_step / 2)],
+              [float(lat_min + (grid.shape[0] - 0.5) * lat_step), float(lon_min + (grid.shape[1] - 0.5) * lon_step)]]
+    return colorize(grid)[::-1], bounds
@@ -0,0 +1,155 @@
+"""
+Declarative threshold rules for water-quality classification
+Rule sets are compiled once into vectorized np.select evaluators that label every
+row in one pass and report which rule fired
+"""
+import operator
+import numpy as np
+import pandas as pd
+from utils.schema import STATUS_DTYPE
+from utils.qc import trusted_readings
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+# Tiers are checked top to bottom; the first rule that matches decides the label
+WATER_QUALITY_RULES = {
+    'name': 'water_quality',
+    'default': "🟢 Normal",
+    'tiers': [
+        {'label': "🔴 Critical", 'rules': [
+            {'id': 'turbidity_critical', 'parameter': 'turbidity_ntu', 'op': '>', 'value': 100},
+            {'id': 'ph_low_critical', 'parameter': 'ph', 'op': '<', 'value': 5.5},
+            {'id': 'ph_high_critical', 'parameter': 'ph', 'op': '>', 'value': 8.5},
+        ]},
+        {'label': "🟡 Warning", 'rules': [
+            {'id': 'turbidity_warning', 'parameter': 'turbidity_ntu', 'op': '>', 'value': 50},
+            {'id': 'ph_low_warning', 'parameter': 'ph', 'op': '<', 'value': 6.0},
+            {'id': 'ph_high_warning', 'parameter': 'ph', 'op': '>', 'value': 8.0},
+        ]},
+    ]
+}
+
+# Marker colours on the monitoring maps (no upper pH bound)
+MAP_MARKER_RULES = {
+    'name': 'map_marker',
+    'default': 'green',
+    'tiers': [
+        {'label': 'red', 'rules': [
+            {'id': 'turbidity_critical', 'parameter': 'turbidity_ntu', 'op': '>', 'value': 100},
+            {'id': 'ph_low_critical', 'parameter': 'ph', 'op': '<', 'value': 5.5},
+        ]},
+        {'label': 'orange', 'rules': [
+            {'id': 'turbidity_warning', 'parameter': 'turbidity_ntu', 'op': '>', 'value': 50},
+            {'id': 'ph_low_warning', 'parameter': 'ph', 'op': '<', 'value': 6.0},
+        ]},
+    ]
+}
+
+# Which parameter a Telegram alert for a critical river reports
+ALERT_PARAMETER_RULES = {
+    'name': 'alert_parameter',
+    'default': None,
+    'tiers': [
+        {'label': 'Turbidity', 'rules': [
+            {'id': 'turbidity_alert', 'parameter': 'turbidity_ntu', 'op': '>', 'value': 100},
+        ]},
+        {'label': 'pH', 'rules': [
+            {'id': 'ph_alert', 'parameter': 'ph', 'op': '<', 'value': 5.5},
+        ]},
+    ]
+}
+
+# EPA discharge compliance for mining operations
+MINING_COMPLIANCE_RULES = {
+    'name': 'mining_compliance',
+    'default': "🟢 Compliant",
+    'tiers': [
+        {'label': "🔴 Non-Compliant", 'rules': [
+            {'id': 'turbidity_limit', 'parameter': 'Turbidity_NTU', 'op': '>', 'value': 100},
+            {'id': 'ph_limit', 'parameter': 'pH', 'op': '<', 'value': 6.0},
+            {'id': 'do_limit', 'parameter': 'Dissolved_Oxygen', 'op': '<', 'value': 5.0},
+        ]},
+        {'label': "🟡 Warning", 'rules': [
+            {'id': 'turbidity_warning', 'parameter': 'Turbidity_NTU', 'op': '>', 'value': 70},
+            {'id': 'ph_warning', 'parameter': 'pH', 'op': '<', 'value': 6.5},
+            {'id': 'do_warning', 'parameter': 'Dissolved_Oxygen', 'op': '<', 'value': 6.0},
+        ]},
+    ]
+}
+
+
+def mining_alert_rules(mine, turbidity_threshold=80, ph_min=6.0, ph_max=8.5):
+    """Rule set for a mine's configurable alert ranges in the Mining Portal"""
+    return {
+        'name': f'mining_alert_{mine}',
+        'default': None,
+        'tiers': [
+            {'label': 'Turbidity', 'rules': [
+                {'id': 'turbidity_above_threshold', 'parameter': 'Turbidity_NTU', 'op': '>',
+                 'value': turbidity_threshold},
+            ]},
+            {'label': 'pH', 'rules': [
+                {'id': 'ph_below_min', 'parameter': 'pH', 'op': '<', 'value': ph_min},
+                {'id': 'ph_above_max', 'parameter': 'pH', 'op': '>', 'value': ph_max},
+            ]},
+        ]
+    }
+
+
+class CompiledRuleSet:
+    def __init__(self, ruleset):
+        self.name = ruleset['name']
+        self.default = ruleset['default']
+
+        # Flatten tiers into one ordered rule list
+        self.rules = [dict(rule, label=tier['label']) for tier in ruleset['tiers'] for rule in tier['rules']]
+        self.parameters = sorted({rule['parameter'] for rule in self.rules})
+
+        # Index -1 (no rule matched) picks the trailing default entry
+        self._labels = np.array([rule['label'] for rule in self.rules] + [self.default], dtype=object)
+        self._rule_ids = np.array([rule['id'] for rule in self.rules] + [None], dtype=object)
+        self._thresholds = np.array([rule['value'] for rule in self.rules] + [np.nan], dtype=float)
+
+    def _columns(self, data):
+        return {parameter: np.asarray(data[parameter], dtype=float) for parameter in self.parameters}
+
+    def match(self, data):
+        """Index of the first rule each row matches, -1 when none does (NaN never matches)"""
+        columns = self._columns(data)
+        conditions = [OPERATORS[rule['op']](columns[rule['parameter']], rule['value']) for rule in self.rules]
+        return np.select(conditions, np.arange(len(self.rules)), default=-1)
+
+    def classify(self, data):
+        """Label for every row"""
+        return self._labels[self.match(data)]
+
+    def evaluate(self, data):
+        """Labels, fired rule ids and the threshold of the fired rule for every row"""
+        fired = self.match(data)
+        return self._labels[fired], self._rule_ids[fired], self._thresholds[fired]
+
+
+def compile_rules(ruleset):
+    """Compile a declarative rule set into a vectorized evaluator"""
+    return CompiledRuleSet(ruleset)
+
+
+# Compiled once per process
+water_quality_rules = compile_rules(WATER_QUALITY_RULES)
+map_marker_rules = compile_rules(MAP_MARKER_RULES)
+alert_parameter_rules = compile_rules(ALERT_PARAMETER_RULES)
+mining_compliance_rules = compile_rules(MINING_COMPLIANCE_RULES)
+
+
+def classify_water_quality(df):
+    """Status column for a readings frame (categorical, see utils.schema)
+
+    Measurements that failed spike or flatline QC don't count towards the status.
+    """
+    df = trusted_readings(df)
+    return pd.Series(pd.Categorical(water_quality_rules.classify(df), dtype=STATUS_DTYPE), index=df.index)
@@ -0,0 +1,117 @@
+"""
+Canonical in-memory schema for readings frames
+Labels are stored as categorical codes, measurements as float32 and timestamps as
+int64 epoch seconds; strings are only produced at display time
+"""
+import datetime as dt
+import numpy as np
+import pandas as pd
+from utils.status_tracker import STATUS_LABELS
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Fixed categories keep the codes stable across sessions and concatenated frames
+STATUS_DTYPE = pd.CategoricalDtype(STATUS_LABELS)
+RISK_DTYPE = pd.CategoricalDtype(["low", "medium", "high"])
+
+# Risk labels from other systems, after case, whitespace and leading emoji are folded
+RISK_ALIASES = {
+    'critical': 'high', 'extreme': 'high', 'severe': 'high', 'very high': 'high',
+    'moderate': 'medium', 'med': 'medium', 'elevated': 'medium',
+    'minimal': 'low', 'very low': 'low',
+}
+
+LABEL_COLUMNS = ['river_name', 'station_id']
+MEASUREMENT_COLUMNS = ['turbidity_ntu', 'ph', 'dissolved_oxygen', 'temperature']
+COORDINATE_COLUMNS = ['latitude', 'longitude']  # float64: geofencing needs full precision
+
+
+def now_epoch():
+    """Current wall-clock time as epoch seconds (same convention as the readings)"""
+    return int(pd.Timestamp(dt.datetime.now()).floor('s').value // 10 ** 9)
+
+
+def to_epoch_seconds(values):
+    """Timestamps (strings, datetimes, dates or epoch seconds) -> int64 epoch seconds"""
+    values = pd.Series(values)
+    if pd.api.types.is_integer_dtype(values):
+        return values.to_numpy(dtype=np.int64)
+    # Numbers (also mixed in with date strings) are epoch seconds, not pandas' nanoseconds
+    numeric = values.dtype == object or pd.api.types.is_float_dtype(values)
+    numbers = pd.to_numeric(values, errors='coerce') if numeric else pd.Series(np.nan, index=values.index)
+    is_number = numbers.notna().to_numpy()
+    parsed = pd.to_datetime(values.where(~is_number), errors='coerce', format='mixed')
+    epochs = parsed.to_numpy('datetime64[s]').astype(np.int64)
+    epochs[is_number] = numbers[is_number].to_numpy(dtype=np.int64)
+    # Unparseable timestamps fall back to the ingestion time
+    epochs[parsed.isna().to_numpy() & ~is_number] = now_epoch()
+    return epochs
+
+
+def normalize_risk_levels(values):
+    """Risk labels -> RISK_DTYPE ('High', ' HIGH', '🔴 CRITICAL' -> 'high'); unrecognised labels -> NaN"""
+    values = pd.Series(values)
+    if values.dtype == RISK_DTYPE:
+        return values
+    text = values.astype(object).str.strip().str.lower().str.replace(r'^[^a-z]+', '', regex=True)
+    labels = {label: label for label in RISK_DTYPE.categories}
+    labels.update(RISK_ALIASES)
+    return text.map(labels).astype(RISK_DTYPE)
+
+
+def format_timestamps(epochs, fmt=TIMESTAMP_FORMAT):
+    """Epoch seconds -> display strings"""
+    return pd.to_datetime(pd.Series(epochs), unit='s').dt.strftime(fmt)
+
+
+def format_timestamp(epoch, fmt=TIMESTAMP_FORMAT):
+    """Single epoch (or an already formatted string) -> display string"""
+    if isinstance(epoch, str):
+        return epoch
+    return pd.to_datetime(int(epoch), unit='s').strftime(fmt)
+
+
+def to_canonical(df):
+    """Convert a readings frame to the canonical dtypes (idempotent, unknown columns kept)"""
+    df = df.copy(deep=False)
+
+    for column in LABEL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype(str).astype('category')
+        elif column in df.columns:
+            # Concatenated frames can carry unused categories from earlier uploads
+            df[column] = df[column].cat.remove_unused_categories()
+
+    if 'status' in df.columns and df['status'].dtype != STATUS_DTYPE:
+        status = df['status'].astype(object)
+        df['status'] = status.where(status.isin(STATUS_DTYPE.categories)).astype(STATUS_DTYPE)
+    if 'risk_level' in df.columns and df['risk_level'].dtype != RISK_DTYPE:
+        df['risk_level'] = normalize_risk_levels(df['risk_level'])
+
+    for column in MEASUREMENT_COLUMNS:
+        if column in df.columns and df[column].dtype != np.float32:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float32)
+    for column in COORDINATE_COLUMNS:
+        if column in df.columns and df[column].dtype != np.float64:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype(np.float64)
+
+    if 'qc_flags' in df.columns and df['qc_flags'].dtype != np.uint8:
+        df['qc_flags'] = df['qc_flags'].fillna(0).astype(np.uint8)
+
+    if 'timestamp' in df.columns and df['timestamp'].dtype != np.int64:
+        df['timestamp'] = to_epoch_seconds(df['timestamp'])
+
+    return df
+
+
+def for_display(df):
+    """Copy of a canonical frame with human-readable timestamps"""
+    df = df.copy(deep=False)
+    if 'timestamp' in df.columns and pd.api.types.is_integer_dtype(df['timestamp']):
+        df['timestamp'] = format_timestamps(df['timestamp']).to_numpy()
+    return df
+
+
+def memory_bytes(df):
+    """Deep memory footprint of a frame"""
+    return int(df.memory_usage(deep=True).sum())
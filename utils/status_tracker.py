@@ -0,0 +1,61 @@
+"""
+Per-station status state machine for live updates
+Statuses are kept as a compact int8 code array so each tick is one vectorized comparison
+"""
+import numpy as np
+import pandas as pd
+
+STATUS_LABELS = ["🟢 Normal", "🟡 Warning", "🔴 Critical"]
+STATUS_CODES = {label: code for code, label in enumerate(STATUS_LABELS)}
+NORMAL, WARNING, CRITICAL = range(3)
+
+
+class StatusTracker:
+    def __init__(self, station_column='station_id'):
+        self.station_column = station_column
+        self._stations = pd.Index([], dtype=object)
+        self._codes = np.zeros(0, dtype=np.int8)
+
+    def encode(self, statuses):
+        """Status labels -> int8 codes (unknown labels count as normal)"""
+        statuses = pd.Series(statuses)
+        if isinstance(statuses.dtype, pd.CategoricalDtype) and list(statuses.cat.categories) == STATUS_LABELS:
+            # Canonical frames already carry the codes
+            codes = statuses.cat.codes.to_numpy(dtype=np.int8)
+            return np.where(codes < 0, NORMAL, codes).astype(np.int8)
+        return statuses.map(STATUS_CODES).fillna(NORMAL).to_numpy(dtype=np.int8)
+
+    def update(self, df):
+        """Advance to a new snapshot and return only the stations whose status changed
+
+        Stations missing from the snapshot keep their last status, so a station that skips a
+        tick does not restart from normal and alert again when it reports.
+        """
+        snapshot = df.drop_duplicates(self.station_column, keep='last')
+        stations = pd.Index(snapshot[self.station_column].astype(str))
+        codes = self.encode(snapshot['status'])
+
+        # Stations seen for the first time start from normal
+        positions = self._stations.get_indexer(stations)
+        previous = np.full(len(stations), NORMAL, dtype=np.int8)
+        known = positions >= 0
+        previous[known] = self._codes[positions[known]]
+
+        changed = previous != codes
+        self._codes[positions[known]] = codes[known]
+        self._stations = self._stations.append(stations[~known])
+        self._codes = np.concatenate([self._codes, codes[~known]])
+
+        labels = np.array(STATUS_LABELS, dtype=object)
+        transitions = pd.DataFrame({
+            self.station_column: stations[changed],
+            'river_name': snapshot['river_name'].to_numpy()[changed],
+            'previous_status': labels[previous[changed]],
+            'status': labels[codes[changed]],
+            'escalated': codes[changed] > previous[changed]
+        })
+        return transitions
+
+    def count(self, status):
+        """Number of tracked stations (by their last reported status) currently in a status"""
+        return int(np.count_nonzero(self._codes == STATUS_CODES[status]))
@@ -0,0 +1,285 @@
+"""
+Slippy-map tile pyramid for gridded layers (AI risk scores, satellite turbidity)
+Tiles are rendered from the grid with NumPy, cached on disk as z/x/y PNGs and served by a
+small local HTTP server that Folium consumes as a TileLayer, so the browser only fetches
+the tiles it shows at the current zoom
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from folium.utilities import write_png
+from utils.risk_raster import RISK_BANDS, colorize, grid_from_points, sample_grid
+
+TILE_SIZE = 256
+TILES_DIR = os.path.join("data_store", "tiles")
+TILE_SERVER_HOST = os.environ.get("GUARDIAN_TILE_HOST", "127.0.0.1")
+TILE_SERVER_PORT = int(os.environ.get("GUARDIAN_TILE_PORT", 8765))
+# Address the browser uses. The server only listens on TILE_SERVER_HOST (loopback by default),
+# so the browser can only reach it through a URL configured for the deployment: proxy a public
+# URL to TILE_SERVER_HOST:TILE_SERVER_PORT and set GUARDIAN_TILE_URL to it (or set
+# GUARDIAN_TILE_HOST=0.0.0.0, open the port and point GUARDIAN_TILE_URL at it). Without it, maps
+# embed their data instead of fetching tiles, station aggregates and popup details from here;
+# the metrics API stays available on localhost.
+TILE_SERVER_URL = os.environ.get("GUARDIAN_TILE_URL", f"http://localhost:{TILE_SERVER_PORT}")
+TILE_SERVER_PUBLIC = "GUARDIAN_TILE_URL" in os.environ
+
+PRERENDER_ZOOMS = range(5, 11)  # National view down to district level; deeper tiles render on request
+MAX_ZOOM = 15
+KEEP_VERSIONS = 3  # Per layer; older pyramids are deleted unless a cached page still links to them
+
+# Satellite turbidity index (NTU); 80 is where the risk engine reports "High turbidity"
+TURBIDITY_BANDS = [
+    (200, "Severe", (139, 69, 19, 170)),
+    (80, "High", (205, 133, 63, 150)),
+    (30, "Moderate", (240, 230, 140, 120)),
+    (0, "Low", (30, 144, 255, 80)),
+]
+LAYER_BANDS = {'risk': RISK_BANDS, 'turbidity': TURBIDITY_BANDS}
+
+VERSION_PATTERN = re.compile(r'[0-9a-f]{16}')  # blake2b digest_size=8, as hex
+SEGMENT_PATTERN = re.compile(r'[A-Za-z0-9_-][A-Za-z0-9_.-]*')  # URL path segments (no '..')
+
+# Checks registered by holders of rendered pages (the map cache): versions they still link to
+# are kept when old versions are pruned
+_reference_checks = []
+
+
+def keep_referenced(check):
+    """Register check(version) -> True while a rendered page still links to that version"""
+    _reference_checks.append(check)
+
+
+def is_referenced(version):
+    return any(check(version) for check in _reference_checks)
+
+
+# ======== TILE MATH (Web Mercator) ========
+def lat_to_tile_y(lat, z):
+    lat = np.radians(np.clip(lat, -85.0511, 85.0511))
+    return (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / math.pi) / 2 * 2 ** z
+
+
+def lon_to_tile_x(lon, z):
+    return (np.asarray(lon) + 180) / 360 * 2 ** z
+
+
+def tile_range(bounds, z):
+    """x and y tile ranges covering [[south, west], [north, east]] at zoom z"""
+    (south, west), (north, east) = bounds
+    x0, x1 = int(lon_to_tile_x(west, z)), int(lon_to_tile_x(east, z))
+    y0, y1 = int(lat_to_tile_y(north, z)), int(lat_to_tile_y(south, z))
+    return range(x0, x1 + 1), range(y0, y1 + 1)
+
+
+def pixel_centers(z, x, y):
+    """Latitude of every pixel row and longitude of every pixel column of a tile"""
+    world = TILE_SIZE * 2 ** z
+    offsets = np.arange(TILE_SIZE) + 0.5
+    lon = (x * TILE_SIZE + offsets) / world * 360 - 180
+    lat = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (y * TILE_SIZE + offsets) / world))))
+    return lat, lon
+
+
+class TilePyramid:
+    def __init__(self, root=TILES_DIR):
+        self.root = root
+        self._layers = {}  # (layer, version) -> grid and its placement
+        self._lock = threading.Lock()
+        self._empty_tile = None
+        self.rendered = 0
+
+    def _version_dir(self, layer, version):
+        return os.path.join(self.root, layer, version)
+
+    # ======== PUBLISHING ========
+    def publish(self, layer, lat, lon, values, prerender=True):
+        """Register gridded values as a tile layer; returns its version (a content hash)
+
+        The grid is saved next to its tiles so any server process can render missing ones.
+        Zooms in PRERENDER_ZOOMS are rendered in a background thread.
+        """
+        grid, lat_min, lon_min, lat_step, lon_step = grid_from_points(lat, lon, values)
+        placement = [float(lat_min), float(lon_min), float(lat_step), float(lon_step)]
+        digest = hashlib.blake2b(grid.tobytes(), digest_size=8)
+        digest.update(json.dumps([layer, placement, grid.shape]).encode())
+        version = digest.hexdigest()
+
+        directory = self._version_dir(layer, version)
+        if not os.path.exists(os.path.join(directory, "grid.npz")):
+            os.makedirs(directory, exist_ok=True)
+            np.savez(os.path.join(directory, "grid.npz"), grid=grid, placement=placement)
+        else:
+            os.utime(directory)  # Republished: newest again for pruning
+        with self._lock:
+            self._layers[(layer, version)] = (grid, placement)
+        self._prune(layer, keep=version)
+
+        if prerender:
+            threading.Thread(target=self.prerender, args=(layer, version), daemon=True).start()
+        return version
+
+    def prerender(self, layer, version, zooms=PRERENDER_ZOOMS):
+        bounds = self.bounds(layer, version)
+        for z in zooms:
+            xs, ys = tile_range(bounds, z)
+            for x in xs:
+                for y in ys:
+                    self.tile(layer, version, z, x, y)
+
+    def _prune(self, layer, keep):
+        """Delete all but the KEEP_VERSIONS most recent pyramids of a layer (and those still linked)"""
+        layer_dir = os.path.join(self.root, layer)
+        versions = sorted((os.path.join(layer_dir, v) for v in os.listdir(layer_dir)),
+                          key=os.path.getmtime, reverse=True)
+        for directory in versions[KEEP_VERSIONS:]:
+            if os.path.basename(directory) != keep and not is_referenced(os.path.basename(directory)):
+                shutil.rmtree(directory, ignore_errors=True)
+                with self._lock:
+                    self._layers.pop((layer, os.path.basename(directory)), None)
+
+    # ======== RENDERING ========
+    def _grid(self, layer, version):
+        with self._lock:
+            if (layer, version) in self._layers:
+                return self._layers[(layer, version)]
+        path = os.path.join(self._version_dir(layer, version), "grid.npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as saved:
+            entry = (saved['grid'], saved['placement'].tolist())
+        with self._lock:
+            self._layers[(layer, version)] = entry
+        return entry
+
+    def bounds(self, layer, version):
+        grid, (lat_min, lon_min, lat_step, lon_step) = self._grid(layer, version)
+        return [[lat_min - lat_step / 2, lon_min - lon_step / 2],
+                [lat_min + (grid.shape[0] - 0.5) * lat_step, lon_min + (grid.shape[1] - 0.5) * lon_step]]
+
+    def render(self, layer, version, z, x, y):
+        """RGBA image of one tile"""
+        grid, (lat_min, lon_min, lat_step, lon_step) = self._grid(layer, version)
+        lat, lon = pixel_centers(z, x, y)
+        values = sample_grid(grid, (lat - lat_min) / lat_step, (lon - lon_min) / lon_step)
+        return colorize(values, LAYER_BANDS.get(layer, RISK_BANDS))
+
+    def empty_tile(self):
+        if self._empty_tile is None:
+            self._empty_tile = write_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+        return self._empty_tile
+
+    def tile(self, layer, version, z, x, y):
+        """PNG bytes of one tile, rendered on first request and then read from the disk cache"""
+        path = os.path.join(self._version_dir(layer, version), str(z), str(x), f"{y}.png")
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return f.read() or self.empty_tile()  # Empty files mark fully transparent tiles
+        if not 0 <= z <= MAX_ZOOM or self._grid(layer, version) is None:
+            return None
+
+        image = self.render(layer, version, z, x, y)
+        png = write_png(image) if image[..., 3].any() else b''
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(png)
+        os.replace(temporary, path)
+        self.rendered += 1
+        return png or self.empty_tile()
+
+    def stats(self):
+        tiles = sum(len(files) for _, _, files in os.walk(self.root)) if os.path.isdir(self.root) else 0
+        return {'layers': len(self._layers), 'tiles_on_disk': tiles, 'rendered': self.rendered}
+
+
+# ======== SERVER ========
+class _TileRequestHandler(BaseHTTPRequestHandler):
+    pyramid = None
+    routes = {}
+
+    def _tile(self, parts):
+        # /tiles/<layer>/<version>/<z>/<x>/<y>.png
+        if len(parts) != 5 or not parts[4].endswith('.png'):
+            return None
+        if parts[0] not in LAYER_BANDS or not VERSION_PATTERN.fullmatch(parts[1]):
+            return None
+        try:
+            png = self.pyramid.tile(parts[0], parts[1], int(parts[2]), int(parts[3]), int(parts[4][:-4]))
+        except ValueError:
+            return None
+        return None if png is None else ('image/png', png)
+
+    def do_GET(self):
+        parts = self.path.split('?')[0].strip('/').split('/')
+        handler = self._tile if parts[0] == 'tiles' else self.routes.get(parts[0])
+        # Segments end up in file paths: anything but plain names is rejected before routing
+        safe = all(SEGMENT_PATTERN.fullmatch(part) for part in parts)
+        response = handler(parts[1:]) if handler is not None and safe else None
+        if response is None:
+            self.send_error(404)
+            return
+        # (content type, body[, cache control]); tiles and other versioned URLs never change
+        content_type, body, *cache_control = response
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Cache-Control', cache_control[0] if cache_control else 'public, max-age=31536000, immutable')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # One line per tile would flood the Streamlit log
+
+
+class TileServer:
+    def __init__(self, pyramid, host=TILE_SERVER_HOST, port=TILE_SERVER_PORT, url=TILE_SERVER_URL,
+                 public=TILE_SERVER_PUBLIC):
+        self.pyramid = pyramid
+        self.host = host
+        self.port = port
+        self.url = url
+        self.public = public  # url is configured to be reachable from the browser
+        self.routes = {}  # First path segment -> handler(remaining segments) -> (content type, body[, cache control])
+        self._server = None
+
+    def route(self, prefix, handler):
+        """Serve /<prefix>/... from handler (other modules' endpoints share this server)"""
+        self.routes[prefix] = handler
+
+    def start(self):
+        """Serve tiles from a daemon thread (once per process)
+
+        If the port is taken, another server process is already serving the shared tile
+        directory, which works just as well.
+        """
+        if self._server is not None:
+            return True
+        handler = type('TileRequestHandler', (_TileRequestHandler,), {'pyramid': self.pyramid, 'routes': self.routes})
+        try:
+            self._server = ThreadingHTTPServer((self.host, self.port), handler)
+        except OSError as e:
+            print(f"Tile server not started (non-critical): {e}")
+            return False
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="tile-server", daemon=True).start()
+        return True
+
+    def browser_reachable(self):
+        """Whether maps can fetch from url: it is configured (GUARDIAN_TILE_URL) and the server runs"""
+        return self.public and self.start()
+
+    def url_template(self, layer, version):
+        return f"{self.url}/tiles/{layer}/{version}/{{z}}/{{x}}/{{y}}.png"
+
+
+# Create global instances
+tile_pyramid = TilePyramid()
+tile_server = TileServer(tile_pyramid)
@@ -0,0 +1,332 @@
+"""
+Compressed storage codec for sensor time series
+Timestamps are stored as delta-of-delta, measurements as quantized deltas (or XOR of the
+float bits when they must stay lossless), all zigzag/varint packed in chunked blocks.
+Encoding and decoding are vectorized NumPy; no per-value Python loops.
+
+Benchmark against Parquet: python -m utils.ts_codec
+"""
+import io
+import struct
+import time
+import numpy as np
+import pandas as pd
+from utils.schema import to_epoch_seconds
+
+MAGIC = b'GGTS'
+VERSION = 1
+BLOCK_ROWS = 65536
+
+# Column kinds
+TIMESTAMP, QUANTIZED, XOR, CODES = range(4)
+
+# Quantization steps, matching the probe resolution (see utils.gateway_format)
+DEFAULT_COLUMNS = {
+    'station_id': (CODES, 0.0),
+    'timestamp': (TIMESTAMP, 0.0),
+    'turbidity_ntu': (QUANTIZED, 0.1),
+    'ph': (QUANTIZED, 0.01),
+    'dissolved_oxygen': (QUANTIZED, 0.01),
+    'temperature': (QUANTIZED, 0.01),
+}
+
+FILE_HEADER = struct.Struct('<4sBH')    # magic, version, column count
+COLUMN_HEADER = struct.Struct('<BBd')  # name length, kind, quantization step
+BLOCK_HEADER = struct.Struct('<I')     # rows in block
+LENGTH = struct.Struct('<I')
+
+
+# ======== INTEGER PACKING ========
+def zigzag_encode(values):
+    """int64 -> uint64 with small magnitudes (of either sign) mapping to small numbers"""
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values):
+    values = values.astype(np.uint64)
+    return ((values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64))
+
+
+def varint_encode(values):
+    """uint64 array -> LEB128 bytes (7 bits per byte, high bit = more bytes follow)"""
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b''
+    # Bytes needed per value: 1 for 0, up to 10 for 64-bit values
+    bits = np.zeros(len(values), dtype=np.int64)
+    nonzero = values > 0
+    bits[nonzero] = np.floor(np.log2(values[nonzero].astype(np.float64))).astype(np.int64) + 1
+    # float64 log2 can round up just below a power of two; trust the integer check instead
+    bits[nonzero] = np.where(values[nonzero] >> bits[nonzero].astype(np.uint64) == 0, bits[nonzero],
+                             bits[nonzero] + 1)
+    nbytes = np.maximum(1, (bits + 6) // 7)
+
+    width = int(nbytes.max())
+    shifts = (7 * np.arange(width)).astype(np.uint64)
+    groups = ((values[:, None] >> shifts[None, :]) & np.uint64(0x7F)).astype(np.uint8)
+    positions = np.arange(width)[None, :]
+    groups[positions < (nbytes[:, None] - 1)] |= 0x80
+    return groups[positions < nbytes[:, None]].tobytes()
+
+
+def varint_decode(data, count=None):
+    """LEB128 bytes -> uint64 array"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero((raw & 0x80) == 0)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lengths = ends - starts + 1
+
+    # One gather per byte position (deltas rarely need more than 2-3 bytes)
+    payload = (raw & 0x7F).astype(np.uint64)
+    values = payload[starts]
+    for position in range(1, int(lengths.max())):
+        longer = np.flatnonzero(lengths > position)
+        values[longer] |= payload[starts[longer] + position] << np.uint64(7 * position)
+    if count is not None and len(values) != count:
+        raise ValueError(f"Corrupt block: expected {count} values, decoded {len(values)}")
+    return values
+
+
+# ======== COLUMN CODECS ========
+def _encode_timestamps(values):
+    deltas = np.diff(values, prepend=0)
+    return varint_encode(zigzag_encode(np.diff(deltas, prepend=0)))
+
+
+def _decode_timestamps(data, count):
+    return np.cumsum(np.cumsum(zigzag_decode(varint_decode(data, count))))
+
+
+def _validity(values):
+    """NaN positions are kept in a packed bitmap; the value stream repeats the previous value"""
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values, b''
+    filled = pd.Series(values).ffill().fillna(0.0).to_numpy()
+    return filled, np.packbits(valid).tobytes()
+
+
+def _apply_validity(values, bitmap, count):
+    if bitmap:
+        valid = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), count=count).astype(bool)
+        values = values.astype(np.float64)
+        values[~valid] = np.nan
+    return values
+
+
+def _encode_quantized(values, step):
+    values, bitmap = _validity(np.asarray(values, dtype=np.float64))
+    quantized = np.rint(values / step).astype(np.int64)
+    return varint_encode(zigzag_encode(np.diff(quantized, prepend=0))), bitmap
+
+
+def _decode_quantized(data, bitmap, count, step):
+    values = np.cumsum(zigzag_decode(varint_decode(data, count))) * step
+    return _apply_validity(values, bitmap, count)
+
+
+def _encode_xor(values):
+    values, bitmap = _validity(np.asarray(values, dtype=np.float64))
+    bits = values.view(np.uint64)
+    # Byte-swapped XOR: equal sign/exponent/high mantissa bits become low zero bytes
+    xored = np.bitwise_xor(bits, np.concatenate([[np.uint64(0)], bits[:-1]])).byteswap()
+    return varint_encode(xored), bitmap
+
+
+def _decode_xor(data, bitmap, count):
+    xored = varint_decode(data, count).byteswap()
+    values = np.bitwise_xor.accumulate(xored).view(np.float64)
+    return _apply_validity(values, bitmap, count)
+
+
+# ======== BLOCKS AND FILES ========
+def encode_frame(df, columns=None, block_rows=BLOCK_ROWS):
+    """Encode a readings frame; rows are sorted by (station, time) so deltas stay small
+
+    columns maps column name -> (kind, quantization step); defaults to DEFAULT_COLUMNS.
+    """
+    if columns is None:
+        columns = {name: spec for name, spec in DEFAULT_COLUMNS.items() if name in df.columns}
+    sort_keys = [c for c in ('station_id', 'timestamp') if c in columns]
+    df = df.sort_values(sort_keys, kind='stable') if sort_keys else df
+
+    out = io.BytesIO()
+    out.write(FILE_HEADER.pack(MAGIC, VERSION, len(columns)))
+
+    arrays = {}
+    for name, (kind, step) in columns.items():
+        encoded_name = name.encode('utf-8')
+        out.write(COLUMN_HEADER.pack(len(encoded_name), kind, step))
+        out.write(encoded_name)
+        if kind == CODES:
+            codes, dictionary = pd.factorize(df[name].astype(str))
+            dictionary_bytes = '\n'.join(dictionary).encode('utf-8')
+            out.write(LENGTH.pack(len(dictionary_bytes)))
+            out.write(dictionary_bytes)
+            arrays[name] = codes.astype(np.int64)
+        elif kind == TIMESTAMP:
+            arrays[name] = to_epoch_seconds(df[name])
+        else:
+            arrays[name] = df[name].to_numpy(dtype=np.float64)
+
+    for start in range(0, len(df), block_rows):
+        count = min(block_rows, len(df) - start)
+        out.write(BLOCK_HEADER.pack(count))
+        for name, (kind, step) in columns.items():
+            chunk = arrays[name][start:start + count]
+            bitmap = b''
+            if kind == TIMESTAMP:
+                payload = _encode_timestamps(chunk)
+            elif kind == CODES:
+                payload = varint_encode(zigzag_encode(np.diff(chunk, prepend=0)))
+            elif kind == QUANTIZED:
+                payload, bitmap = _encode_quantized(chunk, step)
+            else:
+                payload, bitmap = _encode_xor(chunk)
+            out.write(LENGTH.pack(len(payload)))
+            out.write(payload)
+            out.write(LENGTH.pack(len(bitmap)))
+            out.write(bitmap)
+
+    return out.getvalue()
+
+
+def decode_frame(data):
+    """Decode bytes from encode_frame back into a DataFrame"""
+    view = memoryview(data)
+    magic, version, column_count = FILE_HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a Guardian Ghana time-series file")
+    if version != VERSION:
+        raise ValueError(f"Unsupported time-series codec version: {version}")
+    offset = FILE_HEADER.size
+
+    columns, dictionaries = [], {}
+    for _ in range(column_count):
+        name_length, kind, step = COLUMN_HEADER.unpack_from(view, offset)
+        offset += COLUMN_HEADER.size
+        name = bytes(view[offset:offset + name_length]).decode('utf-8')
+        offset += name_length
+        if kind == CODES:
+            (length,) = LENGTH.unpack_from(view, offset)
+            offset += LENGTH.size
+            dictionaries[name] = np.array(bytes(view[offset:offset + length]).decode('utf-8').split('\n'),
+                                          dtype=object)
+            offset += length
+        columns.append((name, kind, step))
+
+    parts = {name: [] for name, _, _ in columns}
+    while offset < len(view):
+        (count,) = BLOCK_HEADER.unpack_from(view, offset)
+        offset += BLOCK_HEADER.size
+        for name, kind, step in columns:
+            (length,) = LENGTH.unpack_from(view, offset)
+            payload = view[offset + LENGTH.size:offset + LENGTH.size + length]
+            offset += LENGTH.size + length
+            (length,) = LENGTH.unpack_from(view, offset)
+            bitmap = bytes(view[offset + LENGTH.size:offset + LENGTH.size + length])
+            offset += LENGTH.size + length
+
+            if kind == TIMESTAMP:
+                parts[name].append(_decode_timestamps(payload, count))
+            elif kind == CODES:
+                parts[name].append(np.cumsum(zigzag_decode(varint_decode(payload, count))))
+            elif kind == QUANTIZED:
+                parts[name].append(_decode_quantized(payload, bitmap, count, step))
+            else:
+                parts[name].append(_decode_xor(payload, bitmap, count))
+
+    result = {}
+    for name, kind, _ in columns:
+        values = np.concatenate(parts[name]) if parts[name] else np.zeros(0, dtype=np.int64)
+        if kind == CODES:
+            values = pd.Categorical.from_codes(values, categories=dictionaries[name])
+        elif kind != TIMESTAMP:
+            values = values.astype(np.float32) if kind == QUANTIZED else values
+        result[name] = values
+    return pd.DataFrame(result)
+
+
+def write_frame(path, df, columns=None, block_rows=BLOCK_ROWS):
+    """Encode df to a file; returns the number of bytes written"""
+    data = encode_frame(df, columns, block_rows)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def read_frame(path):
+    with open(path, 'rb') as f:
+        return decode_frame(f.read())
+
+
+# ======== BENCHMARK ========
+def synthetic_readings(stations=100, minutes=10080, seed=0):
+    """1-minute readings for `stations` probes along the monitored rivers (random walks)"""
+    from data.sample_data import RIVERS
+    rng = np.random.default_rng(seed)
+    start = int(pd.Timestamp('2025-01-01').timestamp())
+    n = stations * minutes
+
+    # Reporting jitter: most readings on the minute, some a few seconds late
+    times = start + np.tile(np.arange(minutes) * 60, stations) + rng.choice([0, 0, 0, 1, 2], n)
+    station_ids = np.repeat([f"{RIVERS[i % len(RIVERS)]['station_id'][:3]}-{i:04d}" for i in range(stations)],
+                            minutes)
+
+    def walk(base, step, low, high):
+        steps = rng.normal(0, step, (stations, minutes))
+        return np.clip(base + np.cumsum(steps, axis=1), low, high).ravel()
+
+    return pd.DataFrame({
+        'station_id': station_ids,
+        'timestamp': times,
+        'turbidity_ntu': np.round(walk(90, 0.8, 1, 500), 1),
+        'ph': np.round(walk(6.2, 0.01, 4, 9), 2),
+        'dissolved_oxygen': np.round(walk(5.5, 0.02, 0, 12), 2),
+        'temperature': np.round(walk(27, 0.02, 20, 35), 2),
+    })
+
+
+def benchmark(stations=100, minutes=10080):
+    """Compression ratio and decode throughput of the codec vs Parquet on synthetic data"""
+    df = synthetic_readings(stations, minutes)
+    raw_bytes = int(df.memory_usage(deep=False, index=False).sum())
+    results = []
+
+    def measure(name, encode, decode):
+        start = time.perf_counter()
+        payload = encode()
+        encode_s = time.perf_counter() - start
+        start = time.perf_counter()
+        decoded = decode(payload)
+        decode_s = time.perf_counter() - start
+        results.append({
+            'format': name,
+            'bytes': len(payload),
+            'ratio': raw_bytes / len(payload),
+            'encode_s': encode_s,
+            'decode_s': decode_s,
+            'decode_mrows_s': len(decoded) / decode_s / 1e6,
+        })
+
+    lossless = dict(DEFAULT_COLUMNS, **{c: (XOR, 0.0) for c in ('turbidity_ntu', 'ph', 'dissolved_oxygen',
+                                                                   'temperature')})
+    measure('codec (quantized delta)', lambda: encode_frame(df), decode_frame)
+    measure('codec (xor, lossless)', lambda: encode_frame(df, lossless), decode_frame)
+    for compression in ('snappy', 'zstd'):
+        def to_parquet(compression=compression):
+            buffer = io.BytesIO()
+            df.to_parquet(buffer, compression=compression, index=False)
+            return buffer.getvalue()
+        measure(f'parquet ({compression})', to_parquet, lambda payload: pd.read_parquet(io.BytesIO(payload)))
+
+    return pd.DataFrame(results), raw_bytes, len(df)
+
+
+if __name__ == '__main__':
+    table, raw_bytes, rows = benchmark()
+    print(f"{rows:,} readings, {raw_bytes / 1e6:.1f} MB uncompressed")
+    print(table.to_string(index=False, float_format=lambda v: f"{v:.2f}"))
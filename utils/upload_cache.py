@@ -0,0 +1,131 @@
+"""
+Content-hash cache for parsed uploads
+Streamlit reruns the script on every widget click and live tick; uploads are
+fingerprinted by content so only a new file is parsed, validated and classified again
+"""
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+CACHE_DIR = ".upload_cache"
+MAX_MEMORY_BYTES = 256 * 1024 * 1024  # 256 MB of parsed frames per server process
+MAX_SPILL_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB of spilled frames on disk
+
+
+def fingerprint(data, name=""):
+    """Content hash of an upload; the extension is included because it selects the parser"""
+    digest = hashlib.blake2b(data, digest_size=16)
+    digest.update(os.path.splitext(name)[1].lower().encode())
+    return digest.hexdigest()
+
+
+class UploadCache:
+    def __init__(self, max_bytes=MAX_MEMORY_BYTES, spill_dir=CACHE_DIR, max_spill_bytes=MAX_SPILL_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._frames = OrderedDict()  # fingerprint -> frame, least recently used first
+        self._sizes = {}
+        self._memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()  # Sessions run on separate threads
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, f"{key}.feather")
+
+    def get(self, key):
+        """Copy of the cached frame for a fingerprint, from memory or the spill directory"""
+        with self._lock:
+            if key in self._frames:
+                self._frames.move_to_end(key)
+                self.hits += 1
+                return self._frames[key].copy()
+
+            path = self._spill_path(key)
+            try:
+                df = pd.read_feather(path)
+                os.utime(path)  # Spilled files are pruned least recently used first
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+            self._remember(key, df)
+            self.hits += 1
+            return df.copy()
+
+    def put(self, key, df):
+        """Cache a parsed frame in memory, spilling least recently used frames to disk"""
+        with self._lock:
+            self._remember(key, df)
+
+    def _remember(self, key, df):
+        if key in self._frames:
+            self._memory_bytes -= self._sizes[key]
+        self._frames[key] = df
+        self._frames.move_to_end(key)
+        self._sizes[key] = int(df.memory_usage(deep=True).sum())
+        self._memory_bytes += self._sizes[key]
+
+        # Keep the newest frame in memory even if it alone exceeds the cap
+        while self._memory_bytes > self.max_bytes and len(self._frames) > 1:
+            old_key, old_df = self._frames.popitem(last=False)
+            self._memory_bytes -= self._sizes.pop(old_key)
+            self._spill(old_key, old_df)
+
+    def _spill(self, key, df):
+        path = self._spill_path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            df.reset_index(drop=True).to_feather(path)
+            self._prune_spill()
+        except Exception as e:
+            print(f"Upload cache spill failed (non-critical): {e}")
+
+    def _prune_spill(self):
+        """Delete the least recently used spilled frames beyond max_spill_bytes"""
+        files = []
+        for name in os.listdir(self.spill_dir):
+            if name.endswith('.feather'):
+                try:
+                    info = os.stat(os.path.join(self.spill_dir, name))
+                except FileNotFoundError:
+                    continue
+                files.append((info.st_mtime, info.st_size, name))
+        total = sum(size for _, size, _ in files)
+        for _, size, name in sorted(files):
+            if total <= self.max_spill_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.spill_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def get_or_parse(self, uploaded_file, parse):
+        """Return the cached frame for this upload, calling parse(uploaded_file) only on a miss"""
+        key = fingerprint(uploaded_file.getvalue(), uploaded_file.name)
+        df = self.get(key)
+        if df is None:
+            df = parse(uploaded_file)
+            if df is not None:
+                self.put(key, df)
+                df = df.copy()
+        # Callers get their own copy and can modify it without touching the cached frame
+        return df
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._frames),
+                'memory_mb': self._memory_bytes / (1024 * 1024),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Create global instance (shared by all sessions of this server process)
+upload_cache = UploadCache()
@@ -0,0 +1,146 @@
+"""
+Vectorized validation of incoming readings
+Every row gets a uint16 error bitmask instead of raising on the first bad value, so a
+million-row upload is checked in a handful of array operations
+"""
+import numpy as np
+import pandas as pd
+from utils.schema import normalize_risk_levels
+
+# Error bits
+MISSING_VALUE = 1 << 0
+NOT_NUMERIC = 1 << 1
+OUTSIDE_GHANA = 1 << 2
+PH_OUT_OF_RANGE = 1 << 3
+TURBIDITY_OUT_OF_RANGE = 1 << 4
+DO_OUT_OF_RANGE = 1 << 5
+BAD_TIMESTAMP = 1 << 6
+DUPLICATE = 1 << 7
+UNKNOWN_RISK_LEVEL = 1 << 8
+
+# Rows dropped before validation (gateway records from unregistered stations)
+UNKNOWN_STATION = 'unknown_station'
+
+ERROR_NAMES = {
+    MISSING_VALUE: 'missing_value',
+    NOT_NUMERIC: 'not_numeric',
+    OUTSIDE_GHANA: 'outside_ghana',
+    PH_OUT_OF_RANGE: 'ph_out_of_range',
+    TURBIDITY_OUT_OF_RANGE: 'turbidity_out_of_range',
+    DO_OUT_OF_RANGE: 'do_out_of_range',
+    BAD_TIMESTAMP: 'bad_timestamp',
+    DUPLICATE: 'duplicate',
+    UNKNOWN_RISK_LEVEL: 'unknown_risk_level',
+}
+
+# Rejected rows: no usable position, time or core measurement, or a physically impossible value
+REJECT_MASK = (MISSING_VALUE | NOT_NUMERIC | OUTSIDE_GHANA | BAD_TIMESTAMP |
+               PH_OUT_OF_RANGE | TURBIDITY_OUT_OF_RANGE | DO_OUT_OF_RANGE)
+
+# Repeats of a (station, timestamp) reading are dropped too (the first copy is kept), but
+# counted as duplicates; an unknown risk level only clears the label and the row is kept
+DROP_MASK = REJECT_MASK | DUPLICATE
+
+# Ghana's bounding box (with a small margin for border stations)
+GHANA_BOUNDS = {'lat': (4.5, 11.2), 'lon': (-3.3, 1.2)}
+
+# Physical limits of the measurements (not EPA limits: those are classification rules)
+PHYSICAL_LIMITS = {
+    'ph': (0.0, 14.0, PH_OUT_OF_RANGE),
+    'turbidity_ntu': (0.0, 4000.0, TURBIDITY_OUT_OF_RANGE),  # Probe saturation
+    'dissolved_oxygen': (0.0, 20.0, DO_OUT_OF_RANGE),
+}
+
+REQUIRED_NUMERIC = ['latitude', 'longitude', 'turbidity_ntu', 'ph']
+OPTIONAL_NUMERIC = ['dissolved_oxygen', 'temperature']
+
+
+def validate_readings(df):
+    """Coerce types and check every row
+
+    Returns the coerced frame, the uint16 error mask (one entry per row) and a summary.
+    """
+    df = df.copy(deep=False)
+    errors = np.zeros(len(df), dtype=np.uint16)
+
+    for column in REQUIRED_NUMERIC + OPTIONAL_NUMERIC:
+        if column not in df.columns:
+            continue
+        raw = df[column]
+        values = pd.to_numeric(raw, errors='coerce')
+        missing = raw.isna().to_numpy()
+        if column in REQUIRED_NUMERIC:
+            errors[missing] |= MISSING_VALUE
+        errors[values.isna().to_numpy() & ~missing] |= NOT_NUMERIC
+        df[column] = values.astype('float64')
+
+    # NaN compares False, so missing coordinates are only flagged once (above)
+    lat, lon = df['latitude'].to_numpy(), df['longitude'].to_numpy()
+    outside = ((lat < GHANA_BOUNDS['lat'][0]) | (lat > GHANA_BOUNDS['lat'][1]) |
+               (lon < GHANA_BOUNDS['lon'][0]) | (lon > GHANA_BOUNDS['lon'][1]))
+    errors[outside] |= OUTSIDE_GHANA
+
+    for column, (low, high, bit) in PHYSICAL_LIMITS.items():
+        if column in df.columns:
+            values = df[column].to_numpy()
+            errors[(values < low) | (values > high)] |= bit
+
+    # Labels are normalised here so an unrecognised one is reported instead of becoming NaN later
+    if 'risk_level' in df.columns:
+        raw = df['risk_level']
+        df['risk_level'] = normalize_risk_levels(raw)
+        errors[raw.notna().to_numpy() & df['risk_level'].isna().to_numpy()] |= UNKNOWN_RISK_LEVEL
+
+    if 'timestamp' in df.columns and not pd.api.types.is_integer_dtype(df['timestamp']):
+        parsed = pd.to_datetime(df['timestamp'], errors='coerce', format='mixed')
+        errors[parsed.isna().to_numpy() & df['timestamp'].notna().to_numpy()] |= BAD_TIMESTAMP
+
+    # Duplicates need a real timestamp: without one every reading of a river looks the same
+    if 'timestamp' in df.columns:
+        station = df['station_id'] if 'station_id' in df.columns else df['river_name']
+        keys = pd.DataFrame({'station': station.astype(str).to_numpy(), 'timestamp': df['timestamp'].to_numpy()})
+        errors[keys.duplicated().to_numpy() & df['timestamp'].notna().to_numpy()] |= DUPLICATE
+
+    return df, errors, summarize(errors)
+
+
+def summarize(errors):
+    """Row counts per error bit"""
+    summary = {
+        'rows': len(errors),
+        'rejected': int(np.count_nonzero(errors & REJECT_MASK)),
+        'duplicates': int(np.count_nonzero((errors & DROP_MASK) == DUPLICATE)),
+        'errors': {}
+    }
+    for bit, name in ERROR_NAMES.items():
+        count = int(np.count_nonzero(errors & bit))
+        if count:
+            summary['errors'][name] = count
+    return summary
+
+
+def add_dropped(summary, name, count):
+    """Count rows dropped before validation as rejected under their own name"""
+    if count:
+        summary['rows'] += count
+        summary['rejected'] += count
+        summary['errors'][name] = summary['errors'].get(name, 0) + count
+    return summary
+
+
+def merge_summaries(total, summary):
+    """Add one chunk's summary into a running total"""
+    total['rows'] = total.get('rows', 0) + summary['rows']
+    total['rejected'] = total.get('rejected', 0) + summary['rejected']
+    total['duplicates'] = total.get('duplicates', 0) + summary['duplicates']
+    errors = total.setdefault('errors', {})
+    for name, count in summary['errors'].items():
+        errors[name] = errors.get(name, 0) + count
+    return total
+
+
+def describe_errors(summary):
+    """One-line description of a validation summary for the sidebar"""
+    if not summary['errors']:
+        return "no issues"
+    return ", ".join(f"{name.replace('_', ' ')}: {count:,}" for name, count in summary['errors'].items())